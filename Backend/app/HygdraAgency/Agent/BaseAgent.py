@@ -6,7 +6,8 @@ import logfire
 from HygdraAgency.DataModel.Task import Task, TaskStatus
 from HygdraAgency.DataModel.Project import Project 
 from HygdraAgency.DataModel.Service import Service 
-from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse, TaskClass
+from HygdraAgency.utils.stream import emit_step
 import json
 import logging
 
@@ -27,7 +28,9 @@ class BaseAgent:
             
             prompt = OllamaPrompt(
                 prompt=f"Context: {json.dumps(context)}\nWhat steps should I take to handle this?",
-                system=system_prompt
+                system=system_prompt,
+                task=TaskClass.PLAN
             )
             
+            emit_step(self.name, "think")
             return await ollama.generate(prompt)
\ No newline at end of file
@@ -6,7 +6,8 @@ from HygdraAgency.DataModel.Task import Task, TaskStatus
 from HygdraAgency.DataModel.Project import Project 
 from HygdraAgency.DataModel.Service import Service 
 from HygdraAgency.Agent.BaseAgent import BaseAgent
-from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse, TaskClass
+from HygdraAgency.utils.stream import emit_step
 
 from ansible_runner import run as ansible_run
 import jenkins
@@ -72,9 +73,11 @@ class DevOpsAgent(BaseAgent):
                 
                 Return only the YAML content for the playbook.
                 """,
-                system="You are a DevOps engineer specialized in Ansible automation."
+                system="You are a DevOps engineer specialized in Ansible automation.",
+                task=TaskClass.CODE
             )
             
+            emit_step(self.name, "ansible_playbook")
             return await ollama.generate(prompt)
 
     # generate but no execution yet 
@@ -97,9 +100,11 @@ class DevOpsAgent(BaseAgent):
                 
                 Use pipeline syntax (Jenkinsfile format).
                 """,
-                system="You are a DevOps engineer specialized in Jenkins pipelines."
+                system="You are a DevOps engineer specialized in Jenkins pipelines.",
+                task=TaskClass.CODE
             )
             
+            emit_step(self.name, "jenkins_pipeline")
             return await ollama.generate(prompt)
 
     # static code first 
@@ -121,9 +126,11 @@ class DevOpsAgent(BaseAgent):
                 
                 Return a JSON object with findings and recommendations.
                 """,
-                system="You are a security engineer specialized in deployment security."
+                system="You are a security engineer specialized in deployment security.",
+                task=TaskClass.EXTRACT
             )
             
+            emit_step(self.name, "security_checks")
             return json.loads(await ollama.generate(prompt))
 
     # not now or using only known one
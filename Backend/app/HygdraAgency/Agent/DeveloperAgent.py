@@ -8,149 +8,304 @@ from HygdraAgency.DataModel.Task import Task, TaskStatus
 from HygdraAgency.DataModel.Project import Project 
 from HygdraAgency.DataModel.Service import Service, CodeFile
 from HygdraAgency.Agent.BaseAgent import BaseAgent
-from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse
-from HygdraAgency.utils.rag import retrieve, Deps, Document, store_document
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaResponse, count_calls, TaskClass
+from HygdraAgency.utils.rag import retrieve_hits, Deps, Document, store_document, vector_store
+from HygdraAgency.utils.stream import emit_step
+from HygdraAgency.utils.admission import Priority, llm_priority
+from HygdraAgency.utils.budget import ContextBudget, trim_tokens
+from HygdraAgency.utils.artifacts import artifact_store
+import asyncio
 import re
 
+CODE_BLOCK = re.compile(r'^```(?:\w+)?\s*\n(.*?)(?=^```)```', re.DOTALL | re.MULTILINE)
+MANIFEST_REQUEST = """Create a detailed implementation plan.
+                Decompose the task into different code file.
+                List every file with its name and extension, coding langage,
+                a small description and its function and class headers.
+                Files must agree on the names they import from each other."""
+
+# --- Structured answers ---
+class FileSpec(BaseModel):
+    filename: str
+    langage: str = ""
+    description: str = ""
+    headers: List[str] = []
+
+    def summary(self) -> str:
+        return f"{self.filename} ({self.langage}): {self.description}\n" + "\n".join(f"    {header}" for header in self.headers)
+
+class FileManifest(BaseModel):
+    files: List[FileSpec]
+
+    def unique(self) -> List[FileSpec]:
+        "files with a usable name, the first spec of a name wins"
+        files = {}
+        for spec in self.files:
+            spec.filename = os.path.basename(spec.filename.strip())
+            if spec.filename:
+                files.setdefault(spec.filename, spec)
+        return list(files.values())
+
+class FileIssue(BaseModel):
+    filename: str
+    issue: str
+
+class ConsistencyReview(BaseModel):
+    issues: List[FileIssue] = [] # empty when the files fit together
+
+class GeneratedFile(BaseModel):
+    filename: str # with extension
+    langage: str
+    code: str
+
+class PlanUpdate(BaseModel):
+    plan: str # the plan with the coded file marked done
+    done: bool # every file of the plan is implemented
+    next_file: str = "" # function headers, description and langage of the next file to code
+
+def extract_code(answer: str) -> str:
+    "code blocks of a markdown answer, the answer itself when it has none"
+    blocks = CODE_BLOCK.findall(answer)
+    return "\n".join(blocks) if blocks else answer
+
+def attach_service(project: Project, service: Service):
+    "add the service of a task to the project, replacing the one of a previous run"
+    for i, other in enumerate(project.app):
+        if other.id == service.id:
+            project.app[i] = service
+            return
+    project.app.append(service)
+
 # --- Enhanced Developer Agent with Code Generation ---
 class DeveloperAgent(BaseAgent):
     def __init__(self):
         super().__init__("Dev", "Developer", 
                         OllamaModelConfig(model_name="codellama", temperature=0.2))
-    
-    # add a continue fonction with a loop system thought
+        self.budget = ContextBudget()
+        self.store = vector_store
+        self.artifacts = artifact_store
+        # sequential: one file per loop iteration, parallel: file manifest then concurrent generation
+        self.generation_mode = os.getenv("DEV_GENERATION_MODE", "sequential")
+        self.max_concurrency = int(os.getenv("DEV_GENERATION_CONCURRENCY", "4"))
+        self.max_files = 20
+
     async def work_on_task(self, task: Task, project:Project) -> dict:
+        # a re-run keeps the previous output restorable, unchanged files are not written again
+        if await self.artifacts.manifest(project.id, task.id):
+            snapshot = await self.artifacts.snapshot(project.id, task.id)
+            self.logger.info(f"{task.title}: previous output kept as snapshot {snapshot}")
+
+        with count_calls(f"{self.name} {self.generation_mode} '{task.title}'") as calls, llm_priority(Priority.BACKGROUND, project.id):
+            if self.generation_mode == "parallel":
+                project = await self.generate_in_parallel(task, project)
+            else:
+                project = await self.generate_sequentially(task, project)
+        files = next((len(service.code) for service in project.app if service.id == task.id), 0)
+        self.logger.info(f"{task.title}: {calls['calls']} LLM calls for {files} files")
+        return project
+
+    async def save_code_files(self, task: Task, project: Project, files: List[tuple]) -> List[CodeFile]:
+        "store generated `(filename, description, code, langage)` files in the artifact store and index them for retrieval"
+        artifacts = await self.artifacts.put_many(project.id, task.id, [
+            (filename, code, {"description": description, "langage": langage}) for filename, description, code, langage in files
+        ])
+        directory = self.artifacts.task_dir(project.id, task.id)
+        await asyncio.gather(*(
+            store_document(Deps(project, 5, self.store), Document(artifact.filename, os.path.join(directory, artifact.filename), code))
+            for artifact, (_, _, code, _) in zip(artifacts, files)
+        ))
+        # a filename generated twice keeps its last content
+        latest = {artifact.filename: artifact for artifact in artifacts}
+        return [
+            CodeFile(id=artifact.filename, name=artifact.filename, description=artifact.description, filename=artifact.filename, status="coded", langage=artifact.langage)
+            for artifact in latest.values()
+        ]
+
+    # add a continue fonction with a loop system thought
+    async def generate_sequentially(self, task: Task, project:Project) -> dict:
         async with OllamaClient(self.ollama_config) as ollama:
-            # Generate implementation plan
-            plan_prompt = OllamaPrompt(
-                prompt=f"""Task: {task.title}
-                Description: {task.description}
-                Which external ressources might be requiered to fullfill this task ?
-                Context: {project.description}""",
-                system="You are a senior software developer. Create a detailed plan."
-            )
+            # sections repeated in every prompt are capped once
+            description = self.budget.section(task.description)
+            context = self.budget.section(project.description)
+            header = f"Task: {task.title}\nDescription: {description}\nContext: {context}"
+            # the header is evaluated once, follow-up calls continue its KV context
+            conversation = ollama.conversation(header, system="You are a senior software developer. Create a detailed plan.", task=TaskClass.CODE)
 
-            external_ressources = await ollama.generate(plan_prompt)
-            external_ressources = await retrieve(Deps(project, 5), external_ressources)
+            # Generate implementation plan
+            emit_step(self.name, "ressources")
+            self.budget.measure(self.name, "ressources", header=conversation.pending_preamble)
+            resources_query = await conversation.generate("Which external ressources might be requiered to fullfill this task ?")
+            hits = await retrieve_hits(Deps(project, self.budget.config.resources, self.store), resources_query)
+            request = "Create a detailed implementation plan. Decompose the task into different code file."
+            external_ressources = self.budget.fit_resources(hits, self.budget.remaining(header, request))
 
             # do the loop and use regex ?
-            plan_prompt = OllamaPrompt(
-                prompt=f"""Task: {task.title}
-                Description: {task.description}
-                Context: {project.description}
-                external ressources : {external_ressources}
+            emit_step(self.name, "implementation_plan")
+            self.budget.measure(self.name, "implementation_plan", header=conversation.pending_preamble, resources=external_ressources)
+            implementation_plan = await conversation.generate(f"""external ressources : {external_ressources}
                 ---- request: 
                 Create a detailed implementation plan.
                 Decompose the task into different code file.
                 return file name, small descriptiom, 
                 functions header and coding langage into an actionnable list.
-                """,
-                system="You are a senior software developer. Create a detailed plan."
-            )
+                """)
 
-            implementation_plan = await ollama.generate(plan_prompt)
+            # the first file is selected on its own, the next ones come with each plan update
+            emit_step(self.name, "select_file", iteration=0)
+            self.budget.measure(self.name, "select_file", 0, header=conversation.pending_preamble, plan=implementation_plan)
+            next_file = await conversation.generate("""--- request :
+                select the next file to code.
+                extract the function header,
+                describe it.
+                choose a langage that suit the request.
+                """)
 
             # generate file
             i=0
             code = []
             while i < 20:
-                plan_prompt = OllamaPrompt(
-                    prompt=f"""Task: {task.title}
-                    Description: {task.description}
-                    Context: {project.description}
-                    external ressources : {external_ressources}
-                    plan : 
-                    {implementation_plan}
-                    --- request :
-                    select the next file to code.
-                    extract the function header,
-                    describe it.
-                    choose a langage that suit the request.
-                    """,
-                    system="You are a senior software developer. Create a detailed plan."
-                )
-                next_file = await ollama.generate(plan_prompt)
-                external_ressources = await retrieve(Deps(project, 5), next_file)
-
-                plan_prompt = OllamaPrompt(
-                    prompt=f"""Task: {task.title}
-                    Description: {task.description}
-                    Context: {project.description}
-                    external ressources: {external_ressources}
-                    todo code : 
-                    {next_file}
-                    --- request :
-                    As an expert you need to code those function and fit them into one file.
-                    stucture the request as markdown.
-                    """,
-                    system="You are a senior software developer. Create a detailed plan."
-                )
-
-                code_file = await ollama.generate(plan_prompt)
-
-                plan_prompt = OllamaPrompt(
-                    prompt=f"""Task: {task.title}
-                    Description: {task.description}
-                    Context: {project.description}
-                    external ressources: {external_ressources}
-                    {code_file}
-                    --- request :
-                    what is the name of this code file with extension.
-                    """,
-                    system="You are a senior software developer. Create a detailed plan."
-                )
-
-                filename = await ollama.generate(plan_prompt)
-                match = re.search(r'([^/\\]+)\.(py|js|java|cpp|html|css|rb|go|ts|php)$', filename)
-                if match:
-                    filename = match.group(1)
-                else:
-                    filename=hash(filename)
-
-                pattern = r'^```(?:\w+)?\s*\n(.*?)(?=^```)```'
-                result = re.findall(pattern, code_file, re.DOTALL | re.MULTILINE)
-                code_file = "\\n".join(result)
-                
-                #plus propre plus tard
-                os.mkdir(f"/home/guidry/Documents/agency/hygdra-agency/Backend/app/generated_code/{project.id}") 
-                os.mkdir(f"/home/guidry/Documents/agency/hygdra-agency/Backend/app/generated_code/{project.id}/{task.title}")
-
-                with open(f"/home/guidry/Documents/agency/hygdra-agency/Backend/app/generated_code/{project.id}/{task.title}/{filename}" , 'w') as file:
-                    file.write(code_file)
-
-                store_document(Deps(project, 5), Document(filename, next_file ,code_file))
-                codefile = CodeFile(id=filename, name=filename, description=next_file, filename=filename, status="coded", langage=filename)
-                code.append(codefile)
-
-                plan_prompt = OllamaPrompt(
-                    prompt=f"""Task: {task.title}
-                    Description: {task.description}
-                    Context: {project.description}
-                    plan : 
-                    {implementation_plan}
-
-                    -- task Done:
-                    {next_file}
-                    --- request:
-                    mark the task as done in the plan.
-                    update the plan.
-                    --- important:
-                    if the plan is fully implemented then return 'BREAK'
-                    """,
-                    system="You are a senior software developer. Create a detailed plan."
-                )
-                implementation_plan = await ollama.generate(plan_prompt)
-
-                if "BREAK" in str(implementation_plan).upper():
+                # the plan grows with each update, keep a running summary instead
+                implementation_plan = await self.budget.compact_plan(ollama, implementation_plan, task.title)
+                hits = await retrieve_hits(Deps(project, self.budget.config.resources, self.store), next_file)
+                external_ressources = self.budget.fit_resources(hits, self.budget.remaining(header, next_file))
+
+                # the selected file was the last answer, only repeated when the context was dropped
+                todo = next_file if conversation.fresh else ""
+                emit_step(self.name, "code", iteration=i)
+                self.budget.measure(self.name, "code", i, header=conversation.pending_preamble, resources=external_ressources, todo=todo)
+                try:
+                    generated = await conversation.generate_model(f"""external ressources: {external_ressources}
+                        todo code : 
+                        {todo}
+                        --- request :
+                        As an expert you need to code those function and fit them into one file.
+                        Return the name of the file with extension, its langage and its code.
+                        """, GeneratedFile)
+                except ValueError as e:
+                    self.logger.error(f"Failed to parse generated file, stopping at {len(code)} files: {e}")
+                    break
+
+                filename = os.path.basename(generated.filename.strip()) or f"file-{i}"
+                code += await self.save_code_files(task, project, [(filename, next_file, extract_code(generated.code), generated.langage)])
+
+                emit_step(self.name, "update_plan", iteration=i)
+                self.budget.measure(self.name, "update_plan", i, header=conversation.pending_preamble, plan=implementation_plan, done=next_file)
+                try:
+                    update = await conversation.generate_model(f"""plan : 
+                        {implementation_plan}
+
+                        -- task Done:
+                        {filename}
+                        {next_file}
+                        --- request:
+                        mark the task as done in the plan.
+                        update the plan.
+                        set done when the plan is fully implemented,
+                        otherwise select the next file to code: its function header, description and langage.
+                        """, PlanUpdate)
+                except ValueError as e:
+                    self.logger.error(f"Failed to parse plan update, stopping at {len(code)} files: {e}")
                     break
+
+                implementation_plan = update.plan
+                if update.done or not update.next_file.strip():
+                    break
+                next_file = update.next_file
                 i+=1
 
+            self.logger.info(f"{task.title}: {conversation.prompt_tokens} prompt tokens evaluated in {conversation.prompt_eval_duration / 1e9:.2f}s over {conversation.calls} calls, {conversation.resets} context resets")
             task.status = TaskStatus.DONE
-            service = Service(id=task.title, name=task.title, doc=task.description, status="coded", description=task.description, code=code)
-            project.app.append(service)
+            attach_service(project, Service(id=task.id, name=task.title, doc=task.description, status="coded", description=task.description, code=code))
 
             return project
         
+    async def generate_in_parallel(self, task: Task, project: Project) -> dict:
+        "plan the task as a file manifest, code the files concurrently, then check they fit together"
+        async with OllamaClient(self.ollama_config) as ollama:
+            description = self.budget.section(task.description)
+            context = self.budget.section(project.description)
+            header = f"Task: {task.title}\nDescription: {description}\nContext: {context}"
+            conversation = ollama.conversation(header, system="You are a senior software developer. Create a detailed plan.", task=TaskClass.CODE)
+
+            emit_step(self.name, "ressources")
+            self.budget.measure(self.name, "ressources", header=conversation.pending_preamble)
+            resources_query = await conversation.generate("Which external ressources might be requiered to fullfill this task ?")
+            hits = await retrieve_hits(Deps(project, self.budget.config.resources, self.store), resources_query)
+            external_ressources = self.budget.fit_resources(hits, self.budget.remaining(header, MANIFEST_REQUEST))
+
+            emit_step(self.name, "manifest")
+            self.budget.measure(self.name, "manifest", header=conversation.pending_preamble, resources=external_ressources)
+            try:
+                answer = await conversation.generate_model(f"""external ressources : {external_ressources}
+                    ---- request: 
+                    {MANIFEST_REQUEST}
+                    """, FileManifest)
+                files = answer.unique()[:self.max_files]
+            except ValueError as e:
+                files = []
+                self.logger.error(f"Failed to parse file manifest: {e}")
+            if not files:
+                self.logger.warning(f"No usable file manifest for '{task.title}', generating files one at a time")
+                return await self.generate_sequentially(task, project)
+
+            manifest = "\n".join(spec.summary() for spec in files)
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def generate(index: int, spec: FileSpec, issue: str = "") -> str:
+                async with semaphore, OllamaClient(self.ollama_config) as client:
+                    emit_step(self.name, "code", iteration=index, file=spec.filename)
+                    # every file continues from the manifest, which is only repeated when the context was dropped
+                    branch = conversation.fork(client)
+                    shared = manifest if branch.fresh else ""
+                    hits = await retrieve_hits(Deps(project, self.budget.config.resources, self.store), spec.summary())
+                    resources = self.budget.fit_resources(hits, self.budget.remaining(header, manifest, spec.summary()))
+                    self.budget.measure(self.name, "code", index, header=branch.pending_preamble, manifest=shared, resources=resources, file=spec.summary())
+                    return extract_code(await branch.generate(f"""files of the task :
+                        {shared}
+                        external ressources: {resources}
+                        file to code :
+                        {spec.summary()}
+                        {f"--- fix this issue: {issue}" if issue else ""}
+                        --- request :
+                        As an expert code this file with every header listed for it.
+                        Only use the names the other files of the task declare.
+                        stucture the request as markdown.
+                        """))
+
+            codes = list(await asyncio.gather(*(generate(i, spec) for i, spec in enumerate(files))))
+
+            # one consistency pass over all files, flagged files are generated again
+            share = max(self.budget.remaining(header, manifest) // len(files), 50)
+            listing = "\n\n".join(f"# {spec.filename}\n{trim_tokens(code, share)}" for spec, code in zip(files, codes))
+            emit_step(self.name, "consistency")
+            self.budget.measure(self.name, "consistency", header=conversation.pending_preamble, files=listing)
+            try:
+                review = await conversation.generate_model(f"""generated files :
+                    {listing}
+                    --- request :
+                    Check that these files fit together: imports, function names and signatures must match across files.
+                    List the files to fix with their issue, none when they are consistent.
+                    """, ConsistencyReview)
+                issues = {issue.filename: issue.issue for issue in review.issues}
+            except ValueError as e:
+                issues = {}
+                self.logger.error(f"Failed to parse consistency review: {e}")
+            fixes = [(i, spec, issues[spec.filename]) for i, spec in enumerate(files) if spec.filename in issues]
+            if fixes:
+                emit_step(self.name, "fix", files=len(fixes))
+                for (i, _, _), code in zip(fixes, await asyncio.gather(*(generate(i, spec, issue) for i, spec, issue in fixes))):
+                    codes[i] = code
+
+            code = await self.save_code_files(task, project, [
+                (spec.filename, spec.description, source, spec.langage) for spec, source in zip(files, codes)
+            ])
+
+            self.logger.info(f"{task.title}: {len(files)} files generated in parallel, {len(fixes)} fixed after review")
+            task.status = TaskStatus.DONE
+            attach_service(project, Service(id=task.id, name=task.title, doc=task.description, status="coded", description=task.description, code=code))
+
+            return project
+
     async def enhance(self, request:str, context : str, project:Project) -> dict:
         # get all task file
         # checkout code
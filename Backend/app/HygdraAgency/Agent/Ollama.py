@@ -1,12 +1,54 @@
-from pydantic import BaseModel, Field, HttpUrl
-from typing import List, Optional, Dict, Any, Literal
+from pydantic import BaseModel, Field, HttpUrl, ValidationError
+from typing import List, Optional, Dict, Any, Literal, AsyncIterator, Iterator, Set, Tuple, Type, TypeVar, Union
 from enum import Enum
+from contextlib import contextmanager
+from contextvars import ContextVar
 from fastapi import HTTPException
+from HygdraAgency.utils.stream import emit, current_step
+from HygdraAgency.utils.telemetry import telemetry
+from HygdraAgency.utils.cache import ResponseCache, response_cache, cache_key
+from HygdraAgency.utils.coalesce import SingleFlight, llm_flights
+from HygdraAgency.utils.admission import LLMScheduler, llm_scheduler
 import json
 import aiohttp
 import asyncio
+import logging
 import os
-import requests 
+import time
+
+logger = logging.getLogger("Ollama")
+
+Model = TypeVar("Model", bound=BaseModel)
+
+# call counters of the workflows running around the current task, see `count_calls`
+_call_counters: ContextVar[tuple] = ContextVar("hygdra_llm_calls", default=())
+
+@contextmanager
+def count_calls(workflow: str) -> Iterator[Dict[str, int]]:
+    "count the generations made under the block, including by the tasks it spawns, and report them on exit"
+    counts = {"calls": 0, "cached": 0, "coalesced": 0}
+    token = _call_counters.set(_call_counters.get() + (counts,))
+    try:
+        yield counts
+    finally:
+        _call_counters.reset(token)
+        logger.info(f"{workflow}: {counts['calls']} LLM calls, {counts['cached']} served from cache, {counts['coalesced']} joined an identical call")
+        emit("metrics", {"workflow": workflow, "llm_calls": counts["calls"], "cached_calls": counts["cached"], "coalesced_calls": counts["coalesced"]})
+
+def _count(kind: str):
+    for counts in _call_counters.get():
+        counts[kind] += 1
+
+async def validated(generate, model: Type[Model], retries: int) -> Model:
+    "validate generated JSON into `model`, generating again on failure"
+    for attempt in range(retries + 1):
+        answer = await generate()
+        try:
+            return model.model_validate_json(answer)
+        except ValidationError as e:
+            if attempt == retries:
+                raise
+            logger.warning(f"answer does not match {model.__name__}, asking again: {e.error_count()} errors")
 
 # --- Ollama Models ---
 class OllamaModelConfig(BaseModel):
@@ -15,13 +57,20 @@ class OllamaModelConfig(BaseModel):
     temperature: float = 0.7
     top_p: float = 0.9
     max_tokens: int = 2048
+    use_cache: bool = os.getenv("OLLAMA_CACHE", "false").lower() == "true" # opt-in response cache
+    cache_any_temperature: bool = os.getenv("OLLAMA_CACHE_ANY_TEMPERATURE", "false").lower() == "true"
+    reuse_context: bool = os.getenv("OLLAMA_REUSE_CONTEXT", "true").lower() == "true" # conversations continue the KV context
+    max_context: int = int(os.getenv("OLLAMA_MAX_CONTEXT", "3072")) # tokens, past this a conversation starts over
 
 class OllamaPrompt(BaseModel):
     prompt: str
     system: Optional[str] = None
     template: Optional[str] = None
-    context: Optional[str] = None
+    context: Optional[List[int]] = None
     options: Optional[dict] = None
+    format: Optional[Union[str, dict]] = None # "json" or a JSON schema the answer must follow
+    task: Optional["TaskClass"] = None # kind of step, picks the model, see `ModelRouter`
+    model: Optional[str] = None # pins the model, routing is skipped
 
 class OllamaResponse(BaseModel):
     model: str
@@ -31,28 +80,183 @@ class OllamaResponse(BaseModel):
     context: Optional[List[int]] = None
     total_duration: Optional[int] = None
     load_duration: Optional[int] = None
-    prompt_eval_duration: Optional[int] = None
+    prompt_eval_duration: Optional[int] = None # nanoseconds
     eval_duration: Optional[int] = None
+    prompt_eval_count: Optional[int] = None # tokens of the prompt actually evaluated (prefill)
+    eval_count: Optional[int] = None
+
+# --- Model routing ---
+class TaskClass(str, Enum):
+    CLASSIFY = "classify" # a score, a label or a yes/no answer
+    EXTRACT = "extract" # fields pulled out of a text, summaries
+    PLAN = "plan" # task breakdowns, implementation plans, reviews
+    CODE = "code" # source files
+    CHAT = "chat" # free answers to a user
+
+OllamaPrompt.model_rebuild()
+
+class ModelRoute(BaseModel):
+    model: Optional[str] = None # None for the model of the agent config
+    budget: Optional[float] = None # seconds to the first token before trying the next model, None to wait
+    fallbacks: List[str] = [] # tried in order, the agent model always comes last
+
+class RouteStats(BaseModel):
+    calls: int = 0
+    fallbacks: int = 0 # answered by another model than the first candidate
+    over_budget: int = 0 # candidates abandoned for missing the budget
+    errors: int = 0 # candidates that failed, missing models included
+    latency: float = 0 # seconds, summed over the calls
+    models: Dict[str, int] = {} # calls answered per model
+
+def load_routes() -> Dict[TaskClass, ModelRoute]:
+    "default routes, cheap steps on OLLAMA_FAST_MODEL, overridden by the OLLAMA_ROUTES JSON object"
+    fast = os.getenv("OLLAMA_FAST_MODEL", "llama3.2:1b")
+    routes = {
+        TaskClass.CLASSIFY: ModelRoute(model=fast, budget=5),
+        TaskClass.EXTRACT: ModelRoute(model=fast, budget=10),
+        TaskClass.PLAN: ModelRoute(),
+        TaskClass.CODE: ModelRoute(),
+        TaskClass.CHAT: ModelRoute(),
+    }
+    for task, route in json.loads(os.getenv("OLLAMA_ROUTES", "{}")).items():
+        routes[TaskClass(task)] = ModelRoute(**route)
+    return routes
+
+class ModelRouter:
+    """
+    Picks the model of each call from the class of its step.
+
+    A route gives the preferred model of a class, a latency budget and
+    fallback models. A candidate that fails, or sends no token within the
+    budget, is abandoned for the next one, and the model of the agent
+    config is always the last resort, without budget. A model ollama does
+    not have is skipped from then on. Calls without a class go to the agent
+    model as before.
+
+    Latency, fallbacks and answering models are kept per class on `stats`.
+    """
+    def __init__(self, routes: Optional[Dict[TaskClass, ModelRoute]] = None, enabled: Optional[bool] = None):
+        self.routes = routes or load_routes()
+        self.enabled = os.getenv("OLLAMA_ROUTING", "true").lower() == "true" if enabled is None else enabled
+        self.stats: Dict[TaskClass, RouteStats] = {}
+        self.unavailable: Set[str] = set()
+        self.reset()
+
+    def reset(self):
+        "forget stats and missing models"
+        self.stats = {task: RouteStats() for task in TaskClass}
+        self.unavailable = set()
+
+    def candidates(self, task: Optional[TaskClass], default_model: str) -> List[Tuple[str, Optional[float]]]:
+        "`(model, budget)` to try in order"
+        if task is None or not self.enabled:
+            return [(default_model, None)]
+        route = self.routes[task]
+        models = []
+        for model in (route.model or default_model, *route.fallbacks):
+            if model not in models and model not in self.unavailable and model != default_model:
+                models.append(model)
+        return [(model, route.budget) for model in models] + [(default_model, None)]
+
+    def record(self, task: TaskClass, model: str, latency: float, fallback: bool):
+        stats = self.stats[task]
+        stats.calls += 1
+        stats.fallbacks += fallback
+        stats.latency += latency
+        stats.models[model] = stats.models.get(model, 0) + 1
+
+    def report(self) -> Dict[str, dict]:
+        "route and stats of every class, with the mean latency"
+        return {
+            task.value: {**self.routes[task].model_dump(), **self.stats[task].model_dump(),
+                         "mean_latency": self.stats[task].latency / self.stats[task].calls if self.stats[task].calls else 0.0}
+            for task in TaskClass
+        }
+
+model_router = ModelRouter()
+
+# --- Shared connection pool ---
+class OllamaPoolConfig(BaseModel):
+    limit: int = int(os.getenv("OLLAMA_POOL_LIMIT", "100")) # total open connections
+    limit_per_host: int = int(os.getenv("OLLAMA_POOL_LIMIT_PER_HOST", "32"))
+    keepalive_timeout: float = float(os.getenv("OLLAMA_POOL_KEEPALIVE", "60"))
+    ttl_dns_cache: int = int(os.getenv("OLLAMA_POOL_DNS_TTL", "300"))
+    timeout: Optional[float] = None # ollama generations can take minutes
+
+class OllamaSessionPool:
+    """
+    App-lifetime aiohttp session shared by every OllamaClient.
+
+    Started and stopped from the FastAPI lifespan, so agents reuse keep-alive
+    connections instead of opening a new socket per `async with OllamaClient`.
+    """
+    def __init__(self, config: Optional[OllamaPoolConfig] = None):
+        self.config = config or OllamaPoolConfig()
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def started(self) -> bool:
+        return self.session is not None and not self.session.closed
+
+    async def start(self):
+        if self.started:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.config.limit,
+            limit_per_host=self.config.limit_per_host,
+            keepalive_timeout=self.config.keepalive_timeout,
+            ttl_dns_cache=self.config.ttl_dns_cache,
+            use_dns_cache=True,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.config.timeout),
+        )
+
+    async def stop(self):
+        if self.session is not None:
+            await self.session.close()
+        self.session = None
+
+session_pool = OllamaSessionPool()
 
 class OllamaClient:
-    def __init__(self, config: OllamaModelConfig):
+    def __init__(self, config: OllamaModelConfig, pool: Optional[OllamaSessionPool] = None, cache: Optional[ResponseCache] = None,
+                 router: Optional[ModelRouter] = None, flights: Optional[SingleFlight] = None, scheduler: Optional[LLMScheduler] = None):
         self.config = config
-        self.base_url = str(config.base_url)
+        self.base_url = str(config.base_url).rstrip("/")
+        self.pool = pool or session_pool
+        self.cache = cache or response_cache
+        self.router = router or model_router
+        self.flights = flights or llm_flights
+        self.scheduler = scheduler or llm_scheduler
         self.session = None
+        self._owns_session = False
+        self.last_time_to_first_token: Optional[float] = None
+        self.last_prompt_tokens: Optional[int] = None
+        self.last_prompt_eval_duration: Optional[int] = None
+        self.last_context: Optional[List[int]] = None
+        self.last_model: Optional[str] = None
+        self._admitted = lambda: None # starts the budget of the current candidate, see `generate_stream`
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        # reuse the shared pool when the app started it, standalone session otherwise
+        if self.pool.started:
+            self.session = self.pool.session
+            self._owns_session = False
+        else:
+            self.session = aiohttp.ClientSession()
+            self._owns_session = True
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
+        self.session = None
 
-    async def generate(self, prompt: OllamaPrompt) -> str:
-        url = f"{self.base_url}/api/generate"
-        
-        payload = {
-            "model": self.config.model_name,
+    def _payload(self, prompt: OllamaPrompt, model: str) -> dict:
+        return {
+            "model": model,
             "prompt": prompt.prompt,
             "system": prompt.system,
             "template": prompt.template,
@@ -62,39 +266,311 @@ class OllamaClient:
                 "top_p": self.config.top_p,
                 "max_tokens": self.config.max_tokens,
                 **(prompt.options or {})
-            }
+            },
+            **({"format": prompt.format} if prompt.format is not None else {}),
         }
 
-        async with self.session.post(url, json=payload) as response:
+    def _cache_key(self, payload: dict) -> Optional[str]:
+        "None when the response cache must not be used for this payload"
+        if not self.config.use_cache:
+            return None
+        if payload["options"].get("temperature") != 0 and not self.config.cache_any_temperature:
+            self.cache.bypass()
+            return None
+        return self._shape_key(payload)
+
+    @staticmethod
+    def _shape_key(payload: dict) -> str:
+        return cache_key(payload["model"], payload["system"], payload["prompt"], payload["template"], payload["options"], payload["context"], payload.get("format"))
+
+    async def generate_stream(self, prompt: OllamaPrompt) -> AsyncIterator[str]:
+        """
+        Yield response tokens as ollama streams them.
+
+        The model is the one pinned on the prompt, or the first candidate of
+        the router for the class of the prompt that answers within its
+        budget; it is kept on `last_model`. Time to first token is measured
+        from the request being sent and is logged, kept on
+        `last_time_to_first_token` and pushed to SSE clients. Cached
+        responses are yielded as a single token. A call identical to one
+        already in flight joins it instead of reaching ollama, see
+        `SingleFlight`. Others wait for a slot of the LLM scheduler, and
+        the routing budget only counts from then.
+        """
+        if prompt.model is not None:
+            candidates = [(prompt.model, None)]
+        else:
+            candidates = self.router.candidates(prompt.task, self.config.model_name)
+        start = time.perf_counter()
+        for index, (model, budget) in enumerate(candidates):
+            last = index == len(candidates) - 1
+            tokens = self._stream(prompt, model)
+            try:
+                first = await self._first_token(tokens, budget)
+            except StopAsyncIteration:
+                first = None
+            except asyncio.TimeoutError:
+                # without a budget it is a socket timeout of the session (aiohttp.ServerTimeoutError)
+                if last or budget is None:
+                    raise
+                logger.warning(f"{model} sent no token within {budget}s for a {prompt.task.value} step, trying the next model")
+                if prompt.task is not None:
+                    self.router.stats[prompt.task].over_budget += 1
+                continue
+            except (HTTPException, aiohttp.ClientError) as e:
+                if last:
+                    raise
+                if isinstance(e, HTTPException) and e.status_code == 404:
+                    # the model is not pulled, do not ask it again
+                    self.router.unavailable.add(model)
+                logger.warning(f"{model} failed for a {prompt.task.value} step, trying the next model: {e}")
+                self.router.stats[prompt.task].errors += 1
+                continue
+
+            self.last_model = model
+            if first is not None:
+                yield first
+                async for token in tokens:
+                    yield token
+            if prompt.task is not None:
+                self.router.record(prompt.task, model, time.perf_counter() - start, index > 0)
+            return
+
+    async def _first_token(self, tokens: AsyncIterator[str], budget: Optional[float]) -> str:
+        "first token of a candidate, the budget counts from the call being admitted by the scheduler"
+        if budget is None:
+            return await tokens.__anext__()
+        admitted = asyncio.Event()
+        self._admitted = admitted.set
+        first = asyncio.ensure_future(tokens.__anext__())
+        waiting = asyncio.ensure_future(admitted.wait())
+        try:
+            # waiting for a slot is not held against the model
+            await asyncio.wait({first, waiting}, return_when=asyncio.FIRST_COMPLETED)
+            return await asyncio.wait_for(first, budget)
+        except BaseException:
+            first.cancel()
+            raise
+        finally:
+            waiting.cancel()
+            self._admitted = lambda: None
+
+    async def _post(self, payload: dict) -> AsyncIterator[OllamaResponse]:
+        "parsed chunks of one /api/generate call, sent once the scheduler admits it"
+        async with self.scheduler.slot():
+            self._admitted()
+            async with self.session.post(f"{self.base_url}/api/generate", json=payload) as response:
+                if response.status != 200:
+                    raise HTTPException(
+                        status_code=response.status,
+                        detail=f"Ollama API error: {await response.text()}"
+                    )
+
+                async for line in response.content:
+                    try:
+                        data = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    yield OllamaResponse(**data)
+
+    async def _stream(self, prompt: OllamaPrompt, model: str) -> AsyncIterator[str]:
+        "one generation of `model`, see `generate_stream`"
+        payload = self._payload(prompt, model)
+        task = prompt.task.value if prompt.task is not None else ""
+
+        start = time.perf_counter()
+        self.last_time_to_first_token = None
+        self.last_prompt_tokens = None
+        self.last_prompt_eval_duration = None
+        self.last_context = None
+        key = self._cache_key(payload)
+        if key is not None:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                _count("cached")
+                self.last_time_to_first_token = time.perf_counter() - start
+                emit("metrics", {"model": model, "time_to_first_token": self.last_time_to_first_token, "cached": True})
+                agent, step = current_step()
+                telemetry.record(agent, model, step, task, cached=True, time_to_first_token=self.last_time_to_first_token)
+                emit("token", cached)
+                yield cached
+                return
+
+        chunks = []
+        # the server is part of the key, the shape of the generation is the rest
+        async with self.flights.stream((self.base_url, key or self._shape_key(payload)), lambda: self._post(payload)) as (leader, responses):
+            if leader:
+                _count("calls")
+            else:
+                # the leader records the generation, followers only count themselves
+                self._admitted()
+                _count("coalesced")
+                telemetry.coalesce("generate")
+                logger.info(f"{model} generation joined an identical one in flight")
+
+            async for response_obj in responses:
+                if response_obj.response:
+                    if self.last_time_to_first_token is None:
+                        self.last_time_to_first_token = time.perf_counter() - start
+                        logger.info(f"{model} time to first token: {self.last_time_to_first_token:.3f}s")
+                        emit("metrics", {"model": model, "time_to_first_token": self.last_time_to_first_token})
+                    emit("token", response_obj.response)
+                    chunks.append(response_obj.response)
+                    yield response_obj.response
+
+                if response_obj.done:
+                    self.last_context = response_obj.context
+                    self.last_prompt_eval_duration = response_obj.prompt_eval_duration
+                    if leader:
+                        agent, step = current_step()
+                        telemetry.record(agent, model, step, task, time_to_first_token=self.last_time_to_first_token,
+                                         total=response_obj.total_duration, load=response_obj.load_duration,
+                                         prompt_eval=response_obj.prompt_eval_duration, eval=response_obj.eval_duration,
+                                         prompt_tokens=response_obj.prompt_eval_count, eval_tokens=response_obj.eval_count)
+                if response_obj.done and response_obj.prompt_eval_count is not None:
+                    self.last_prompt_tokens = response_obj.prompt_eval_count
+                    prompt_eval = (response_obj.prompt_eval_duration or 0) / 1e9
+                    logger.info(f"{model} prompt tokens: {response_obj.prompt_eval_count} in {prompt_eval:.3f}s, generated: {response_obj.eval_count}")
+                    emit("metrics", {"model": model, "prompt_tokens": response_obj.prompt_eval_count,
+                                     "prompt_eval_duration": prompt_eval, "eval_tokens": response_obj.eval_count})
+
+        # only complete generations reach this point
+        if key is not None and leader:
+            await self.cache.put(key, "".join(chunks))
+
+    async def generate(self, prompt: OllamaPrompt) -> str:
+        full_response = ""
+        async for token in self.generate_stream(prompt):
+            full_response += token
+        return full_response
+
+    async def generate_model(self, prompt: OllamaPrompt, model: Type[Model], retries: int = 1) -> Model:
+        """
+        Generate an answer constrained to the JSON schema of `model`.
+
+        The schema goes to ollama as `format` and the answer is validated
+        into the model. An answer failing validation is asked again up to
+        `retries` times, then the ValidationError (a ValueError) is raised.
+        """
+        prompt = prompt.model_copy(update={"format": model.model_json_schema()})
+        return await validated(lambda: self.generate(prompt), model, retries)
+
+    def conversation(self, preamble: str = "", system: Optional[str] = None, task: Optional[TaskClass] = None) -> "OllamaConversation":
+        "a conversation whose calls share the KV context, see `OllamaConversation`"
+        return OllamaConversation(self, preamble, system, task)
+        
+    async def embeddings(self, texts: List[str], model: str = "nomic-embed-text") -> List[List[float]]:
+        "embed a batch of texts in a single /api/embed call"
+        url = f"{self.base_url}/api/embed"
+        async with self.session.post(url, json={"model": model, "input": texts}) as response:
             if response.status != 200:
                 raise HTTPException(
                     status_code=response.status,
                     detail=f"Ollama API error: {await response.text()}"
                 )
-            
-            full_response = ""
-            async for line in response.content:
-                try:
-                    data = json.loads(line)
-                    response_obj = OllamaResponse(**data)
-                    if response_obj.response:
-                        full_response += response_obj.response
-                except json.JSONDecodeError:
-                    continue
-                
-            return full_response
-        
-    async def embeddings(self, texts: List[str]):
-        url = os.env("OLLAMA_URL") + "/v1/embeddings"
-        headers = {"Content-Type": "application/json"}
-        data = {
-                "model": "nomic-embed-text", 
-                "texts": texts 
-        }
+            data = await response.json()
+            return data.get("embeddings", [])
+
+# --- Conversations ---
+class OllamaConversation:
+    """
+    Sequential generations sharing ollama's KV context.
+
+    The first call sends `preamble` followed by its request. Each follow-up
+    only sends its own request, along with the `context` tokens returned by
+    the previous answer, so ollama evaluates the new tokens only. Once the
+    context grows past `max_context` tokens, or when an answer comes
+    without one (cached response), it is dropped and the next call starts
+    over from the preamble. A call rejected while continuing a context is
+    retried once from the preamble.
+
+    The first call is routed by the `task` class of the conversation, the
+    follow-ups stay on the model that answered it since the context only
+    makes sense to that model.
+
+    Prompt tokens and prompt evaluation time of the calls are summed on
+    `prompt_tokens` and `prompt_eval_duration` (nanoseconds).
+    """
+    def __init__(self, client: OllamaClient, preamble: str = "", system: Optional[str] = None, task: Optional[TaskClass] = None):
+        self.client = client
+        self.preamble = preamble
+        self.system = system
+        self.task = task
+        self.model: Optional[str] = None # holder of the context
+        self.enabled = client.config.reuse_context
+        self.max_context = client.config.max_context
+        self.context: Optional[List[int]] = None
+        self.calls = 0
+        self.resets = 0
+        self.prompt_tokens = 0
+        self.prompt_eval_duration = 0
+
+    @property
+    def fresh(self) -> bool:
+        "the next call starts from the preamble, previous answers are not in its context"
+        return self.context is None
+
+    @property
+    def pending_preamble(self) -> str:
+        "the preamble the next call sends, empty when the context already holds it"
+        return self.preamble if self.fresh else ""
+
+    def reset(self):
+        self.context = None
+        self.model = None
+
+    def fork(self, client: OllamaClient) -> "OllamaConversation":
+        "an independent conversation continuing from the current context, one per concurrent follow-up"
+        branch = OllamaConversation(client, self.preamble, self.system, self.task)
+        branch.context = self.context
+        branch.model = self.model
+        return branch
+
+    def _prompt(self, request: str, system: Optional[str], format: Optional[Union[str, dict]] = None) -> OllamaPrompt:
+        prompt = request
+        if self.fresh and self.preamble:
+            prompt = f"{self.preamble}\n\n{request}"
+        return OllamaPrompt(prompt=prompt, system=system or self.system, context=self.context, format=format, task=self.task, model=self.model)
+
+    def _advance(self):
+        self.calls += 1
+        self.prompt_tokens += self.client.last_prompt_tokens or 0
+        self.prompt_eval_duration += self.client.last_prompt_eval_duration or 0
+        context = self.client.last_context
+        if not self.enabled or context is None or len(context) > self.max_context:
+            if self.context is not None:
+                self.resets += 1
+                logger.info(f"{self.model} conversation context dropped after {self.calls} calls")
+            context = None
+        self.context = context
+        self.model = self.client.last_model if context is not None else None
+
+    async def generate_stream(self, request: str, system: Optional[str] = None, format: Optional[Union[str, dict]] = None) -> AsyncIterator[str]:
+        prompt = self._prompt(request, system, format)
+        started = False
+        try:
+            async for token in self.client.generate_stream(prompt):
+                started = True
+                yield token
+        except HTTPException as e:
+            if prompt.context is None or started:
+                raise
+            logger.warning(f"{self.model} rejected the conversation context ({e.detail}), starting over")
+            self.reset()
+            async for token in self.client.generate_stream(self._prompt(request, system, format)):
+                yield token
+        self._advance()
+
+    async def generate(self, request: str, system: Optional[str] = None, format: Optional[Union[str, dict]] = None) -> str:
+        full_response = ""
+        async for token in self.generate_stream(request, system, format):
+            full_response += token
+        return full_response
 
-        response = requests.post(url, json=data, headers=headers)
-        embeddings = response.json().get("data", [])
-        return embeddings
+    async def generate_model(self, request: str, model: Type[Model], system: Optional[str] = None, retries: int = 1) -> Model:
+        "`OllamaClient.generate_model` continuing the conversation"
+        schema = model.model_json_schema()
+        return await validated(lambda: self.generate(request, system, schema), model, retries)
 
 # Running the test
 async def main():
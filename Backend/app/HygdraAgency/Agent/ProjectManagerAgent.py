@@ -6,11 +6,21 @@ from HygdraAgency.DataModel.Task import Task, TaskStatus
 from HygdraAgency.DataModel.Project import Project 
 from HygdraAgency.DataModel.Service import Service 
 from HygdraAgency.Agent.BaseAgent import BaseAgent
-from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse, count_calls, TaskClass
 from os import mkdir
 from HygdraAgency.utils.rag import retrieve, Deps, Document, store_document
+from HygdraAgency.utils.stream import emit_step
+from HygdraAgency.utils.admission import Priority, llm_priority
 
 
+# --- Structured answers ---
+class NextTask(BaseModel):
+    done: bool # every task of the list has been generated, the other fields are then ignored
+    title: str = ""
+    description: str = "" # prompt optimised for an agent
+    dependencies: List[str] = [] # titles of the tasks already generated it depends on
+    remaining: str = "" # the to-do list with this task marked done
+
 # --- Enhanced Project Manager Agent ---
 class ProjectManagerAgent(BaseAgent):
     def __init__(self):
@@ -18,14 +28,19 @@ class ProjectManagerAgent(BaseAgent):
                         OllamaModelConfig(model_name="codellama", temperature=0.7))
 
     async def initialize_project(self, project_name: str, description: str) -> Project:
+        with count_calls(f"{self.name} initialize '{project_name}'") as calls, llm_priority(Priority.BACKGROUND, project_name):
+            project = await self._initialize_project(project_name, description)
+        self.logger.info(f"{project_name}: {calls['calls']} LLM calls for {len(project.tasks)} tasks")
+        return project
+
+    async def _initialize_project(self, project_name: str, description: str) -> Project:
         project_desc = description
         async with OllamaClient(self.ollama_config) as ollama:
+            conversation = ollama.conversation(f"Project Name: {project_name}\nDescription: {description}",
+                                     system="You are a technical project manager.", task=TaskClass.PLAN)
             # Generate task breakdown
-            task_prompt = OllamaPrompt(
-                prompt=f"""Project Name: {project_name}
-                Description: {description}
-
-                --- Request
+            emit_step(self.name, "task_breakdown")
+            task_breakdown = await conversation.generate("""--- Request
                 plan the action you need to tak to generate the following request :
                 [
                 Create a detailed to-do list to build this software project.
@@ -34,17 +49,12 @@ class ProjectManagerAgent(BaseAgent):
                 Break down the project into actionable tasks.
                 Provide a clear and structured to-do list that is easy to follow, 
                 ensuring each task has a specific goal and actionable steps.
-                ]""",
-                system="You are a technical project manager."
-            )
-            
-            task_breakdown = await ollama.generate(task_prompt)
+                ]""")
 
-            task_prompt = OllamaPrompt(
-                prompt=f"""Project Name: {project_name}
-                Description: {description}
-                
-                --- Request
+            emit_step(self.name, "refine_breakdown")
+            # the first breakdown was the last answer, only repeated when the context was dropped
+            previous_work = task_breakdown if conversation.fresh else ""
+            task_breakdown = await conversation.generate(f"""--- Request
                 Create a detailed to-do list to build this software project.
                 optimized it for other LLM agent.
                 The Task list focus only on coding and dev task.
@@ -53,12 +63,8 @@ class ProjectManagerAgent(BaseAgent):
                 ensuring each task has a specific goal and actionable steps.
                 
                 --- previous work :
-                {task_breakdown}
-                """,
-                system="You are a technical project manager."
-            )
-            
-            task_breakdown = await ollama.generate(task_prompt)
+                {previous_work}
+                """)
 
             project = Project(
                 id=f"proj-{str(datetime.now().timestamp())}-{project_name}",
@@ -74,6 +80,11 @@ class ProjectManagerAgent(BaseAgent):
             return project
         
     async def tchat(self, project:Project, request:str) -> str:
+        # a user waits on the answer, ahead of the background generations
+        with llm_priority(Priority.INTERACTIVE, project.id):
+            return await self._tchat(project, request)
+
+    async def _tchat(self, project:Project, request:str) -> str:
         async with OllamaClient(self.ollama_config) as ollama:
             # Generate implementation plan
             plan_prompt = OllamaPrompt(
@@ -81,11 +92,13 @@ class ProjectManagerAgent(BaseAgent):
                 Description: {project.tasks}
                 Which external ressources might be requiered to answer this request?
                 Context: {project.description}""",
-                system="You are a senior software developer. Create a detailed plan."
+                system="You are a senior software developer. Create a detailed plan.",
+                task=TaskClass.EXTRACT
             )
 
+            emit_step(self.name, "ressources")
             external_ressources = await ollama.generate(plan_prompt)
-            external_ressources = retrieve(project, external_ressources)
+            external_ressources = await retrieve(Deps(project, 5), external_ressources)
 
             plan_prompt = OllamaPrompt(
                 prompt=f"""Task: {request}
@@ -94,84 +107,56 @@ class ProjectManagerAgent(BaseAgent):
                 Context: {project.description}
                 external ressources : {external_ressources}
                 """,
-                system="You are a senior software developer. Create a detailed plan."
+                system="You are a senior software developer. Create a detailed plan.",
+                task=TaskClass.CHAT
             )
 
+            emit_step(self.name, "answer")
             response = await ollama.generate(plan_prompt) 
             return response
 
     async def generate_task(self, project:Project, first_though:str) -> str:
         tasks = []
         async with OllamaClient(self.ollama_config) as ollama:
+            # the project header is evaluated once, follow-up calls continue its KV context
+            conversation = ollama.conversation(f"Project Name: {project.name}\nDescription: {project.description}",
+                                               system="You are a technical project manager.", task=TaskClass.PLAN)
             i = 0
             while i < 20:
-                task_prompt = OllamaPrompt(
-                        prompt=f"""Project Name: {project.title}
-                        Description: {project.description}
-                        
-                        --- Request
-                        Select the next task todo,
-                        express what this task depend on.
-                        generate the response as a prompt optmised for agent.
-
-                        --- previous work :
-                        {first_though}
-                        """,
-                        system="You are a technical project manager."
-                    )
-                
-                selected_task_description = await ollama.generate(task_prompt)
-
-                task_prompt = OllamaPrompt(
-                        prompt=f"""Project Name: {project.title}
-                        Description: {project.description}
-                        
-                        --- Request
-                        name this task.
-
-                        --- task description :
-                        {selected_task_description}
-                        """,
-                        system="You are a technical project manager."
-                    )
-                
-                selected_task_title = await ollama.generate(task_prompt)
-
-                task_prompt = OllamaPrompt(
-                        prompt=f"""Project Name: {project.title}
-                        Description: {project.description}
-                        
-                        --- Request
-                        mark the task done and regenerate the list.
-                        Create a detailed to-do list to build this software project.
-                        optimized it for other LLM agent.
+                # after the first task the list is the `remaining` of the last answer, already in the context
+                task_list = first_though if i == 0 or conversation.fresh else ""
+                emit_step(self.name, "next_task")
+                try:
+                    next_task = await conversation.generate_model(f"""--- Request
+                        Select the next task todo from the list and name it,
+                        express what this task depend on among the tasks already generated.
+                        generate the description as a prompt optmised for agent.
+                        Then mark the task done and regenerate the list.
                         The Task list focus only on coding and dev task.
 
-                        --- task done :
-                        {selected_task_title}
-                        {selected_task_description}
-
                         --- task list :
-                        {first_though}
+                        {task_list}
 
                         ---- Important
-                        If all task has been generate then mark the project done by returning the words 'break'
-                        """,
-                        system="You are a technical project manager."
-                    )
-                
-                first_though = await ollama.generate(task_prompt)
+                        If all task has been generate then mark the project done.
+                        """, NextTask)
+                except ValueError as e:
+                    self.logger.error(f"Failed to parse next task, stopping at {len(tasks)} tasks: {e}")
+                    break
 
-                if "break" in first_though:
+                if next_task.done or not next_task.title.strip():
                     break
 
+                ids = {task.title: task.id for task in tasks}
                 tasks.append(Task(
                                 id=f"task-{i}",
-                                title=selected_task_title,
-                                description=selected_task_description,
-                                status=TaskStatus.TODO
+                                title=next_task.title,
+                                description=next_task.description,
+                                status=TaskStatus.TODO,
+                                dependencies=[ids[title] for title in next_task.dependencies if title in ids]
                             ))
+                first_though = next_task.remaining
                 i+= 1
-            
-            return tasks
 
+            self.logger.info(f"{project.name}: {conversation.prompt_tokens} prompt tokens evaluated in {conversation.prompt_eval_duration / 1e9:.2f}s over {conversation.calls} calls, {conversation.resets} context resets")
+            return tasks
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field
+from typing import List, Optional, Dict, Any, Tuple
 from enum import Enum
 from datetime import datetime
 import json
@@ -7,16 +7,111 @@ from HygdraAgency.DataModel.Task import Task, TaskStatus
 from HygdraAgency.DataModel.Project import Project 
 from HygdraAgency.DataModel.Service import Service 
 from HygdraAgency.Agent.BaseAgent import BaseAgent
-from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse, count_calls, TaskClass
+from HygdraAgency.utils.stream import emit, emit_step
+from HygdraAgency.utils.embeding import embedder
+from HygdraAgency.utils.admission import Priority, llm_priority
+import asyncio
+import hashlib
+import math
+import os
 import re
+import time
 
 
+# text embedded once per role by the embedding scorer
+ROLE_PROFILES = {
+    "Developer": "Developer: software development, programming, writing application code, implementing features, APIs, backend, frontend, data models, algorithms, refactoring, debugging.",
+    "Tester": "Tester: quality assurance, writing unit and integration tests, pytest, test plans, code review, static analysis, SonarQube, bug reports, validation.",
+    "DevOps": "DevOps Engineer: deployment, CI/CD pipelines, Jenkins, Docker, Kubernetes, Ansible, infrastructure, monitoring, cloud configuration, release automation.",
+}
+
+# --- Structured answers ---
+class TaskRequirements(BaseModel):
+    "requirement analysis of a task, fields the model adds on its own are kept"
+    model_config = ConfigDict(extra="allow")
+    primary_skill: str # the main technical skill needed
+    secondary_skills: List[str] = []
+    complexity: str = "Medium" # Low/Medium/High
+    estimated_duration: float = 4 # hours
+    best_role: str = "Developer" # Developer/Tester/DevOps
+    readiness: str = "READY" # FUTURE when the task needs requirements not achieved yet
+
+class SuitabilityMatrix(BaseModel):
+    scores: List[List[float]] # one row per task, one 0-1 score per agent
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
 def find_first_float(string):
     match = re.search(r'-?\d*\.\d+', string)
     if match:
         return float(match.group(0))
     return 0.5
 
+# --- Requirement analysis memo ---
+class AnalysisStoreStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    entries: int = 0
+
+class AnalysisEntry(BaseModel):
+    content_hash: str
+    achieved_fingerprint: str
+    status: TaskStatus
+    analysis: dict
+
+def content_hash(task: Task) -> str:
+    return hashlib.sha256(f"{task.title}\n{task.description}".encode()).hexdigest()
+
+def achieved_fingerprint(task_done: List[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(task_done)).encode()).hexdigest()
+
+class RequirementAnalysisStore:
+    """
+    Per-project memo of `analyze_task_requirements` results.
+
+    An entry is served only while the task text, the task status and the set
+    of achieved tasks are the ones it was computed with; any change makes the
+    next lookup a miss that replaces it.
+    """
+    def __init__(self):
+        self.projects: Dict[str, Dict[str, AnalysisEntry]] = {}
+        self.stats = AnalysisStoreStats()
+
+    def get(self, project_id: str, task: Task, task_done: List[str]) -> Optional[dict]:
+        entry = self.projects.get(project_id, {}).get(task.id)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        if (entry.content_hash, entry.achieved_fingerprint, entry.status) != (content_hash(task), achieved_fingerprint(task_done), task.status):
+            self.invalidate(project_id, task.id)
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return entry.analysis
+
+    def put(self, project_id: str, task: Task, task_done: List[str], analysis: dict):
+        self.projects.setdefault(project_id, {})[task.id] = AnalysisEntry(
+            content_hash=content_hash(task),
+            achieved_fingerprint=achieved_fingerprint(task_done),
+            status=task.status,
+            analysis=analysis,
+        )
+        self.stats.entries = sum(len(tasks) for tasks in self.projects.values())
+
+    def invalidate(self, project_id: str, task_id: Optional[str] = None):
+        "drop one task analysis, or every analysis of the project"
+        tasks = self.projects.get(project_id, {})
+        dropped = list(tasks) if task_id is None else [task_id] if task_id in tasks else []
+        for dropped_id in dropped:
+            del tasks[dropped_id]
+        self.stats.invalidations += len(dropped)
+        self.stats.entries = sum(len(tasks) for tasks in self.projects.values())
+
 # --- Task Assignment Agent ---
 class TaskAssignmentAgent(BaseAgent):
     def __init__(self):
@@ -25,8 +120,20 @@ class TaskAssignmentAgent(BaseAgent):
             "Task Assignment Manager",
             OllamaModelConfig(model_name="codellama", temperature=0.2)
         )
+        # LLM calls in flight at once while assigning a task
+        self.max_concurrency = int(os.getenv("TASK_ASSIGN_CONCURRENCY", "4"))
+        self.analysis_store = RequirementAnalysisStore()
+        # pairwise: one call per (task, agent), matrix: one call for all pairs, embedding: no generation
+        self.scoring_mode = os.getenv("TASK_SCORING_MODE", "pairwise")
+        self.embedding_temperature = float(os.getenv("TASK_SCORING_EMBEDDING_TEMPERATURE", "0.05"))
+        self._role_embeddings: Dict[str, List[float]] = {}
+
+    async def analyze_task_requirements(self, task: Task, task_done=List[str], project_id: Optional[str] = None) -> dict:
+        if project_id is not None:
+            analysis = self.analysis_store.get(project_id, task, task_done)
+            if analysis is not None:
+                return analysis
 
-    async def analyze_task_requirements(self, task: Task, task_done=List[str]) -> dict:
         async with OllamaClient(self.ollama_config) as ollama:
             prompt = OllamaPrompt(
                 prompt=f"""
@@ -40,6 +147,7 @@ class TaskAssignmentAgent(BaseAgent):
                 - complexity: Low/Medium/High
                 - estimated_duration: in hours
                 - best_role: Developer/Tester/DevOps
+                - readiness: READY or FUTURE
 
                 --- task already acheived :
                 {task_done}
@@ -48,14 +156,14 @@ class TaskAssignmentAgent(BaseAgent):
                 if the task got requirement that has not been filled yet, mark it as : 'FUTURE'
 
                 """,
-                system="You are a technical project coordinator. Analyze tasks and determine required expertise."
+                system="You are a technical project coordinator. Analyze tasks and determine required expertise.",
+                task=TaskClass.EXTRACT
             )
             
-            result = await ollama.generate(prompt)
             try:
-                return json.loads(result)
-            except json.JSONDecodeError:
-                self.logger.error(f"Failed to parse task analysis: {result}")
+                analysis = (await ollama.generate_model(prompt, TaskRequirements)).model_dump()
+            except ValueError as e:
+                self.logger.error(f"Failed to parse task analysis: {e}")
                 return {
                     "primary_skill": "unknown",
                     "secondary_skills": [],
@@ -64,6 +172,11 @@ class TaskAssignmentAgent(BaseAgent):
                     "best_role": "Developer"
                 }
 
+            # fallbacks are not memoized, the next call gets another chance to parse
+            if project_id is not None:
+                self.analysis_store.put(project_id, task, task_done, analysis)
+            return analysis
+
     async def evaluate_agent_suitability(self, agent: BaseAgent, task_requirements: dict) -> float:
         async with OllamaClient(self.ollama_config) as ollama:
             prompt = OllamaPrompt(
@@ -79,7 +192,8 @@ class TaskAssignmentAgent(BaseAgent):
                 Higher scores indicate better matches.
                 Only return the number, no other text.
                 """,
-                system="You are an AI task assignment specialist. Evaluate agent-task compatibility."
+                system="You are an AI task assignment specialist. Evaluate agent-task compatibility.",
+                task=TaskClass.CLASSIFY
             )
             
             try:
@@ -91,6 +205,16 @@ class TaskAssignmentAgent(BaseAgent):
                 return 0.5
 
     async def assign_next_task(self, project:Project, available_agents: List[BaseAgent]) -> tuple[Task, BaseAgent]:
+        start = time.perf_counter()
+        try:
+            with count_calls(f"{self.name} assignment '{project.id}'"), llm_priority(Priority.ASSIGNMENT, project.id):
+                return await self._assign_next_task(project, available_agents)
+        finally:
+            latency = time.perf_counter() - start
+            self.logger.info(f"Assignment for project '{project.id}' took {latency:.3f}s")
+            emit("metrics", {"agent": self.name, "assignment_latency": latency})
+
+    async def _assign_next_task(self, project:Project, available_agents: List[BaseAgent]) -> tuple[Task, BaseAgent]:
         # Find tasks that are ready to be worked on (all dependencies completed)
         ready_tasks = [
             task for task in project.tasks 
@@ -105,32 +229,19 @@ class TaskAssignmentAgent(BaseAgent):
         if not ready_tasks:
             return None, None
 
-        # Analyze each ready task and find the best task-agent match
-        best_match = None
+        if self.scoring_mode == "pairwise":
+            scores = await self._score_pairwise(project, ready_tasks, acheived_task, available_agents)
+        else:
+            scores = await self._score_all(project, ready_tasks, acheived_task, available_agents)
+
+        # best score wins, ties go to the earliest task then agent like the sequential loop
         best_score = -1
         best_task = None
         best_agent = None
-
-        # best task diff best agent, select task first
-        for task in ready_tasks:
-            # task priority
-            # Get task requirements
-            requirements = await self.analyze_task_requirements(task, acheived_task)
-            
-            if "FUTURE" not in str(requirements).upper():
-                # Evaluate each available agent
-                for agent in available_agents:
-                    score = await self.evaluate_agent_suitability(agent, requirements)
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_task = task
-                        best_agent = agent
-                        if best_score > 0.80:
-                            break
-                    
-            if best_score > 0.80:
-                break
+        if scores:
+            (task_index, agent_index), best_score = max(scores.items(), key=lambda item: (item[1], -item[0][0], -item[0][1]))
+            best_task = ready_tasks[task_index]
+            best_agent = available_agents[agent_index]
         
         if best_score >= 0.6:  # Minimum threshold for assignment
             self.logger.info(f"Assigning task '{best_task.title}' to {best_agent.role} (match score: {best_score})")
@@ -148,6 +259,148 @@ class TaskAssignmentAgent(BaseAgent):
             self.logger.warn(f"Using fallback assignment for task '{task.title}' to {agent.role}")
             return task, agent
 
+    async def select_agent(self, project: Project, task: Task, available_agents: List[BaseAgent]) -> BaseAgent:
+        "best agent for a task the scheduler already picked, same scoring and fallback as assign_next_task"
+        acheived_task = [
+            other.title for other in project.tasks 
+            if other.status == TaskStatus.DONE or other.status == TaskStatus.REVIEW
+        ]
+        if self.scoring_mode == "pairwise":
+            scores = await self._score_pairwise(project, [task], acheived_task, available_agents)
+        else:
+            scores = await self._score_all(project, [task], acheived_task, available_agents)
+
+        if scores:
+            (_, agent_index), score = max(scores.items(), key=lambda item: (item[1], -item[0][1]))
+            if score >= 0.6:
+                return available_agents[agent_index]
+        return next((a for a in available_agents if a.role == "Developer"), available_agents[0])
+
+    async def _score_pairwise(self, project: Project, ready_tasks: List[Task], acheived_task: List[str],
+                              available_agents: List[BaseAgent]) -> Dict[Tuple[int, int], float]:
+        "one LLM call per task analysis and per (task, agent) pair, stops at the first score above 0.80"
+        # Analyze every ready task and score every agent concurrently, under a shared limit
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def analyze(task_index: int, task: Task):
+            async with semaphore:
+                emit_step(self.name, "analyze_task", task=task.id)
+                return "requirements", task_index, await self.analyze_task_requirements(task, acheived_task, project.id)
+
+        async def evaluate(task_index: int, agent_index: int, requirements: dict):
+            async with semaphore:
+                emit_step(self.name, "evaluate_agent", task=ready_tasks[task_index].id, candidate=available_agents[agent_index].name)
+                return "score", (task_index, agent_index), await self.evaluate_agent_suitability(available_agents[agent_index], requirements)
+
+        pending = {asyncio.create_task(analyze(i, task)) for i, task in enumerate(ready_tasks)}
+        spawned = set(pending)
+        scores = {}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    kind, index, value = finished.result()
+                    if kind == "requirements":
+                        if "FUTURE" not in str(value).upper():
+                            evaluations = {asyncio.create_task(evaluate(index, j, value)) for j in range(len(available_agents))}
+                            pending |= evaluations
+                            spawned |= evaluations
+                    else:
+                        scores[index] = value
+
+                # a match above 0.80 is good enough, drop the outstanding calls
+                if any(score > 0.80 for score in scores.values()):
+                    break
+        finally:
+            for outstanding in pending:
+                outstanding.cancel()
+            # also collects errors of finished calls left unread when one of them raised
+            await asyncio.gather(*spawned, return_exceptions=True)
+
+        return scores
+
+    async def _score_all(self, project: Project, ready_tasks: List[Task], acheived_task: List[str],
+                         available_agents: List[BaseAgent]) -> Dict[Tuple[int, int], float]:
+        "analyze every ready task, then score the whole task x agent matrix at once"
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def analyze(task: Task) -> dict:
+            async with semaphore:
+                emit_step(self.name, "analyze_task", task=task.id)
+                return await self.analyze_task_requirements(task, acheived_task, project.id)
+
+        analyses = await asyncio.gather(*(analyze(task) for task in ready_tasks))
+        candidates = [(i, requirements) for i, requirements in enumerate(analyses) if "FUTURE" not in str(requirements).upper()]
+        if not candidates or not available_agents:
+            return {}
+
+        emit_step(self.name, f"{self.scoring_mode}_scoring", tasks=len(candidates), agents=len(available_agents))
+        requirements = [requirements for _, requirements in candidates]
+        if self.scoring_mode == "matrix":
+            matrix = await self.evaluate_suitability_matrix(available_agents, requirements)
+        elif self.scoring_mode == "embedding":
+            matrix = await self.evaluate_suitability_by_embedding(available_agents, requirements)
+        else:
+            raise ValueError(f"Unknown task scoring mode: {self.scoring_mode}")
+
+        return {
+            (task_index, agent_index): score
+            for (task_index, _), row in zip(candidates, matrix)
+            for agent_index, score in enumerate(row)
+        }
+
+    async def evaluate_suitability_matrix(self, agents: List[BaseAgent], task_requirements: List[dict]) -> List[List[float]]:
+        "score every task against every agent in a single structured LLM call"
+        async with OllamaClient(self.ollama_config) as ollama:
+            prompt = OllamaPrompt(
+                prompt=f"""
+                Evaluate how well each agent matches each task requirements:
+                Agents (columns):
+                {json.dumps([{"index": j, "role": agent.role} for j, agent in enumerate(agents)], indent=2)}
+
+                Tasks (rows):
+                {json.dumps([{"index": i, "requirements": requirements} for i, requirements in enumerate(task_requirements)], indent=2)}
+
+                --- important :
+                Return only a JSON object of the form {{"scores": [[...], ...]}}
+                with one row per task and one number between 0 and 1 per agent in each row.
+                Higher scores indicate better matches.
+                """,
+                system="You are an AI task assignment specialist. Evaluate agent-task compatibility.",
+                task=TaskClass.CLASSIFY
+            )
+
+            try:
+                matrix = (await ollama.generate_model(prompt, SuitabilityMatrix)).scores
+                if len(matrix) != len(task_requirements) or any(len(row) != len(agents) for row in matrix):
+                    raise ValueError(f"expected a {len(task_requirements)}x{len(agents)} matrix")
+                return [[min(max(score, 0), 1) for score in row] for row in matrix]
+            except ValueError as e:
+                self.logger.error(f"Failed to parse suitability matrix ({e}), scoring pairwise")
+                return [
+                    list(await asyncio.gather(*(self.evaluate_agent_suitability(agent, requirements) for agent in agents)))
+                    for requirements in task_requirements
+                ]
+
+    async def evaluate_suitability_by_embedding(self, agents: List[BaseAgent], task_requirements: List[dict]) -> List[List[float]]:
+        "similarity between requirement analyses and role profile embeddings, no generation call"
+        missing = [agent.role for agent in agents if agent.role not in self._role_embeddings]
+        if missing:
+            vectors = await embedder.embed_many([ROLE_PROFILES.get(role, role) for role in missing])
+            self._role_embeddings.update(zip(missing, vectors))
+
+        requirement_vectors = await embedder.embed_many([json.dumps(requirements, sort_keys=True) for requirements in task_requirements])
+
+        # raw cosines of related texts sit in a narrow band, a softmax across agents
+        # turns the margins into 0-1 scores comparable with the LLM ones
+        matrix = []
+        for vector in requirement_vectors:
+            similarities = [cosine_similarity(vector, self._role_embeddings[agent.role]) for agent in agents]
+            top = max(similarities)
+            weights = [math.exp((similarity - top) / self.embedding_temperature) for similarity in similarities]
+            matrix.append([weight / sum(weights) for weight in weights])
+        return matrix
+
     async def explain_assignment(self, task: Task, agent: BaseAgent) -> str:
         """Provide explanation for why this agent was chosen for the task"""
         async with OllamaClient(self.ollama_config) as ollama:
@@ -160,7 +413,8 @@ class TaskAssignmentAgent(BaseAgent):
                 
                 Provide a brief, clear explanation of why this is a good match.
                 """,
-                system="You are a technical project coordinator. Explain task assignments clearly and concisely."
+                system="You are a technical project coordinator. Explain task assignments clearly and concisely.",
+                task=TaskClass.CHAT
             )
             
             return await ollama.generate(prompt)
\ No newline at end of file
@@ -7,7 +7,8 @@ from HygdraAgency.DataModel.Task import Task, TaskStatus
 from HygdraAgency.DataModel.Project import Project 
 from HygdraAgency.DataModel.Service import Service 
 from HygdraAgency.Agent.BaseAgent import BaseAgent
-from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaResponse, TaskClass
+from HygdraAgency.utils.stream import emit_step
 from pathlib import Path
 import subprocess
 import os
@@ -58,9 +59,11 @@ class TesterAgent(BaseAgent):
                 - Error scenarios
                 Include proper assertions and documentation.
                 """,
-                system="You are a QA engineer specializing in Python testing. Write comprehensive, production-quality tests."
+                system="You are a QA engineer specializing in Python testing. Write comprehensive, production-quality tests.",
+                task=TaskClass.CODE
             )
             
+            emit_step(self.name, "unit_tests")
             return await ollama.generate(prompt)
 
     async def run_pytest(self, test_file: str) -> TestResult:
@@ -118,9 +121,11 @@ class TesterAgent(BaseAgent):
                 - Error cases
                 Use pytest fixtures and proper assertions.
                 """,
-                system="You are a QA engineer specializing in FastAPI testing."
+                system="You are a QA engineer specializing in FastAPI testing.",
+                task=TaskClass.CODE
             )
             
+            emit_step(self.name, "api_tests")
             api_tests = await ollama.generate(prompt)
             
             # Save generated tests to a temporary file
@@ -258,7 +263,9 @@ class TesterAgent(BaseAgent):
                 3. Addressing code quality issues
                 4. Enhancing overall code reliability
                 """,
-                system="You are a senior QA engineer providing technical recommendations."
+                system="You are a senior QA engineer providing technical recommendations.",
+                task=TaskClass.CHAT
             )
             
+            emit_step(self.name, "recommendations")
             return await ollama.generate(prompt)
\ No newline at end of file
@@ -1,2 +1,2 @@
-__all__ = ["rag", "embeding", "viz"]
+__all__ = ["rag", "embeding", "viz", "stream", "cache", "ingest", "scheduler", "jobs", "store", "shared", "search", "budget", "artifacts", "telemetry", "coalesce", "admission"]
 # make an app vizualizer ? oswordld 
\ No newline at end of file
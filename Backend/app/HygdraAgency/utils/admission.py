@@ -0,0 +1,173 @@
+from pydantic import BaseModel
+from typing import AsyncIterator, Deque, Dict, Iterator, Optional, Tuple
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from HygdraAgency.utils.telemetry import telemetry
+import asyncio
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger("Admission")
+
+
+# --- Priority-aware admission of LLM generations ---
+class Priority(str, Enum):
+    # in order of precedence
+    INTERACTIVE = "interactive" # a user waits on the answer, chat
+    ASSIGNMENT = "assignment" # task assignment, short and blocks the next task
+    BACKGROUND = "background" # project breakdowns and code generation
+
+class SchedulerConfig(BaseModel):
+    max_in_flight: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "4")) # generations sent to ollama at once, match OLLAMA_NUM_PARALLEL; 0 admits all
+    max_queued: Dict[Priority, int] = { # waiting per class, past that calls are refused
+        Priority.INTERACTIVE: int(os.getenv("LLM_MAX_QUEUED_INTERACTIVE", "16")),
+        Priority.ASSIGNMENT: int(os.getenv("LLM_MAX_QUEUED_ASSIGNMENT", "64")),
+        Priority.BACKGROUND: int(os.getenv("LLM_MAX_QUEUED_BACKGROUND", "256")),
+    }
+    service_time: float = float(os.getenv("LLM_SERVICE_TIME", "5")) # seconds, first guess of a generation length for Retry-After
+
+class SchedulerStats(BaseModel):
+    admitted: Dict[Priority, int] = {priority: 0 for priority in Priority}
+    rejected: Dict[Priority, int] = {priority: 0 for priority in Priority}
+    queued: Dict[Priority, int] = {priority: 0 for priority in Priority} # waiting now
+    in_flight: Dict[Priority, int] = {priority: 0 for priority in Priority} # holding a slot now
+    wait: Dict[Priority, float] = {priority: 0 for priority in Priority} # seconds waited, summed over the admitted calls
+    service_time: float = 0 # seconds a slot is held, moving average
+
+class SchedulerSaturated(Exception):
+    "raised by `LLMScheduler.slot` when the queue of the priority class is full"
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# priority class and project of the LLM calls of the running workflow
+_current_priority: ContextVar[Tuple[Priority, str]] = ContextVar("hygdra_llm_priority", default=(Priority.BACKGROUND, ""))
+
+@contextmanager
+def llm_priority(priority: Priority, project_id: Optional[str] = None) -> Iterator[None]:
+    "schedule the generations made under the block, including by the tasks it spawns, as `priority` calls of the project"
+    token = _current_priority.set((priority, project_id or ""))
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+def current_priority() -> Tuple[Priority, str]:
+    return _current_priority.get()
+
+class LLMScheduler:
+    """
+    Central admission of generations in front of ollama.
+
+    At most `max_in_flight` generations run at once. Past that, calls wait
+    in one queue per priority class: a freed slot goes to the most urgent
+    class waiting, and within a class to the projects in turn, so one
+    project looping over its tasks does not hold back the others. A class
+    whose queue is full refuses new calls with SchedulerSaturated, which
+    carries a Retry-After estimated from the queue ahead and the moving
+    average of how long a slot is held.
+
+    The priority class and project of a call come from `llm_priority`.
+    Queue waits, depths, slots in use and refusals go to the telemetry.
+    """
+    def __init__(self, config: Optional[SchedulerConfig] = None):
+        self.config = config or SchedulerConfig()
+        self.stats = SchedulerStats(service_time=self.config.service_time)
+        # class -> project -> waiting calls, projects in turn order
+        self._queues: Dict[Priority, "OrderedDict[str, Deque[asyncio.Future]]"] = {priority: OrderedDict() for priority in Priority}
+        self._in_flight = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.max_in_flight > 0
+
+    def retry_after(self, priority: Priority) -> int:
+        "seconds until the calls ahead of a new `priority` call are likely done"
+        ranks = list(Priority)
+        ahead = self._in_flight + sum(self.stats.queued[other] for other in ranks[:ranks.index(priority) + 1])
+        return max(1, math.ceil(ahead * self.stats.service_time / self.config.max_in_flight))
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        "hold a generation slot for the block, waiting for one in the queue of the current priority class"
+        if not self.enabled:
+            yield
+            return
+
+        priority, project = current_priority()
+        start = time.perf_counter()
+        if self._in_flight >= self.config.max_in_flight:
+            await self._wait(priority, project)
+        else:
+            self._in_flight += 1
+        waited = time.perf_counter() - start
+        self.stats.admitted[priority] += 1
+        self.stats.wait[priority] += waited
+        self._update(priority, in_flight=1)
+        telemetry.observe("hygdra_llm_queue_wait_seconds", (priority.value,), waited)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - start
+            self.stats.service_time = 0.9 * self.stats.service_time + 0.1 * held
+            self._update(priority, in_flight=-1)
+            self._release()
+
+    async def _wait(self, priority: Priority, project: str):
+        queue = self._queues[priority]
+        if self.stats.queued[priority] >= self.config.max_queued[priority]:
+            self.stats.rejected[priority] += 1
+            telemetry.count("hygdra_llm_rejected_total", priority.value)
+            retry_after = self.retry_after(priority)
+            logger.warning(f"{priority.value} LLM queue full, {self.stats.queued[priority]} calls waiting, retry in {retry_after}s")
+            raise SchedulerSaturated(f"{self.stats.queued[priority]} {priority.value} LLM calls already queued", retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.setdefault(project, deque()).append(waiter)
+        self._update(priority, queued=1)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over as the caller went away
+                self._release()
+            else:
+                waiters = queue.get(project)
+                if waiters is not None and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del queue[project]
+                    self._update(priority, queued=-1)
+            raise
+
+    def _release(self):
+        "hand the freed slot to the next waiting call, or give it back"
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue:
+                project, waiters = next(iter(queue.items()))
+                waiter = waiters.popleft()
+                # the project goes to the back of its class
+                del queue[project]
+                if waiters:
+                    queue[project] = waiters
+                self._update(priority, queued=-1)
+                # a caller cancelled while waiting leaves its future behind until it runs again
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self._in_flight -= 1
+
+    def _update(self, priority: Priority, queued: int = 0, in_flight: int = 0):
+        self.stats.queued[priority] += queued
+        self.stats.in_flight[priority] += in_flight
+        telemetry.gauge("hygdra_llm_queue_depth", priority.value, self.stats.queued[priority])
+        telemetry.gauge("hygdra_llm_in_flight", priority.value, self.stats.in_flight[priority])
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,218 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger("Artifacts")
+
+
+# --- Content-addressed store of generated code ---
+class Artifact(BaseModel):
+    filename: str
+    sha256: str
+    size: int
+    langage: str = ""
+    description: str = ""
+
+class ArtifactStats(BaseModel):
+    written: int = 0 # contents stored for the first time
+    deduplicated: int = 0 # contents already stored for another file or task
+    unchanged: int = 0 # files already up to date, nothing written
+    snapshots: int = 0
+
+def safe_name(name: str) -> str:
+    "a single path component, never a parent or hidden entry"
+    name = os.path.basename(str(name).strip().replace("\\", "/")).lstrip(".")
+    return name or "unnamed"
+
+def atomic_write(path: str, data: bytes):
+    "write a temporary file next to `path` and rename it, readers never see a partial file"
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+class ArtifactStore:
+    """
+    Generated code files, stored by content.
+
+    Each content is kept once under `.objects/` by its sha256 and linked to
+    `<project>/<task>/<filename>`, so the tree can be browsed or copied as
+    is. Each task directory has a `.manifest.json` mapping its file names
+    to their hash. Writing a file whose hash is already in the manifest
+    does nothing, and identical contents share one object whatever their
+    name or task. Every write renames a complete temporary file into place.
+
+    A snapshot copies a task manifest and costs no file copy; restoring it
+    relinks only the files that differ.
+    """
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("GENERATED_CODE_PATH", "generated_code")
+        self.stats = ArtifactStats()
+        self._locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    # layout
+    def project_dir(self, project_id: str) -> str:
+        return os.path.join(self.root, safe_name(project_id))
+
+    def task_dir(self, project_id: str, task_id: str) -> str:
+        return os.path.join(self.project_dir(project_id), safe_name(task_id))
+
+    def _object(self, sha256: str) -> str:
+        return os.path.join(self.root, ".objects", sha256[:2], sha256)
+
+    def _snapshot(self, project_id: str, task_id: str, snapshot_id: str) -> str:
+        return os.path.join(self.project_dir(project_id), ".snapshots", safe_name(task_id), f"{safe_name(snapshot_id)}.json")
+
+    def _lock(self, project_id: str, task_id: str) -> threading.Lock:
+        "serializes the updates of one task manifest"
+        with self._guard:
+            return self._locks.setdefault((project_id, task_id), threading.Lock())
+
+    # manifests
+    def _read_manifest(self, path: str) -> Dict[str, Artifact]:
+        if not os.path.exists(path):
+            return {}
+        with open(path) as file:
+            return {name: Artifact(**artifact) for name, artifact in json.load(file).items()}
+
+    def _write_manifest(self, path: str, manifest: Dict[str, Artifact]):
+        data = {name: artifact.model_dump() for name, artifact in sorted(manifest.items())}
+        atomic_write(path, json.dumps(data, indent=2).encode())
+
+    def _manifest_path(self, project_id: str, task_id: str) -> str:
+        return os.path.join(self.task_dir(project_id, task_id), ".manifest.json")
+
+    # files
+    def _store_object(self, sha256: str, data: bytes):
+        path = self._object(sha256)
+        if os.path.exists(path):
+            self.stats.deduplicated += 1
+            return
+        atomic_write(path, data)
+        self.stats.written += 1
+
+    def _link(self, sha256: str, path: str):
+        "point `path` at the stored object, a copy where hard links are not supported"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = os.path.join(os.path.dirname(path), f".tmp-{os.path.basename(path)}-{threading.get_ident()}")
+        try:
+            os.link(self._object(sha256), tmp)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            with open(self._object(sha256), "rb") as file:
+                atomic_write(path, file.read())
+
+    def _put_many(self, project_id: str, task_id: str, files: List[Tuple[str, str, dict]]) -> List[Artifact]:
+        directory = self.task_dir(project_id, task_id)
+        manifest_path = self._manifest_path(project_id, task_id)
+        with self._lock(project_id, task_id):
+            manifest = self._read_manifest(manifest_path)
+            artifacts = []
+            for filename, content, meta in files:
+                name = safe_name(filename)
+                data = content.encode()
+                sha256 = hashlib.sha256(data).hexdigest()
+                current = manifest.get(name)
+                if current is not None and current.sha256 == sha256 and os.path.exists(os.path.join(directory, name)):
+                    self.stats.unchanged += 1
+                else:
+                    self._store_object(sha256, data)
+                    self._link(sha256, os.path.join(directory, name))
+                manifest[name] = Artifact(filename=name, sha256=sha256, size=len(data), **meta)
+                artifacts.append(manifest[name])
+            self._write_manifest(manifest_path, manifest)
+        return artifacts
+
+    def _restore(self, project_id: str, task_id: str, snapshot_id: str) -> Dict[str, Artifact]:
+        path = self._snapshot(project_id, task_id, snapshot_id)
+        if not os.path.exists(path):
+            raise KeyError(snapshot_id)
+        directory = self.task_dir(project_id, task_id)
+        manifest_path = self._manifest_path(project_id, task_id)
+        with self._lock(project_id, task_id):
+            target = self._read_manifest(path)
+            current = self._read_manifest(manifest_path)
+            for name, artifact in target.items():
+                if name not in current or current[name].sha256 != artifact.sha256 or not os.path.exists(os.path.join(directory, name)):
+                    self._link(artifact.sha256, os.path.join(directory, name))
+            for name in set(current) - set(target):
+                if os.path.exists(os.path.join(directory, name)):
+                    os.unlink(os.path.join(directory, name))
+            self._write_manifest(manifest_path, target)
+        return target
+
+    def _snapshot_task(self, project_id: str, task_id: str) -> str:
+        manifest = self._read_manifest(self._manifest_path(project_id, task_id))
+        data = json.dumps({name: artifact.model_dump() for name, artifact in sorted(manifest.items())}, indent=2).encode()
+        # the same output always gives the same snapshot id
+        snapshot_id = hashlib.sha256(data).hexdigest()[:16]
+        path = self._snapshot(project_id, task_id, snapshot_id)
+        if not os.path.exists(path):
+            atomic_write(path, data)
+            self.stats.snapshots += 1
+        return snapshot_id
+
+    def _project_manifest(self, project_id: str) -> Dict[str, Dict[str, Artifact]]:
+        directory = self.project_dir(project_id)
+        if not os.path.isdir(directory):
+            return {}
+        return {
+            task_id: self._read_manifest(self._manifest_path(project_id, task_id))
+            for task_id in sorted(os.listdir(directory))
+            if os.path.exists(self._manifest_path(project_id, task_id))
+        }
+
+    def _read(self, project_id: str, task_id: str, filename: str) -> Optional[str]:
+        artifact = self._read_manifest(self._manifest_path(project_id, task_id)).get(safe_name(filename))
+        if artifact is None:
+            return None
+        with open(self._object(artifact.sha256), encoding="utf-8") as file:
+            return file.read()
+
+    # async API, file system work runs in a thread
+    async def create_project(self, project_id: str):
+        await asyncio.to_thread(os.makedirs, self.project_dir(project_id), exist_ok=True)
+
+    async def put(self, project_id: str, task_id: str, filename: str, content: str, **meta) -> Artifact:
+        "store one file of a task, see `put_many`"
+        return (await self.put_many(project_id, task_id, [(filename, content, meta)]))[0]
+
+    async def put_many(self, project_id: str, task_id: str, files: List[Tuple[str, str, dict]]) -> List[Artifact]:
+        "store `(filename, content, metadata)` files of a task, files already up to date are not written"
+        return await asyncio.to_thread(self._put_many, project_id, task_id, files)
+
+    async def read(self, project_id: str, task_id: str, filename: str) -> Optional[str]:
+        return await asyncio.to_thread(self._read, project_id, task_id, filename)
+
+    async def manifest(self, project_id: str, task_id: str) -> Dict[str, Artifact]:
+        return await asyncio.to_thread(self._read_manifest, self._manifest_path(project_id, task_id))
+
+    async def project_manifest(self, project_id: str) -> Dict[str, Dict[str, Artifact]]:
+        "manifests of every task of the project that produced files"
+        return await asyncio.to_thread(self._project_manifest, project_id)
+
+    async def snapshot(self, project_id: str, task_id: str) -> str:
+        "record the current output of a task, returns the snapshot id"
+        return await asyncio.to_thread(self._snapshot_task, project_id, task_id)
+
+    async def restore(self, project_id: str, task_id: str, snapshot_id: str) -> Dict[str, Artifact]:
+        "bring the task output back to a snapshot, KeyError when it does not exist"
+        return await asyncio.to_thread(self._restore, project_id, task_id, snapshot_id)
+
+artifact_store = ArtifactStore()
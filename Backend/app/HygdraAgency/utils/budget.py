@@ -0,0 +1,119 @@
+from pydantic import BaseModel
+from typing import List
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaPrompt, TaskClass
+from HygdraAgency.utils.rag import Hit, format_hits
+from HygdraAgency.utils.stream import emit
+import logging
+import os
+import re
+
+logger = logging.getLogger("Budget")
+
+# words, numbers and single punctuation marks, close to what a BPE tokenizer splits
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+# --- Prompt context budget ---
+class ContextBudgetConfig(BaseModel):
+    prompt_tokens: int = int(os.getenv("CONTEXT_BUDGET_TOKENS", "3000")) # whole prompt, leaves room in a 4k context for the answer
+    section_tokens: int = int(os.getenv("CONTEXT_SECTION_TOKENS", "400")) # task and project descriptions
+    plan_tokens: int = int(os.getenv("PLAN_COMPACT_TOKENS", "600")) # the plan is compacted past this size
+    compact_attempts: int = int(os.getenv("PLAN_COMPACT_ATTEMPTS", "2")) # summaries asked, each shorter, before keeping the plan whole
+    resources: int = int(os.getenv("CONTEXT_RESOURCES", "8")) # documents retrieved, ranked and trimmed to fit
+
+def count_tokens(text: str) -> int:
+    "approximate token count, long words count for several tokens"
+    return sum(max(1, len(piece) // 4) for piece in TOKEN_PATTERN.findall(text or ""))
+
+def trim_tokens(text: str, max_tokens: int) -> str:
+    "the head of `text` holding at most `max_tokens` tokens"
+    used = 0
+    for match in TOKEN_PATTERN.finditer(text or ""):
+        used += max(1, len(match.group()) // 4)
+        if used > max_tokens:
+            return text[:match.start()].rstrip() + " [...]"
+    return text
+
+class ContextBudget:
+    """
+    Keeps agent prompts under a token budget.
+
+    Fixed sections (task, descriptions, request) are capped, retrieved
+    resources are ranked by relevance and packed into whatever the budget
+    leaves, and a plan growing past `plan_tokens` is rewritten by the model
+    into a compact running summary. The plan is never cut, its tail holds
+    the remaining work. Every prompt is measured section by
+    section, logged and pushed as a `metrics` event.
+    """
+    def __init__(self, config: ContextBudgetConfig = None):
+        self.config = config or ContextBudgetConfig()
+
+    def section(self, text: str) -> str:
+        return trim_tokens(text, self.config.section_tokens)
+
+    def remaining(self, *sections: str) -> int:
+        "tokens left for resources once the given sections are in the prompt"
+        return max(self.config.prompt_tokens - sum(count_tokens(section) for section in sections), 0)
+
+    def fit_resources(self, hits: List[Hit], max_tokens: int) -> str:
+        "the most relevant distinct documents that fit in `max_tokens`, the last one trimmed"
+        kept: List[Hit] = []
+        seen = set()
+        used = 0
+        for hit in sorted(hits, key=lambda hit: hit.score, reverse=True):
+            if hit.content in seen:
+                continue
+            seen.add(hit.content)
+            cost = count_tokens(format_hits([hit]))
+            if used + cost <= max_tokens:
+                kept.append(hit)
+                used += cost
+            elif max_tokens - used > 50:
+                header = count_tokens(format_hits([Hit(hit.id, "", hit.metadata)]))
+                kept.append(Hit(hit.id, trim_tokens(hit.content, max_tokens - used - header), hit.metadata, hit.score))
+                break
+            else:
+                break
+        return format_hits(kept)
+
+    def measure(self, agent: str, step: str, iteration: int = 0, **sections: str) -> int:
+        "log the token count of each prompt section and of the whole prompt"
+        counts = {name: count_tokens(text) for name, text in sections.items()}
+        total = sum(counts.values())
+        logger.info(f"{agent} {step}#{iteration} prompt ~{total} tokens {counts}")
+        emit("metrics", {"agent": agent, "step": step, "iteration": iteration, "prompt_tokens": total, "sections": counts})
+        return total
+
+    async def compact_plan(self, ollama: OllamaClient, plan: str, task: str) -> str:
+        "a compact rewrite of the plan when it outgrew `plan_tokens`, the whole plan when no rewrite fits"
+        before = count_tokens(plan)
+        if before <= self.config.plan_tokens:
+            return plan
+
+        words = self.config.plan_tokens // 2
+        for attempt in range(self.config.compact_attempts):
+            summary = await ollama.generate(OllamaPrompt(
+                prompt=f"""Task: {task}
+                plan :
+                {plan}
+                --- request :
+                Rewrite this implementation plan as a compact checklist.
+                One line listing the files already done.
+                One line per remaining file with its name, langage and function headers.
+                Keep it under {words} words, no prose.
+                """,
+                system="You are a senior software developer. Summarize plans without losing remaining work.",
+                task=TaskClass.EXTRACT
+            ))
+            after = count_tokens(summary)
+            if after <= self.config.plan_tokens and after < before:
+                logger.info(f"plan compacted from ~{before} to ~{after} tokens")
+                emit("metrics", {"step": "compact_plan", "plan_tokens_before": before, "plan_tokens_after": after})
+                return summary
+            logger.info(f"plan summary #{attempt} of ~{after} tokens does not fit in ~{self.config.plan_tokens}, asking for a shorter one")
+            words //= 2
+
+        # cutting the plan would drop its remaining files
+        logger.warning(f"plan of ~{before} tokens could not be compacted, kept whole")
+        emit("metrics", {"step": "compact_plan", "plan_tokens_before": before, "plan_tokens_after": before})
+        return plan
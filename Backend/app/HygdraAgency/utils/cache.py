@@ -0,0 +1,142 @@
+from pydantic import BaseModel
+from typing import Optional, Any
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+
+
+# --- Content-addressed LLM response cache ---
+class CacheStats(BaseModel):
+    hits: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+    max_bytes: int = 0
+
+def cache_key(model: str, system: Optional[str], prompt: str, template: Optional[str], options: Optional[dict], context: Any = None, format: Any = None) -> str:
+    "sha256 of the canonical JSON of everything that shapes a generation"
+    shape = {"model": model, "system": system, "prompt": prompt, "template": template, "options": options or {}, "context": context}
+    if format is not None:
+        # only present when set, keys of free-form generations are unchanged
+        shape["format"] = format
+    material = json.dumps(
+        shape,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+class DiskCache:
+    "SQLite tier, survives restarts"
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            # shared by every API worker
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._db.commit()
+        return self._db
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)", (key, value))
+            db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+            self._db = None
+
+class ResponseCache:
+    """
+    Two-tier cache for ollama generations.
+
+    An in-memory LRU bounded by the byte size of the stored responses sits in
+    front of an optional SQLite file. Entries evicted from memory stay on
+    disk and are promoted back on the next hit.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk = DiskCache(path) if path else None
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self.stats = CacheStats(max_bytes=max_bytes)
+
+    def _remember(self, key: str, value: str):
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._bytes -= len(self._entries.pop(key).encode())
+        self._entries[key] = value
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.encode())
+            self.stats.evictions += 1
+        self.stats.entries = len(self._entries)
+        self.stats.bytes = self._bytes
+
+    async def get(self, key: str) -> Optional[str]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            self.stats.memory_hits += 1
+            return self._entries[key]
+
+        if self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self._remember(key, value)
+                self.stats.hits += 1
+                self.stats.disk_hits += 1
+                return value
+
+        self.stats.misses += 1
+        return None
+
+    async def put(self, key: str, value: str):
+        self._remember(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, value)
+
+    def bypass(self):
+        "count a lookup skipped because the request is not cacheable"
+        self.stats.bypassed += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self.stats = CacheStats(max_bytes=self.max_bytes)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+response_cache = ResponseCache(
+    max_bytes=int(os.getenv("OLLAMA_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    path=os.getenv("OLLAMA_CACHE_PATH", "cache/ollama_responses.sqlite") or None,
+)
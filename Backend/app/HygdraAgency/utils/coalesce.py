@@ -0,0 +1,107 @@
+from pydantic import BaseModel
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional, Tuple
+from contextlib import asynccontextmanager
+import asyncio
+import os
+
+
+# --- Single-flight coalescing of identical in-flight calls ---
+class CoalesceStats(BaseModel):
+    leaders: int = 0 # calls actually sent
+    coalesced: int = 0 # calls that joined one already in flight
+    abandoned: int = 0 # calls dropped once nobody listened anymore
+
+class Flight:
+    "one call in flight, the items it produced so far and how it ended"
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.producer: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[Any]:
+        "every item from the first one, then the error of the call if it failed"
+        index = 0
+        while True:
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+class SingleFlight:
+    """
+    Shares one in-flight call between concurrent callers asking the same thing.
+
+    The first caller of a key starts the call in a task of its own and every
+    caller of the key, itself included, follows its items as they come:
+    late joiners replay the items produced so far, then stream along, and a
+    failure reaches everyone. The call is dropped once its last follower
+    leaves, and the key is free again as soon as the call ends.
+    """
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = os.getenv("OLLAMA_COALESCE", "true").lower() == "true" if enabled is None else enabled
+        self.flights: Dict[Hashable, Flight] = {}
+        self.stats = CoalesceStats()
+
+    @asynccontextmanager
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Tuple[bool, AsyncIterator[Any]]]:
+        "whether this caller started the call, and the items of the call"
+        if not self.enabled:
+            self.stats.leaders += 1
+            items = factory()
+            try:
+                yield True, items
+            finally:
+                await items.aclose()
+            return
+
+        flight = self.flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = self.flights[key] = Flight()
+            flight.producer = asyncio.create_task(self._run(key, flight, factory))
+            self.stats.leaders += 1
+        else:
+            self.stats.coalesced += 1
+        flight.subscribers += 1
+        items = flight.follow()
+        try:
+            yield leader, items
+        finally:
+            await items.aclose()
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # nobody joins a call being cancelled
+                self._release(key, flight)
+                flight.producer.cancel()
+                self.stats.abandoned += 1
+
+    def _release(self, key: Hashable, flight: Flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+    async def _run(self, key: Hashable, flight: Flight, factory: Callable[[], AsyncIterator[Any]]):
+        items = factory()
+        try:
+            async for item in items:
+                flight.items.append(item)
+                flight._notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            await items.aclose()
+            flight.done = True
+            self._release(key, flight)
+            flight._notify()
+
+llm_flights = SingleFlight()
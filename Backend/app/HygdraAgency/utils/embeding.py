@@ -0,0 +1,99 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional, Tuple
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig
+from HygdraAgency.utils.telemetry import telemetry
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("Embeding")
+
+
+# --- Micro-batched async embedding service ---
+class EmbedingConfig(BaseModel):
+    model_name: str = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    max_batch_size: int = int(os.getenv("OLLAMA_EMBED_BATCH_SIZE", "32"))
+    max_wait: float = float(os.getenv("OLLAMA_EMBED_MAX_WAIT", "0.01")) # seconds a partial batch waits for company
+    coalesce: bool = os.getenv("OLLAMA_COALESCE", "true").lower() == "true" # texts asked twice are sent once
+
+class EmbedingStats(BaseModel):
+    requests: int = 0 # texts asked by callers
+    coalesced: int = 0 # texts already queued or in flight for another caller
+    batches: int = 0 # calls sent to ollama
+    largest_batch: int = 0
+    errors: int = 0
+
+class EmbedingBatcher:
+    """
+    Accumulates embedding requests from concurrent callers into micro-batches.
+
+    A batch is sent as one `/api/embed` call as soon as it holds
+    `max_batch_size` texts or `max_wait` seconds after its first text,
+    whichever comes first, and each caller gets its own vector back. A text
+    already queued or in flight for another caller is not sent again, both
+    callers share its vector. Nothing here blocks the event loop.
+    """
+    def __init__(self, config: Optional[EmbedingConfig] = None, ollama_config: Optional[OllamaModelConfig] = None):
+        self.config = config or EmbedingConfig()
+        self.ollama_config = ollama_config or OllamaModelConfig(model_name=self.config.model_name)
+        self.stats = EmbedingStats()
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = set()
+        self._flights: Dict[str, asyncio.Future] = {} # text -> its vector until sent back
+
+    async def embed(self, text: str) -> List[float]:
+        self.stats.requests += 1
+        future = self._flights.get(text) if self.config.coalesce else None
+        if future is not None:
+            self.stats.coalesced += 1
+            telemetry.coalesce("embed")
+            # one caller cancelled must not cancel the others
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        if self.config.coalesce:
+            self._flights[text] = future
+            future.add_done_callback(lambda _: self._flights.pop(text, None))
+        self._pending.append((text, future))
+
+        if len(self._pending) >= self.config.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.config.max_wait, self._flush)
+        return await asyncio.shield(future)
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]):
+        self.stats.batches += 1
+        self.stats.largest_batch = max(self.stats.largest_batch, len(batch))
+        try:
+            async with OllamaClient(self.ollama_config) as ollama:
+                vectors = await ollama.embeddings([text for text, _ in batch], model=self.config.model_name)
+            if len(vectors) != len(batch):
+                raise ValueError(f"expected {len(batch)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            self.stats.errors += 1
+            logger.error(f"embedding batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+embedder = EmbedingBatcher()
@@ -0,0 +1,207 @@
+from pydantic import BaseModel, Field, computed_field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from enum import Enum
+from datetime import datetime
+from fastapi import UploadFile
+from HygdraAgency.DataModel.Project import Project
+from HygdraAgency.utils.embeding import embedder
+from HygdraAgency.utils.rag import Chunk, Deps, store_chunks
+from HygdraAgency.utils.shared import SharedState, shared_state
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import uuid
+
+logger = logging.getLogger("Ingest")
+
+CODE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".java", ".c", ".h", ".cpp", ".hpp", ".cs",
+    ".go", ".rb", ".php", ".rs", ".kt", ".swift", ".scala", ".sh", ".sql",
+}
+
+# lines a code chunk would rather start on: top level definitions and closing braces
+CODE_BOUNDARY = re.compile(r'^(?:async\s+def|def|class|function|export|public|private|protected|func|fn|impl|interface|struct|const|let|var|type|package|import|from|@|#include|\}\s*$)')
+# lines a text chunk would rather start on: blank lines and markdown headings
+TEXT_BOUNDARY = re.compile(r'^(?:\s*$|#{1,6}\s)')
+
+
+# --- Chunking ---
+class ChunkingConfig(BaseModel):
+    size: int = int(os.getenv("INGEST_CHUNK_SIZE", "2000")) # characters per chunk
+    overlap: int = int(os.getenv("INGEST_CHUNK_OVERLAP", "200")) # characters repeated from the previous chunk
+    batch_size: int = int(os.getenv("INGEST_BATCH_SIZE", "32")) # chunks embedded and stored together
+
+def is_code(filename: str) -> bool:
+    return os.path.splitext(filename or "")[1].lower() in CODE_EXTENSIONS
+
+def iter_chunks(lines: Iterable[str], title: str, path: str, size: int, overlap: int,
+                boundary: Callable[[str], bool]) -> Iterator[Chunk]:
+    """
+    Split a stream of lines into overlapping chunks of about `size` characters.
+
+    Lines are never cut. When a chunk is full it is closed before the last
+    line matching `boundary` (a blank line, a heading, a `def`...) so
+    paragraphs and functions stay together. The next chunk starts with up to
+    `overlap` characters of trailing lines. Only one chunk is held in memory.
+    """
+    buffer: List[str] = []
+    buffer_start = 0 # offset of buffer[0] in the document
+    buffer_size = 0
+    overlap_size = 0 # leading characters of the buffer already emitted by the previous chunk
+
+    def emit(count: int) -> Chunk:
+        content = "".join(buffer[:count])
+        return Chunk(title=title, path=path, content=content, start=buffer_start, end=buffer_start + len(content))
+
+    for line in lines:
+        buffer.append(line)
+        buffer_size += len(line)
+        if buffer_size < size:
+            continue
+
+        # cut at the last boundary past the overlap, otherwise keep the whole buffer
+        cut = len(buffer)
+        consumed = 0
+        for i, previous in enumerate(buffer):
+            if consumed > overlap_size and i > 0 and boundary(previous):
+                cut = i
+            consumed += len(previous)
+
+        chunk = emit(cut)
+        yield chunk
+
+        # keep the tail of the emitted chunk as overlap for the next one
+        tail = cut
+        tail_size = 0
+        while tail > 0 and tail_size + len(buffer[tail - 1]) <= overlap:
+            tail -= 1
+            tail_size += len(buffer[tail])
+
+        dropped = "".join(buffer[:tail])
+        buffer = buffer[tail:]
+        buffer_start += len(dropped)
+        buffer_size -= len(dropped)
+        overlap_size = tail_size
+
+    if buffer_size > overlap_size:
+        yield emit(len(buffer))
+
+def chunk_file(path: str, filename: str, config: ChunkingConfig) -> Iterator[Chunk]:
+    boundary = CODE_BOUNDARY.match if is_code(filename) else TEXT_BOUNDARY.match
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        yield from iter_chunks(file, filename, filename, config.size, config.overlap, lambda line: boundary(line) is not None)
+
+# --- Upload spooling ---
+async def spool_upload(file: UploadFile, directory: Optional[str] = None, block_size: int = 1024 * 1024) -> str:
+    "copy an upload to disk block by block so it is never fully held in memory"
+    directory = directory or os.getenv("UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "hygdra-uploads"))
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}-{os.path.basename(file.filename or 'upload')}")
+
+    with open(path, "wb") as spool:
+        while True:
+            block = await file.read(block_size)
+            if not block:
+                break
+            await asyncio.to_thread(spool.write, block)
+    return path
+
+# --- Background ingestion ---
+class IngestStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class IngestJob(BaseModel):
+    id: str
+    project_id: str
+    filename: str
+    status: IngestStatus = IngestStatus.QUEUED
+    bytes_total: int = 0
+    bytes_processed: int = 0
+    chunks_stored: int = 0
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+    @computed_field
+    @property
+    def progress(self) -> float:
+        return 1.0 if not self.bytes_total else min(self.bytes_processed / self.bytes_total, 1.0)
+
+class Ingestor:
+    """
+    Runs the spool -> chunk -> embed -> store pipeline as background tasks.
+
+    Chunks are read from the spooled file in a worker thread, embedded in
+    batches through the shared embedding batcher and written to the project
+    collection with their offsets. Jobs report progress in bytes, mirrored to
+    the `shared` state when given so that every API worker can report it.
+    """
+    def __init__(self, config: Optional[ChunkingConfig] = None, shared: Optional[SharedState] = None):
+        self.config = config or ChunkingConfig()
+        self.shared = shared
+        self.jobs: Dict[str, IngestJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def submit(self, project: Project, file: UploadFile) -> IngestJob:
+        path = await spool_upload(file)
+        job = IngestJob(id=uuid.uuid4().hex, project_id=project.id, filename=file.filename or os.path.basename(path),
+                        bytes_total=os.path.getsize(path))
+        self.jobs[job.id] = job
+        await self.sync(job)
+        task = asyncio.create_task(self.run(job, project, path))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        return self.jobs.get(job_id)
+
+    async def find(self, job_id: str) -> Optional[IngestJob]:
+        "a job of this process, or of another API worker through the shared state"
+        if job_id in self.jobs or self.shared is None:
+            return self.jobs.get(job_id)
+        data = await asyncio.to_thread(self.shared.get, "ingest", job_id)
+        return IngestJob.model_validate_json(data) if data else None
+
+    async def sync(self, job: IngestJob):
+        if self.shared is not None:
+            await asyncio.to_thread(self.shared.put, "ingest", job.id, job.model_dump_json(exclude={"progress"}), job.status.value)
+
+    async def run(self, job: IngestJob, project: Project, path: str):
+        job.status = IngestStatus.RUNNING
+        chunks = chunk_file(path, job.filename, self.config)
+
+        def next_batch() -> List[Chunk]:
+            return [chunk for _, chunk in zip(range(self.config.batch_size), chunks)]
+
+        try:
+            while True:
+                batch = await asyncio.to_thread(next_batch)
+                if not batch:
+                    break
+                embeddings = await embedder.embed_many([chunk.content for chunk in batch])
+                await store_chunks(Deps(project, 5), batch, embeddings)
+
+                job.chunks_stored += len(batch)
+                # offsets are characters, close enough to bytes for progress
+                job.bytes_processed = min(batch[-1].end, job.bytes_total)
+                job.updated_at = datetime.now()
+                await self.sync(job)
+            job.bytes_processed = job.bytes_total
+            job.status = IngestStatus.DONE
+        except Exception as e:
+            logger.error(f"ingestion of {job.filename} for {job.project_id} failed: {e}")
+            job.status = IngestStatus.FAILED
+            job.error = str(e)
+        finally:
+            chunks.close()
+            job.updated_at = datetime.now()
+            os.remove(path)
+            await self.sync(job)
+
+ingestor = Ingestor(shared=shared_state)
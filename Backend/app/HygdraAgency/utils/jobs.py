@@ -0,0 +1,334 @@
+from pydantic import BaseModel, Field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+from enum import Enum
+from datetime import datetime
+from pydantic_core import to_jsonable_python
+from HygdraAgency.utils.stream import StreamEvent, listen
+from HygdraAgency.utils.shared import SharedState, shared_state
+import asyncio
+import itertools
+import json
+import logging
+import os
+import uuid
+
+logger = logging.getLogger("Jobs")
+
+
+# --- Background jobs ---
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+FINAL_STATUSES = (JobStatus.DONE, JobStatus.FAILED, JobStatus.CANCELLED)
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    project_id: Optional[str] = None
+    priority: int = 5 # lower runs first
+    status: JobStatus = JobStatus.QUEUED
+    steps: int = 0 # agent step boundaries reached so far
+    last_step: Optional[dict] = None
+    progress: Optional[float] = None # 0-1 when the workflow reports it
+    result: Any = Field(default=None, exclude=True)
+    error: Optional[str] = None
+    retry_after: Optional[int] = None # seconds, when the job failed on a saturated LLM scheduler
+    created_at: datetime = Field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class JobQueueFull(Exception):
+    "raised by `JobQueue.submit` when `max_depth` jobs are already waiting"
+
+class JobQueue:
+    """
+    Priority queue of long-running agent workflows drained by async workers.
+
+    Workflows run with their events (steps, tokens, progress) routed to the
+    job, which keeps the latest step and progress and fans every event out
+    to subscribers. Jobs can be cancelled while queued or running. At most
+    `max_depth` jobs wait at once; past that `submit` raises JobQueueFull.
+
+    With a `shared` state the jobs are mirrored there by a single writer
+    task, so that the other API worker processes can poll, follow and
+    cancel them. Workflows always run in the process that accepted them.
+    """
+    def __init__(self, workers: Optional[int] = None, max_depth: Optional[int] = None, history: Optional[int] = None,
+                 shared: Optional[SharedState] = None, sync_interval: Optional[float] = None):
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.max_depth = max_depth or int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100")) # per API worker
+        self.history = history or int(os.getenv("JOB_HISTORY", "1000")) # finished jobs kept for polling
+        self.shared = shared
+        self.sync_interval = sync_interval or float(os.getenv("JOB_SYNC_INTERVAL", "0.5")) # seconds between shared state polls
+        self.jobs: Dict[str, Job] = {}
+        self._workflows: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+        self._dirty: Set[str] = set() # jobs to mirror to the shared state
+        self._pruned: List[str] = []
+        self._dirty_event = asyncio.Event()
+        self._syncer: Optional[asyncio.Task] = None
+
+    @property
+    def depth(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == JobStatus.QUEUED)
+
+    async def start(self):
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.shared is not None:
+            self._dirty_event = asyncio.Event()
+            self._syncer = asyncio.create_task(self._sync())
+
+    async def stop(self):
+        running = list(self._running.values())
+        for task in [*self._workers, *running]:
+            task.cancel()
+        await asyncio.gather(*self._workers, *running, return_exceptions=True)
+        self._workers = []
+        if self._syncer is not None:
+            self._syncer.cancel()
+            await asyncio.gather(self._syncer, return_exceptions=True)
+            await self._flush() # the cancellations above
+            self._syncer = None
+
+    def submit(self, kind: str, workflow: Callable[[], Awaitable[Any]], project_id: Optional[str] = None, priority: int = 5) -> Job:
+        if self._queue is None:
+            raise RuntimeError("JobQueue.start() must be awaited before submitting jobs")
+        if self.depth >= self.max_depth:
+            raise JobQueueFull(f"{self.depth} jobs already queued")
+
+        job = Job(id=uuid.uuid4().hex, kind=kind, project_id=project_id, priority=priority)
+        self.jobs[job.id] = job
+        self._workflows[job.id] = workflow
+        self._done[job.id] = asyncio.Event()
+        self._queue.put_nowait((priority, next(self._sequence), job.id))
+        self._prune()
+        self._changed(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def list(self, project_id: Optional[str] = None) -> List[Job]:
+        return [job for job in self.jobs.values() if project_id is None or job.project_id == project_id]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINAL_STATUSES:
+            return job
+        if job_id in self._running:
+            self._running[job_id].cancel() # the worker records the cancellation
+        else:
+            self._finish(job, JobStatus.CANCELLED)
+        return job
+
+    async def find(self, job_id: str) -> Optional[Job]:
+        "a job of this process, or of another API worker through the shared state"
+        if job_id in self.jobs or self.shared is None:
+            return self.jobs.get(job_id)
+        data = await asyncio.to_thread(self.shared.get, "job", job_id)
+        return self._load(data) if data else None
+
+    async def find_all(self, project_id: Optional[str] = None) -> List[Job]:
+        if self.shared is None:
+            return self.list(project_id)
+        # the local copies are fresher than their mirror
+        jobs = {job.id: job for job in map(self._load, await asyncio.to_thread(self.shared.list, "job"))}
+        jobs.update(self.jobs)
+        return [job for job in jobs.values() if project_id is None or job.project_id == project_id]
+
+    async def request_cancel(self, job_id: str) -> Optional[Job]:
+        "cancel a job wherever it runs, a remote one is cancelled by its worker on its next poll"
+        if job_id in self.jobs:
+            return self.cancel(job_id)
+        job = await self.find(job_id)
+        if job is None or job.status in FINAL_STATUSES:
+            return job
+        await asyncio.to_thread(self.shared.put, "job-cancel", job_id, "{}")
+        return job
+
+    async def follow(self, job_id: str) -> AsyncIterator[StreamEvent]:
+        "like `subscribe`, for a job that may run in another API worker"
+        if job_id in self.jobs or self.shared is None:
+            async for event in self.subscribe(job_id):
+                yield event
+            return
+
+        # remote job: steps and tokens stay in its worker, poll its status and progress
+        seen = None
+        while True:
+            job = await self.find(job_id)
+            if job is None:
+                return
+            state = (job.status, job.steps, job.progress)
+            if state != seen:
+                seen = state
+                if job.status == JobStatus.DONE:
+                    yield StreamEvent(event="result", data=job.result)
+                yield StreamEvent(event="status", data=job)
+            if job.status in FINAL_STATUSES:
+                return
+            await asyncio.sleep(self.sync_interval)
+
+    async def wait(self, job_id: str) -> Job:
+        await self._done[job_id].wait()
+        return self.jobs[job_id]
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[StreamEvent]:
+        "events of a job from now on, ending with its final status"
+        job = self.jobs[job_id]
+        if job.status in FINAL_STATUSES:
+            yield StreamEvent(event="status", data=job)
+            return
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            yield StreamEvent(event="status", data=job)
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            self._subscribers.get(job_id, set()).discard(queue)
+
+    def _publish(self, job_id: str, event: Optional[StreamEvent]):
+        for queue in self._subscribers.get(job_id, set()):
+            queue.put_nowait(event)
+
+    def _finish(self, job: Job, status: JobStatus, error: Optional[str] = None):
+        job.status = status
+        job.error = error
+        job.finished_at = datetime.now()
+        self._workflows.pop(job.id, None)
+        self._publish(job.id, StreamEvent(event="status", data=job))
+        self._publish(job.id, None)
+        self._done[job.id].set()
+        self._changed(job)
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.status in FINAL_STATUSES]
+        for job in sorted(finished, key=lambda job: job.finished_at)[:max(len(finished) - self.history, 0)]:
+            del self.jobs[job.id]
+            self._done.pop(job.id, None)
+            self._subscribers.pop(job.id, None)
+            self._pruned.append(job.id)
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != JobStatus.QUEUED:
+                continue # cancelled while waiting
+            task = asyncio.create_task(self._run(job, self._workflows[job_id]))
+            self._running[job_id] = task
+            try:
+                # _run records its own cancellation, so only stopping the worker raises here
+                await asyncio.shield(task)
+            finally:
+                self._running.pop(job_id, None)
+
+    async def _run(self, job: Job, workflow: Callable[[], Awaitable[Any]]):
+        job.status = JobStatus.RUNNING
+        job.started_at = datetime.now()
+        self._publish(job.id, StreamEvent(event="status", data=job))
+        self._changed(job)
+
+        events: asyncio.Queue = asyncio.Queue()
+        pump = asyncio.create_task(self._pump(job, events))
+        listen(events)
+        try:
+            job.result = await workflow()
+            self._drain(job, events, pump)
+            job.progress = 1.0
+            self._publish(job.id, StreamEvent(event="result", data=job.result))
+            self._finish(job, JobStatus.DONE)
+        except asyncio.CancelledError:
+            self._drain(job, events, pump)
+            self._finish(job, JobStatus.CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+            self._drain(job, events, pump)
+            job.retry_after = getattr(e, "retry_after", None)
+            self._finish(job, JobStatus.FAILED, str(getattr(e, "detail", e)))
+
+    def _record(self, job: Job, event: StreamEvent):
+        "keep the latest step and progress on the job and forward the event to subscribers"
+        if event.event == "step":
+            job.steps += 1
+            job.last_step = event.data
+        elif event.event == "progress":
+            job.progress = float(event.data)
+        self._publish(job.id, event)
+        if event.event in ("step", "progress"):
+            self._changed(job)
+
+    async def _pump(self, job: Job, events: asyncio.Queue):
+        while True:
+            self._record(job, await events.get())
+
+    def _drain(self, job: Job, events: asyncio.Queue, pump: asyncio.Task):
+        "stop the pump and record the events it did not get to"
+        pump.cancel()
+        while not events.empty():
+            self._record(job, events.get_nowait())
+
+    # shared state mirror
+    def _changed(self, job: Job):
+        if self.shared is not None:
+            self._dirty.add(job.id)
+            self._dirty_event.set()
+
+    def _load(self, data: str) -> Job:
+        record = json.loads(data)
+        job = Job.model_validate(record)
+        job.result = record.get("result")
+        return job
+
+    def _dump(self, job: Job) -> str:
+        record = job.model_dump(mode="json")
+        if job.status == JobStatus.DONE:
+            record["result"] = to_jsonable_python(job.result, fallback=str)
+        return json.dumps(record)
+
+    async def _flush(self):
+        "write the jobs changed since the last flush, the latest state of each"
+        dirty = [self.jobs[job_id] for job_id in self._dirty if job_id in self.jobs]
+        pruned, self._pruned = self._pruned, []
+        self._dirty = set()
+        if dirty:
+            await asyncio.to_thread(self.shared.put_many, "job", {job.id: (self._dump(job), job.status.value) for job in dirty})
+        if pruned:
+            await asyncio.to_thread(self.shared.delete, "job", pruned)
+
+    async def _sync(self):
+        "single writer of the mirror, also picks up cancellations requested by other workers"
+        while True:
+            try:
+                await asyncio.wait_for(self._dirty_event.wait(), timeout=self.sync_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty_event.clear()
+            try:
+                await self._flush()
+                active = [job_id for job_id, job in self.jobs.items() if job.status not in FINAL_STATUSES]
+                requested = await asyncio.to_thread(self.shared.get_many, "job-cancel", active)
+                for job_id in requested:
+                    self.cancel(job_id)
+                if requested:
+                    await asyncio.to_thread(self.shared.delete, "job-cancel", list(requested))
+            except Exception as e:
+                logger.error(f"Job state sync failed: {e}")
+
+job_queue = JobQueue(shared=shared_state)
@@ -1,70 +1,371 @@
 from __future__ import annotations as _annotations
+from abc import ABC, abstractmethod
 import os
 from chromadb.config import Settings
 import re
 import unicodedata
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+import fcntl
+import hashlib
+import json
+import threading
 
 from pydantic_ai import RunContext
 from HygdraAgency.DataModel.Project import Project
-import ollama
+from HygdraAgency.utils.embeding import embedder
+import asyncio
 import chromadb
+import numpy as np
 
 
 @dataclass
-class Deps:
-    project: Project
-    n: int
-    client: any = chromadb.HttpClient(host=os.getenv("CHROME_DB_IP", "127.0.0.1"), port = os.getenv("CHROME_DB_PORT", "2500"), settings=Settings(allow_reset=True, anonymized_telemetry=False))
+class Document:
+    title: str
+    path: str
+    content: str
 
 @dataclass
-class Document:
+class Chunk:
     title: str
     path: str
     content: str
-    
+    start: int # character offsets of the chunk in the source document
+    end: int
+
+@dataclass
+class Hit:
+    id: str
+    content: str
+    metadata: dict = field(default_factory=dict)
+    score: float = 0 # higher is closer
+
+def document_id(path: str, content: str, start: int = 0) -> str:
+    "stable id of a stored document or chunk"
+    return hashlib.sha256(f"{path}:{start}:{content}".encode()).hexdigest()
+
+# --- Vector stores ---
+class VectorStore(ABC):
+    """
+    Per project collections of embedded documents.
+
+    Methods are blocking, the RAG functions below run them in a worker
+    thread. `query` takes a batch of query embeddings and returns the top
+    `n` hits of each. A backend missing a method cannot be instantiated.
+    """
+    @abstractmethod
+    def create(self, name: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, name: str, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[dict]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, name: str, embeddings: List[List[float]], n: int) -> List[List[Hit]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def existing(self, name: str, ids: List[str]) -> Set[str]:
+        "the given ids already stored in the collection"
+        raise NotImplementedError
+
+    @abstractmethod
+    def find(self, name: str, where: dict) -> Set[str]:
+        "ids of the documents whose metadata has every value of `where`"
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, name: str, ids: List[str]):
+        raise NotImplementedError
+
+class ChromaVectorStore(VectorStore):
+    "collections on a chroma server, one client for the whole process opened on first use"
+    def __init__(self, host: Optional[str] = None, port: Optional[str] = None):
+        self.host = host or os.getenv("CHROME_DB_IP", "127.0.0.1")
+        self.port = port or os.getenv("CHROME_DB_PORT", "2500")
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = chromadb.HttpClient(host=self.host, port=self.port, settings=Settings(allow_reset=True, anonymized_telemetry=False))
+        return self._client
+
+    def create(self, name: str):
+        self.client.get_or_create_collection(name=name)
+
+    def add(self, name: str, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[dict]):
+        self.client.get_collection(name=name).add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(self, name: str, embeddings: List[List[float]], n: int) -> List[List[Hit]]:
+        results = self.client.get_collection(name=name).query(query_embeddings=embeddings, n_results=n)
+        hits = []
+        for i, documents in enumerate(results["documents"]):
+            metadatas = (results.get("metadatas") or [[]] * len(results["documents"]))[i] or [{}] * len(documents)
+            distances = (results.get("distances") or [[]] * len(results["documents"]))[i] or [0] * len(documents)
+            hits.append([Hit(id, content, meta or {}, -distance)
+                         for id, content, meta, distance in zip(results["ids"][i], documents, metadatas, distances)])
+        return hits
+
+    def existing(self, name: str, ids: List[str]) -> Set[str]:
+        return set(self.client.get_collection(name=name).get(ids=ids, include=[])["ids"])
+
+    def find(self, name: str, where: dict) -> Set[str]:
+        where = where if len(where) == 1 else {"$and": [{key: value} for key, value in where.items()]}
+        return set(self.client.get_collection(name=name).get(where=where, include=[])["ids"])
+
+    def delete(self, name: str, ids: List[str]):
+        if ids:
+            self.client.get_collection(name=name).delete(ids=ids)
+
+class LocalCollection:
+    """
+    One project of the local vector store, in its own directory.
+
+    `vectors.f32` is the float32 matrix of the unit-normalised embeddings,
+    appended row by row and read through a memory map. `documents.jsonl` is
+    the sidecar holding the id, content and metadata of each row, only the
+    byte offset of each line is kept in memory. Appends hold an exclusive
+    file lock so that several API workers can share the directory; the
+    sidecar is written before the vectors so every visible row has its
+    line. A deletion appends a tombstone line with a zero row, queries skip
+    the rows of deleted ids.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.documents_path = os.path.join(directory, "documents.jsonl")
+        self.lock_path = os.path.join(directory, ".lock")
+        self.dim: Optional[int] = None
+        self.ids: Dict[str, int] = {}
+        self.offsets: List[int] = [] # byte offset of each sidecar line
+        self.deleted: Set[int] = set() # rows of deleted ids and of tombstones
+        self._scanned = 0 # sidecar bytes already indexed
+        self._matrix = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        "index the sidecar lines and vector rows appended since the last call, by this or another process"
+        with open(self.documents_path, "ab+") as documents:
+            documents.seek(self._scanned)
+            for line in documents:
+                if not line.endswith(b"\n"):
+                    break # being written
+                record = json.loads(line)
+                if record.get("deleted"):
+                    self.deleted.add(len(self.offsets))
+                    if record["id"] in self.ids:
+                        self.deleted.add(self.ids.pop(record["id"]))
+                else:
+                    self.ids.setdefault(record["id"], len(self.offsets))
+                self.offsets.append(self._scanned)
+                self.dim = self.dim or record.get("dim")
+                self._scanned += len(line)
+
+        rows = os.path.getsize(self.vectors_path) // (self.dim * 4) if self.dim and os.path.exists(self.vectors_path) else 0
+        rows = min(rows, len(self.offsets))
+        if self._matrix is None or self._matrix.shape[0] != rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+
+    def add(self, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[dict]):
+        with self._lock, open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                vectors = np.asarray(embeddings, dtype=np.float32)
+                if self.dim is not None and vectors.shape[1] != self.dim:
+                    raise ValueError(f"embedding dimension {vectors.shape[1]} does not match the collection ({self.dim})")
+                # like chroma, ids already stored are skipped
+                new = [i for i, id in enumerate(ids) if id not in self.ids and id not in ids[:i]]
+                if not new:
+                    return
+                vectors = vectors[new]
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+                with open(self.documents_path, "a", encoding="utf-8") as sidecar:
+                    for i in new:
+                        sidecar.write(json.dumps({"id": ids[i], "content": documents[i], "metadata": metadatas[i], "dim": vectors.shape[1]}) + "\n")
+                with open(self.vectors_path, "ab") as matrix:
+                    matrix.write(vectors.tobytes())
+                self._refresh()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def delete(self, ids: List[str]):
+        with self._lock, open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                ids = [id for i, id in enumerate(ids) if id in self.ids and id not in ids[:i]]
+                if not ids:
+                    return
+                with open(self.documents_path, "a", encoding="utf-8") as sidecar:
+                    for id in ids:
+                        sidecar.write(json.dumps({"id": id, "deleted": True, "dim": self.dim}) + "\n")
+                with open(self.vectors_path, "ab") as matrix:
+                    matrix.write(np.zeros((len(ids), self.dim), dtype=np.float32).tobytes())
+                self._refresh()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def find(self, where: dict) -> Set[str]:
+        with self._lock:
+            self._refresh()
+            found = set()
+            with open(self.documents_path, "rb") as documents:
+                for row, line in zip(range(len(self.offsets)), documents):
+                    record = json.loads(line)
+                    metadata = record.get("metadata") or {}
+                    if self.ids.get(record["id"]) == row and all(metadata.get(key) == value for key, value in where.items()):
+                        found.add(record["id"])
+            return found
+
+    def _document(self, row: int) -> dict:
+        with open(self.documents_path, "rb") as documents:
+            documents.seek(self.offsets[row])
+            return json.loads(documents.readline())
+
+    def query(self, embeddings: List[List[float]], n: int) -> List[List[Hit]]:
+        with self._lock:
+            self._refresh()
+            matrix = self._matrix
+            if matrix is None or n <= 0:
+                return [[] for _ in embeddings]
+            queries = np.asarray(embeddings, dtype=np.float32)
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            scores = queries @ matrix.T # cosine similarities, one row per query
+            deleted = [row for row in self.deleted if row < matrix.shape[0]]
+            scores[:, deleted] = -np.inf
+            n = min(n, matrix.shape[0] - len(deleted))
+            if n <= 0:
+                return [[] for _ in embeddings]
+            top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+
+            hits = []
+            for query, rows in enumerate(top):
+                rows = rows[np.argsort(-scores[query, rows])]
+                hits.append([])
+                for row in rows:
+                    record = self._document(int(row))
+                    hits[-1].append(Hit(record["id"], record["content"], record["metadata"], float(scores[query, row])))
+            return hits
+
+    def existing(self, ids: List[str]) -> Set[str]:
+        with self._lock:
+            self._refresh()
+            return {id for id in ids if id in self.ids}
+
+class LocalVectorStore(VectorStore):
+    "in-process store, one memory mapped collection per project under `directory`, no server needed"
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.getenv("VECTOR_STORE_PATH", "data/vectors")
+        self._collections: Dict[str, LocalCollection] = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name: str) -> LocalCollection:
+        with self._lock:
+            if name not in self._collections:
+                directory = os.path.join(self.directory, re.sub(r"[^\w.-]", "_", name))
+                os.makedirs(directory, exist_ok=True)
+                self._collections[name] = LocalCollection(directory)
+        return self._collections[name]
+
+    def create(self, name: str):
+        self.collection(name)
+
+    def add(self, name: str, ids: List[str], embeddings: List[List[float]], documents: List[str], metadatas: List[dict]):
+        self.collection(name).add(ids, embeddings, documents, metadatas)
+
+    def query(self, name: str, embeddings: List[List[float]], n: int) -> List[List[Hit]]:
+        return self.collection(name).query(embeddings, n)
+
+    def existing(self, name: str, ids: List[str]) -> Set[str]:
+        return self.collection(name).existing(ids)
+
+    def find(self, name: str, where: dict) -> Set[str]:
+        return self.collection(name).find(where)
+
+    def delete(self, name: str, ids: List[str]):
+        self.collection(name).delete(ids)
+
+def make_vector_store(backend: Optional[str] = None) -> VectorStore:
+    "the backend named by VECTOR_STORE, `chroma` (default) or `local`"
+    backend = backend or os.getenv("VECTOR_STORE", "chroma")
+    if backend == "local":
+        return LocalVectorStore()
+    if backend == "chroma":
+        return ChromaVectorStore()
+    raise ValueError(f"unknown vector store '{backend}'")
+
+vector_store = make_vector_store()
+
+@dataclass
+class Deps:
+    project: Project
+    n: int
+    store: VectorStore = vector_store
+
+def format_hits(hits: List[Hit]) -> str:
+    "retrieved documents as prompt context"
+    return '\n\n'.join(
+        f'# {hit.metadata.get("title", "")}\nDocumentation path:{hit.metadata.get("path", "")}\n\n{hit.content}\n'
+        for hit in hits
+    )
+
+async def retrieve_hits(context: RunContext[Deps], search_query: str) -> List[Hit]:
+    "the documents closest to the query, best first"
+    embedding = await embedder.embed(search_query)
+    return (await asyncio.to_thread(context.store.query, context.project.id, [embedding], context.n))[0]
+
 async def retrieve(context: RunContext[Deps], search_query: str) -> str:
     "retreive context document based on query search"
-    collection = context.client.get_collection(name=context.project.id)
-    response = ollama.embeddings(model="nomic-embed-text", prompt=search_query)
-    results = collection.query(
-        query_embeddings=[response["embedding"]],
-        n_results=context.n
-    )
     # depend on stored document
-    return '\n\n'.join(
-        f'# {row["title"]}\nDocumentation path:{row["path"]}\n\n{row["content"]}\n'
-        for row in results['documents'][0]
-    )
+    return format_hits(await retrieve_hits(context, search_query))
 
 async def store_document(context: RunContext[Deps], document:Document):
     "Store document in a vector search database "
-    collection = context.client.get_collection(name=context.project.id)
-    embedding = ollama.embeddings(model="nomic-embed-text", prompt=document.content)
+    embedding = await embedder.embed(document.content)
 
-    collection.add(
-        ids=[str(embedding)],
+    await asyncio.to_thread(
+        context.store.add,
+        context.project.id,
+        ids=[document_id(document.path, document.content)],
         embeddings=[embedding],
-        documents=[document]
+        documents=[document.content],
+        metadatas=[{"title": document.title, "path": document.path}]
+    )
+
+async def store_chunks(context: RunContext[Deps], chunks: List[Chunk], embeddings: List[List[float]]):
+    "Store already embedded chunks of a document with their offsets"
+    await asyncio.to_thread(
+        context.store.add,
+        context.project.id,
+        ids=[document_id(chunk.path, chunk.content, chunk.start) for chunk in chunks],
+        embeddings=embeddings,
+        documents=[chunk.content for chunk in chunks],
+        metadatas=[{"title": chunk.title, "path": chunk.path, "start": chunk.start, "end": chunk.end} for chunk in chunks]
     )
 
 # make an url download version ? way to unsafe ?
 async def store_external_document(index:str, document:Document):
     "store user imported file"
-    client = chromadb.HttpClient(host=os.getenv("CHROME_DB_IP", "127.0.0.1"), port = os.getenv("CHROME_DB_PORT", "2500"), settings=Settings(allow_reset=True, anonymized_telemetry=False))
-    collection = client.get_collection(name=index)
-    embedding = ollama.embeddings(model="nomic-embed-text", prompt=document.content)
+    embedding = await embedder.embed(document.content)
 
-    collection.add(
-        ids=[str(embedding)],
+    await asyncio.to_thread(
+        vector_store.add,
+        index,
+        ids=[document_id(document.path, document.content)],
         embeddings=[embedding],
-        documents=[document]
+        documents=[document.content],
+        metadatas=[{"title": document.title, "path": document.path}]
     )
 
 async def build_search_index(name: str):
     "init new rag for project"
-    client = chromadb.HttpClient(host=os.getenv("CHROME_DB_IP", "127.0.0.1"), port = os.getenv("CHROME_DB_PORT", "2500"), settings=Settings(allow_reset=True, anonymized_telemetry=False))
-    client.create_collection(name=name)
+    await asyncio.to_thread(vector_store.create, name)
 
 # Function to slugify URL-friendly strings
 def slugify(value: str, separator: str, unicode: bool = False) -> str:
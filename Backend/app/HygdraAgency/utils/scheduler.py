@@ -0,0 +1,173 @@
+from pydantic import BaseModel, Field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from HygdraAgency.DataModel.Task import Task, TaskStatus
+from HygdraAgency.utils.stream import emit
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger("Scheduler")
+
+FINISHED = (TaskStatus.DONE, TaskStatus.REVIEW)
+
+
+# --- Dependency DAG ---
+class TaskGraph:
+    """
+    DAG of project tasks built from `Task.dependencies`.
+
+    Dependencies on unknown task ids are ignored, dependencies on finished
+    tasks are already satisfied. Cycles are rejected at construction.
+    """
+    def __init__(self, tasks: List[Task]):
+        self.tasks: Dict[str, Task] = {task.id: task for task in tasks}
+        self.dependents: Dict[str, List[str]] = {task_id: [] for task_id in self.tasks}
+        self.waiting_on: Dict[str, int] = {}
+
+        for task in tasks:
+            if task.status in FINISHED:
+                continue
+            unknown = [dependency for dependency in task.dependencies if dependency not in self.tasks]
+            if unknown:
+                logger.warning(f"Task '{task.id}' depends on unknown tasks {unknown}, ignoring them")
+            open_dependencies = [
+                dependency for dependency in task.dependencies
+                if dependency in self.tasks and self.tasks[dependency].status not in FINISHED
+            ]
+            self.waiting_on[task.id] = len(open_dependencies)
+            for dependency in open_dependencies:
+                self.dependents[dependency].append(task.id)
+
+        cycle = self.find_cycle()
+        if cycle:
+            raise ValueError(f"Task dependencies form a cycle: {' -> '.join(cycle)}")
+
+    def find_cycle(self) -> Optional[List[str]]:
+        "a dependency cycle among unfinished tasks, if any"
+        state: Dict[str, int] = {} # 1 visiting, 2 done
+        path: List[str] = []
+
+        def visit(task_id: str) -> Optional[List[str]]:
+            state[task_id] = 1
+            path.append(task_id)
+            for dependent in self.dependents[task_id]:
+                if state.get(dependent) == 1:
+                    return path[path.index(dependent):] + [dependent]
+                if dependent not in state:
+                    cycle = visit(dependent)
+                    if cycle:
+                        return cycle
+            path.pop()
+            state[task_id] = 2
+            return None
+
+        for task_id in self.waiting_on:
+            if task_id not in state:
+                cycle = visit(task_id)
+                if cycle:
+                    return cycle
+        return None
+
+    def ready(self) -> List[Task]:
+        "unfinished tasks whose dependencies are all finished, in project order"
+        return [self.tasks[task_id] for task_id, count in self.waiting_on.items() if count == 0]
+
+    def complete(self, task_id: str) -> List[Task]:
+        "mark a task finished and return the tasks it unblocked"
+        unblocked = []
+        for dependent in self.dependents.get(task_id, []):
+            self.waiting_on[dependent] -= 1
+            if self.waiting_on[dependent] == 0:
+                unblocked.append(self.tasks[dependent])
+        return unblocked
+
+# --- Parallel execution ---
+class ScheduleReport(BaseModel):
+    completed: List[str] = []
+    failed: Dict[str, str] = {}
+    blocked: List[str] = [] # never ran because a dependency failed
+    max_parallel: int = 1
+    elapsed: float = 0
+    results: Dict[str, Any] = Field(default_factory=dict)
+
+class TaskScheduler:
+    """
+    Runs every unfinished task of a project, independent tasks in parallel.
+
+    A ready queue is fed from the DAG and drained by `max_parallel` workers,
+    each calling `run_task`. Statuses move TODO -> IN_PROGRESS -> DONE; a
+    failed task goes back to TODO and its dependents are reported blocked.
+    `on_update` is awaited after every status change, e.g. to persist it.
+    """
+    def __init__(self, run_task: Callable[[Task], Awaitable[Any]], max_parallel: Optional[int] = None,
+                 on_update: Optional[Callable[[Task], Awaitable[Any]]] = None):
+        self.run_task = run_task
+        self.max_parallel = int(os.getenv("SCHEDULER_MAX_PARALLEL", "4")) if max_parallel is None else max_parallel
+        if self.max_parallel < 1:
+            raise ValueError(f"max_parallel must be at least 1, got {self.max_parallel}")
+        self.on_update = on_update
+
+    async def updated(self, task: Task):
+        if self.on_update is None:
+            return
+        try:
+            await self.on_update(task)
+        except Exception as e:
+            logger.error(f"on_update for task '{task.id}' failed: {e}")
+
+    async def run(self, tasks: List[Task]) -> ScheduleReport:
+        graph = TaskGraph(tasks)
+        report = ScheduleReport(max_parallel=self.max_parallel)
+        queue: asyncio.Queue = asyncio.Queue()
+        for task in graph.ready():
+            queue.put_nowait(task)
+        active = queue.qsize() # tasks queued or running
+        total = len(graph.waiting_on)
+
+        async def worker(worker_id: int):
+            nonlocal active
+            while True:
+                task = await queue.get()
+                if task is None:
+                    return
+
+                task.status = TaskStatus.IN_PROGRESS
+                await self.updated(task)
+                emit("schedule", {"task": task.id, "status": task.status, "worker": worker_id})
+                try:
+                    report.results[task.id] = await self.run_task(task)
+                    task.status = TaskStatus.DONE
+                    report.completed.append(task.id)
+                    for unblocked in graph.complete(task.id):
+                        active += 1
+                        queue.put_nowait(unblocked)
+                except Exception as e:
+                    logger.error(f"Task '{task.id}' failed: {e}")
+                    task.status = TaskStatus.TODO
+                    report.failed[task.id] = str(e)
+                await self.updated(task)
+                emit("schedule", {"task": task.id, "status": task.status, "worker": worker_id})
+                emit("progress", (len(report.completed) + len(report.failed)) / total)
+
+                active -= 1
+                if active == 0:
+                    # nothing queued nor running, whatever is left is blocked
+                    for _ in range(self.max_parallel):
+                        queue.put_nowait(None)
+
+        start = time.perf_counter()
+        if active:
+            workers = [asyncio.create_task(worker(i)) for i in range(self.max_parallel)]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for pending in workers:
+                    pending.cancel()
+
+        report.blocked = [
+            task_id for task_id, count in graph.waiting_on.items()
+            if count > 0 and graph.tasks[task_id].status not in FINISHED
+        ]
+        report.elapsed = time.perf_counter() - start
+        return report
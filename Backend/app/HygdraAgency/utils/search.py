@@ -0,0 +1,106 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from HygdraAgency.DataModel.Project import Project
+from HygdraAgency.utils.embeding import embedder
+from HygdraAgency.utils.rag import VectorStore, document_id, vector_store
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger("Search")
+
+
+# --- Cross-project semantic search ---
+class SearchMatch(BaseModel):
+    kind: str # project, task or service
+    ref: str # id of the task or service, the project id for its description
+    text: str
+    score: float
+
+class ProjectMatch(BaseModel):
+    project_id: str
+    name: str
+    score: float # best match of the project
+    matches: List[SearchMatch] = []
+
+class ProjectIndex:
+    """
+    One vector collection over every project.
+
+    Holds an embedding of each project description, task title and
+    generated service doc. Entries are keyed on their content, so indexing a
+    project again only embeds what is new or changed, and drops the entries
+    of the project it no longer has. A search embeds the
+    query, takes the nearest entries and ranks projects by their best entry;
+    no generation call is made.
+    """
+    def __init__(self, store: Optional[VectorStore] = None, collection: Optional[str] = None, max_text: int = 2000):
+        self.store = store or vector_store
+        self.collection = collection or os.getenv("PROJECT_INDEX_COLLECTION", "hygdra-projects")
+        self.max_text = max_text # characters of a service doc that are embedded
+        self._created = False
+
+    def entries(self, project: Project) -> Dict[str, tuple]:
+        "`{id: (text, metadata)}` of everything searchable in a project"
+        items = [("project", project.id, f"{project.name}: {project.description}")]
+        items += [("task", task.id, task.title) for task in project.tasks]
+        items += [("service", service.id, f"{service.name}: {service.doc}"[:self.max_text]) for service in project.app]
+        return {
+            document_id(f"{project.id}/{kind}/{ref}", text): (text, {"project_id": project.id, "name": project.name, "kind": kind, "ref": ref})
+            for kind, ref, text in items
+        }
+
+    async def _ensure_collection(self):
+        if not self._created:
+            await asyncio.to_thread(self.store.create, self.collection)
+            self._created = True
+
+    async def index(self, project: Project) -> int:
+        "embed and store the entries of the project not indexed yet, returns how many, and drop its stale ones"
+        await self._ensure_collection()
+
+        entries = self.entries(project)
+        # entries of texts since changed or removed, their ids no longer come up
+        stale = await asyncio.to_thread(self.store.find, self.collection, {"project_id": project.id})
+        stale = [id for id in stale if id not in entries]
+        if stale:
+            await asyncio.to_thread(self.store.delete, self.collection, stale)
+
+        known = await asyncio.to_thread(self.store.existing, self.collection, list(entries))
+        new = [id for id in entries if id not in known]
+        if not new:
+            return 0
+
+        embeddings = await embedder.embed_many([entries[id][0] for id in new])
+        await asyncio.to_thread(
+            self.store.add, self.collection, new, embeddings,
+            [entries[id][0] for id in new], [entries[id][1] for id in new],
+        )
+        return len(new)
+
+    async def update(self, project: Project):
+        "index the project, a failure is only logged since it just leaves the search a bit stale"
+        try:
+            await self.index(project)
+        except Exception as e:
+            logger.error(f"indexing project {project.id} for search failed: {e}")
+
+    async def search(self, query: str, n: int = 5, per_project: int = 3) -> List[ProjectMatch]:
+        "the `n` projects closest to the query with their best matching entries"
+        await self._ensure_collection()
+
+        embedding = await embedder.embed(query)
+        # several entries per project, fetch enough to rank n projects
+        hits = (await asyncio.to_thread(self.store.query, self.collection, [embedding], n * per_project * 2))[0]
+
+        projects: Dict[str, ProjectMatch] = {}
+        for hit in hits:
+            project_id = hit.metadata.get("project_id")
+            if project_id not in projects:
+                projects[project_id] = ProjectMatch(project_id=project_id, name=hit.metadata.get("name", ""), score=hit.score)
+            match = projects[project_id]
+            if len(match.matches) < per_project:
+                match.matches.append(SearchMatch(kind=hit.metadata.get("kind", ""), ref=hit.metadata.get("ref", ""), text=hit.content, score=hit.score))
+        return sorted(projects.values(), key=lambda match: match.score, reverse=True)[:n]
+
+project_index = ProjectIndex()
@@ -0,0 +1,161 @@
+from typing import AsyncIterator, Dict, List, Optional
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("Shared")
+
+
+# --- State shared between uvicorn workers ---
+class LockLost(Exception):
+    "raised out of a `SharedState.lock` block whose lease could not be renewed, another worker may hold the lock"
+
+class SharedState:
+    """
+    SQLite file shared by every worker process of the API.
+
+    Keeps JSON records (background jobs, ingestion jobs) so that any worker
+    can answer for work running in another one, and leased named locks so
+    that only one worker at a time works on a given project. A lock lease
+    expires after `lock_ttl` seconds unless its holder renews it, a crashed
+    worker never keeps a project locked. A holder that loses its lease is
+    cancelled and its block raises LockLost, it never goes on unguarded.
+    """
+    def __init__(self, path: Optional[str] = None, lock_ttl: Optional[float] = None):
+        self.path = path or os.getenv("SHARED_STATE_PATH", "data/shared_state.sqlite")
+        self.lock_ttl = lock_ttl or float(os.getenv("PROJECT_LOCK_TTL", "30"))
+        self.owner_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # autocommit, transactions are opened explicitly where needed
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS records (kind TEXT, key TEXT, status TEXT, data TEXT NOT NULL, updated_at REAL, PRIMARY KEY (kind, key))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_records_kind_status ON records (kind, status)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+        return self._db
+
+    # records
+    def put(self, kind: str, key: str, data: str, status: Optional[str] = None):
+        self.put_many(kind, {key: (data, status)})
+
+    def put_many(self, kind: str, records: Dict[str, tuple]):
+        "write `{key: (data, status)}` in one transaction"
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT OR REPLACE INTO records (kind, key, status, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(kind, key, status, data, now) for key, (data, status) in records.items()],
+            )
+            db.execute("COMMIT")
+
+    def get(self, kind: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connect().execute("SELECT data FROM records WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, kind: str, keys: List[str]) -> Dict[str, str]:
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT key, data FROM records WHERE kind = ? AND key IN ({', '.join('?' * len(keys))})", (kind, *keys)
+            ).fetchall()
+        return dict(rows)
+
+    def list(self, kind: str, status: Optional[str] = None, since: Optional[float] = None) -> List[str]:
+        "records of `kind`, only those written after the `since` timestamp when given"
+        query, args = "SELECT data FROM records WHERE kind = ?", [kind]
+        if status is not None:
+            query, args = query + " AND status = ?", args + [status]
+        if since is not None:
+            query, args = query + " AND updated_at >= ?", args + [since]
+        with self._lock:
+            rows = self._connect().execute(query + " ORDER BY updated_at", args).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, kind: str, keys: List[str]):
+        with self._lock:
+            self._connect().executemany("DELETE FROM records WHERE kind = ? AND key = ?", [(kind, key) for key in keys])
+
+    # leased locks
+    def try_acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            db = self._connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("DELETE FROM locks WHERE name = ? AND expires_at < ?", (name, now))
+                db.execute("INSERT OR IGNORE INTO locks (name, owner, expires_at) VALUES (?, ?, ?)", (name, owner, now + ttl))
+                row = db.execute("SELECT owner FROM locks WHERE name = ?", (name,)).fetchone()
+            finally:
+                db.execute("COMMIT")
+        return row is not None and row[0] == owner
+
+    def renew(self, name: str, owner: str, ttl: float) -> bool:
+        with self._lock:
+            cursor = self._connect().execute("UPDATE locks SET expires_at = ? WHERE name = ? AND owner = ?", (time.time() + ttl, name, owner))
+        return cursor.rowcount == 1
+
+    def release(self, name: str, owner: str):
+        with self._lock:
+            self._connect().execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    @asynccontextmanager
+    async def lock(self, name: str, poll: float = 0.05) -> AsyncIterator[str]:
+        "hold the named lock across workers, renewing its lease until the block exits"
+        owner = f"{self.owner_prefix}:{uuid.uuid4().hex}"
+        delay = poll
+        while not await asyncio.to_thread(self.try_acquire, name, owner, self.lock_ttl):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.25)
+
+        holder = asyncio.current_task()
+        lost = False
+
+        async def heartbeat():
+            nonlocal lost
+            while True:
+                await asyncio.sleep(self.lock_ttl / 3)
+                if not await asyncio.to_thread(self.renew, name, owner, self.lock_ttl):
+                    logger.warning(f"lease on lock '{name}' was lost, cancelling its holder")
+                    lost = True
+                    holder.cancel()
+                    return
+
+        renewing = asyncio.create_task(heartbeat())
+        try:
+            yield owner
+        except asyncio.CancelledError:
+            if not lost:
+                raise
+            if hasattr(holder, "uncancel"):
+                # the cancellation came from the heartbeat, not from a caller
+                holder.uncancel()
+            raise LockLost(f"lease on lock '{name}' was lost") from None
+        finally:
+            renewing.cancel()
+            await asyncio.to_thread(self.release, name, owner)
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+            self._db = None
+
+shared_state = SharedState()
@@ -0,0 +1,271 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import JSON, DateTime, ForeignKey, ForeignKeyConstraint, Index, Integer, String, Text, create_engine, event, func, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, deferred, mapped_column, relationship, selectinload, undefer
+from HygdraAgency.DataModel.Project import Project
+from HygdraAgency.DataModel.Service import CodeFile, Service
+from HygdraAgency.DataModel.Task import Task, TaskStatus
+import asyncio
+import logging
+import os
+import threading
+
+logger = logging.getLogger("Store")
+
+
+# --- Tables ---
+class Base(DeclarativeBase):
+    pass
+
+class ProjectRow(Base):
+    __tablename__ = "projects"
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    name: Mapped[str] = mapped_column(String, index=True)
+    description: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(String, default="active")
+    version: Mapped[int] = mapped_column(Integer, default=0) # bumped by every write, tells workers their copy is stale
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    tasks: Mapped[List["TaskRow"]] = relationship(order_by="TaskRow.position", cascade="all, delete-orphan", lazy="select")
+    services: Mapped[List["ServiceRow"]] = relationship(order_by="ServiceRow.position", cascade="all, delete-orphan", lazy="select")
+
+class TaskRow(Base):
+    __tablename__ = "tasks"
+    __table_args__ = (Index("ix_tasks_project_status", "project_id", "status"),)
+    project_id: Mapped[str] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    id: Mapped[str] = mapped_column(String, primary_key=True) # task ids are only unique within a project
+    position: Mapped[int] = mapped_column(Integer)
+    title: Mapped[str] = mapped_column(String)
+    description: Mapped[str] = deferred(mapped_column(Text)) # heavy, only loaded with the full project
+    status: Mapped[str] = mapped_column(String)
+    assigned_to: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    dependencies: Mapped[List[str]] = mapped_column(JSON, default=list)
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    updated_at: Mapped[datetime] = mapped_column(DateTime)
+
+class ServiceRow(Base):
+    __tablename__ = "services"
+    project_id: Mapped[str] = mapped_column(ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    position: Mapped[int] = mapped_column(Integer)
+    name: Mapped[str] = mapped_column(String)
+    doc: Mapped[str] = deferred(mapped_column(Text))
+    status: Mapped[str] = mapped_column(String)
+    description: Mapped[str] = deferred(mapped_column(Text))
+
+    code: Mapped[List["CodeFileRow"]] = relationship(order_by="CodeFileRow.position", cascade="all, delete-orphan", lazy="select")
+
+class CodeFileRow(Base):
+    __tablename__ = "code_files"
+    __table_args__ = (ForeignKeyConstraint(["project_id", "service_id"], ["services.project_id", "services.id"], ondelete="CASCADE"),)
+    project_id: Mapped[str] = mapped_column(String, primary_key=True)
+    service_id: Mapped[str] = mapped_column(String, primary_key=True)
+    id: Mapped[str] = mapped_column(String, primary_key=True)
+    position: Mapped[int] = mapped_column(Integer)
+    name: Mapped[str] = mapped_column(String)
+    description: Mapped[str] = deferred(mapped_column(Text))
+    filename: Mapped[str] = mapped_column(String)
+    status: Mapped[str] = mapped_column(String)
+    langage: Mapped[str] = mapped_column(String)
+
+# --- Row <-> model mapping ---
+def unique(items: list, kind: str, parent: str) -> list:
+    "the last item of each id, in first-seen order, rows are keyed by id and would collapse silently"
+    latest = {}
+    for item in items:
+        latest[item.id] = item
+    if len(latest) < len(items):
+        logger.warning(f"{parent}: {len(items) - len(latest)} duplicate {kind} ids, keeping the last of each")
+    return list(latest.values())
+
+def task_row(project_id: str, position: int, task: Task) -> TaskRow:
+    return TaskRow(project_id=project_id, id=task.id, position=position, title=task.title, description=task.description,
+                   status=TaskStatus(task.status).value, assigned_to=task.assigned_to, dependencies=list(task.dependencies),
+                   created_at=task.created_at, updated_at=task.updated_at)
+
+def service_row(project_id: str, position: int, service: Service) -> ServiceRow:
+    return ServiceRow(project_id=project_id, id=service.id, position=position, name=service.name, doc=service.doc,
+                      status=service.status, description=service.description,
+                      code=[CodeFileRow(project_id=project_id, service_id=service.id, id=file.id, position=i, name=file.name,
+                                        description=file.description, filename=file.filename, status=file.status, langage=file.langage)
+                            for i, file in enumerate(unique(service.code, "code file", service.id))])
+
+def project_row(project: Project) -> ProjectRow:
+    return ProjectRow(id=project.id, name=project.name, description=project.description, status=project.status,
+                      tasks=[task_row(project.id, i, task) for i, task in enumerate(project.tasks)],
+                      services=[service_row(project.id, i, service) for i, service in enumerate(unique(project.app, "service", project.id))])
+
+def to_project(row: ProjectRow) -> Project:
+    return Project(
+        id=row.id, name=row.name, description=row.description, status=row.status,
+        tasks=[Task(id=task.id, title=task.title, description=task.description, status=TaskStatus(task.status),
+                    assigned_to=task.assigned_to, dependencies=task.dependencies or [],
+                    created_at=task.created_at, updated_at=task.updated_at) for task in row.tasks],
+        app=[Service(id=service.id, name=service.name, doc=service.doc, status=service.status, description=service.description,
+                     code=[CodeFile(id=file.id, name=file.name, description=file.description, filename=file.filename,
+                                    status=file.status, langage=file.langage) for file in service.code])
+             for service in row.services],
+    )
+
+# --- Project store ---
+class ProjectSummary(BaseModel):
+    id: str
+    name: str
+    description: str
+    status: str
+    tasks: Dict[str, int] = {} # task count per status
+
+class ProjectStore:
+    """
+    SQL backed storage of projects, their tasks, services and code files.
+
+    Nothing is loaded at startup: listings and name lookups are indexed
+    queries over the project and task tables, and a full project (task
+    descriptions, service docs, code file metadata) is only read when it is
+    asked for by id. Loaded projects are kept in a bounded LRU so that
+    concurrent jobs on the same project share one object. Every change is
+    written through with `save` or `save_task` and bumps the project
+    version; a loaded copy older than the database (written by another API
+    worker) is reloaded.
+    """
+    def __init__(self, url: Optional[str] = None, max_loaded: Optional[int] = None):
+        self.url = url or os.getenv("DATABASE_URL", "sqlite:///data/hygdra.sqlite")
+        self.max_loaded = max_loaded or int(os.getenv("PROJECT_CACHE_SIZE", "128"))
+        self._engine: Optional[Engine] = None
+        self._engine_lock = threading.Lock()
+        self._loaded: "OrderedDict[str, Project]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {} # one writer per project, merges select then insert
+
+    @property
+    def engine(self) -> Engine:
+        with self._engine_lock:
+            if self._engine is None:
+                if self.url.startswith("sqlite:///"):
+                    directory = os.path.dirname(self.url[len("sqlite:///"):])
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                if self.url.startswith("sqlite"):
+                    # several API workers write the same file
+                    self._engine = create_engine(self.url, connect_args={"timeout": 30})
+                    event.listen(self._engine, "connect", lambda connection, _: connection.execute("PRAGMA journal_mode=WAL"))
+                else:
+                    self._engine = create_engine(self.url)
+                Base.metadata.create_all(self._engine)
+        return self._engine
+
+    def _remember(self, project: Project, version: int) -> Project:
+        self._loaded[project.id] = project
+        self._versions[project.id] = version
+        self._loaded.move_to_end(project.id)
+        while len(self._loaded) > self.max_loaded:
+            evicted, _ = self._loaded.popitem(last=False)
+            self._versions.pop(evicted, None)
+        return project
+
+    # sync queries, run in a worker thread by the async methods below
+    def _get(self, project_id: str) -> Optional[tuple]:
+        with Session(self.engine) as session:
+            row = session.scalars(
+                select(ProjectRow).where(ProjectRow.id == project_id).options(
+                    selectinload(ProjectRow.tasks).options(undefer(TaskRow.description)),
+                    selectinload(ProjectRow.services).options(
+                        undefer(ServiceRow.doc), undefer(ServiceRow.description),
+                        selectinload(ServiceRow.code).options(undefer(CodeFileRow.description)),
+                    ),
+                )
+            ).first()
+            return (to_project(row), row.version) if row else None
+
+    def _find_id(self, name: str) -> Optional[str]:
+        with Session(self.engine) as session:
+            return session.scalars(select(ProjectRow.id).where(ProjectRow.name == name).limit(1)).first()
+
+    def _version(self, project_id: str) -> Optional[int]:
+        with Session(self.engine) as session:
+            return session.scalars(select(ProjectRow.version).where(ProjectRow.id == project_id)).first()
+
+    def _list(self) -> List[ProjectSummary]:
+        with Session(self.engine) as session:
+            summaries = {
+                row.id: ProjectSummary(id=row.id, name=row.name, description=row.description, status=row.status)
+                for row in session.scalars(select(ProjectRow).order_by(ProjectRow.name))
+            }
+            counts = session.execute(select(TaskRow.project_id, TaskRow.status, func.count()).group_by(TaskRow.project_id, TaskRow.status))
+            for project_id, status, count in counts:
+                if project_id in summaries:
+                    summaries[project_id].tasks[status] = count
+            return list(summaries.values())
+
+    def _bump(self, session: Session, project_id: str) -> int:
+        return session.execute(
+            update(ProjectRow).where(ProjectRow.id == project_id).values(version=ProjectRow.version + 1).returning(ProjectRow.version)
+        ).scalar_one()
+
+    def _save(self, project: Project) -> int:
+        with Session(self.engine) as session, session.begin():
+            session.merge(project_row(project))
+            session.flush()
+            return self._bump(session, project.id)
+
+    def _save_task(self, project_id: str, position: int, task: Task) -> int:
+        with Session(self.engine) as session, session.begin():
+            session.merge(task_row(project_id, position, task))
+            return self._bump(session, project_id)
+
+    async def get(self, project_id: str) -> Optional[Project]:
+        "the full project, from the loaded projects when still current or the database"
+        if project_id in self._loaded:
+            version = await asyncio.to_thread(self._version, project_id)
+            if version is not None and version == self._versions.get(project_id):
+                self._loaded.move_to_end(project_id)
+                return self._loaded[project_id]
+        loaded = await asyncio.to_thread(self._get, project_id)
+        if loaded is None:
+            return None
+        project, version = loaded
+        # another request may have loaded the same version meanwhile, keep the first object
+        if self._versions.get(project_id) == version:
+            return self._loaded[project_id]
+        return self._remember(project, version)
+
+    async def get_by_name(self, name: str) -> Optional[Project]:
+        project_id = await asyncio.to_thread(self._find_id, name)
+        return await self.get(project_id) if project_id else None
+
+    async def exists(self, project_id: str) -> bool:
+        return await asyncio.to_thread(self._version, project_id) is not None
+
+    async def list(self) -> List[ProjectSummary]:
+        "every project with its task counts, without loading tasks"
+        return await asyncio.to_thread(self._list)
+
+    def _lock(self, project_id: str) -> asyncio.Lock:
+        return self._locks.setdefault(project_id, asyncio.Lock())
+
+    async def save(self, project: Project):
+        "write the whole project graph"
+        async with self._lock(project.id):
+            self._remember(project, await asyncio.to_thread(self._save, project))
+
+    async def save_task(self, project: Project, task: Task):
+        "write a single task, e.g. after a status change"
+        task.updated_at = datetime.now()
+        position = next((i for i, other in enumerate(project.tasks) if other.id == task.id), len(project.tasks))
+        async with self._lock(project.id):
+            version = await asyncio.to_thread(self._save_task, project.id, position, task)
+        if self._loaded.get(project.id) is project:
+            self._versions[project.id] = version
+
+    def close(self):
+        if self._engine is not None:
+            self._engine.dispose()
+        self._engine = None
+        self._loaded.clear()
+        self._versions.clear()
+        self._locks.clear()
+
+project_store = ProjectStore()
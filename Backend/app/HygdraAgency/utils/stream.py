@@ -0,0 +1,76 @@
+from pydantic import BaseModel
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+from contextvars import ContextVar
+from fastapi.encoders import jsonable_encoder
+import asyncio
+import json
+
+
+# --- Server-Sent-Events plumbing ---
+class StreamEvent(BaseModel):
+    event: str # token, step, metrics, result or error
+    data: Any = None
+
+# queue of the workflow currently streamed to a client, None outside of SSE endpoints
+_current_stream: ContextVar[Optional[asyncio.Queue]] = ContextVar("hygdra_stream", default=None)
+# agent and step of the running workflow, labels the LLM calls made under it
+_current_step: ContextVar[Tuple[str, str]] = ContextVar("hygdra_step", default=("", ""))
+
+def streaming() -> bool:
+    "True when the running workflow is being pushed to a client"
+    return _current_stream.get() is not None
+
+def listen(queue: asyncio.Queue):
+    "route the events emitted by the current task, and the tasks it spawns, to `queue`"
+    _current_stream.set(queue)
+
+def emit(event: str, data: Any = None):
+    "push an event to the client of the running workflow, if any"
+    queue = _current_stream.get()
+    if queue is not None:
+        queue.put_nowait(StreamEvent(event=event, data=data))
+
+def emit_step(agent: str, step: str, /, **details):
+    "mark an agent step boundary"
+    _current_step.set((agent, step))
+    emit("step", {"agent": agent, "step": step, **details})
+
+def current_step() -> Tuple[str, str]:
+    "agent and step of the last step boundary of the running workflow"
+    return _current_step.get()
+
+def format_sse(event: StreamEvent) -> str:
+    "serialize an event to the text/event-stream wire format"
+    data = json.dumps(jsonable_encoder(event.data))
+    return f"event: {event.event}\ndata: {data}\n\n"
+
+async def stream_workflow(workflow: Callable[[], Awaitable[Any]]) -> AsyncIterator[str]:
+    """
+    Run an agent workflow and yield its tokens, steps and final result as SSE.
+
+    The workflow runs in its own task so every `emit` made underneath it,
+    including from OllamaClient.generate, lands on this stream's queue.
+    The workflow is cancelled if the client disconnects.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def runner():
+        listen(queue)
+        try:
+            result = await workflow()
+            queue.put_nowait(StreamEvent(event="result", data=result))
+        except Exception as e:
+            queue.put_nowait(StreamEvent(event="error", data={"detail": str(getattr(e, "detail", e))}))
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(runner())
+    try:
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield format_sse(event)
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,216 @@
+from typing import Dict, List, Optional, Tuple
+from HygdraAgency.utils.shared import SharedState, shared_state
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("Telemetry")
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300) # seconds
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192)
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300) # seconds
+LABELS = ("agent", "model", "step", "task")
+QUEUE_METRICS = ("hygdra_llm_queue_wait_seconds",) # labelled by priority class only
+
+
+# --- LLM call telemetry ---
+def escape(value: str) -> str:
+    "label value in the Prometheus text format"
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_labels(names: tuple, values: tuple) -> str:
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values)) + "}"
+
+def label_names(metric: str) -> tuple:
+    return ("priority",) if metric in QUEUE_METRICS else LABELS
+
+class Telemetry:
+    """
+    Per-call LLM telemetry aggregated into Prometheus histograms.
+
+    Every generation records the total, load, prompt evaluation and
+    generation durations reported by ollama, its time to first token and
+    its prompt and generated token counts, labelled by agent, model,
+    workflow step and task class. Cached answers only count as calls, and
+    calls that joined an identical one in flight only count as coalesced.
+    The LLM scheduler adds the queue wait of each admitted call, its
+    rejections and its queue depth and in-flight gauges, per priority class.
+
+    Each API worker aggregates its own calls. When a shared state is given,
+    a worker publishes its aggregates every `sync_interval` seconds, and
+    `render` sums the aggregates of every live worker. A worker removes its
+    aggregates when it stops, and aggregates not republished for
+    `STALE_INTERVALS` sync intervals (a worker that died) are left out.
+    """
+    HISTOGRAMS = {
+        "hygdra_llm_total_seconds": ("Duration of a generation reported by ollama", DURATION_BUCKETS),
+        "hygdra_llm_load_seconds": ("Model load time of a generation", DURATION_BUCKETS),
+        "hygdra_llm_prompt_eval_seconds": ("Prompt evaluation time of a generation", DURATION_BUCKETS),
+        "hygdra_llm_eval_seconds": ("Token generation time of a generation", DURATION_BUCKETS),
+        "hygdra_llm_time_to_first_token_seconds": ("Time from request to first streamed token", DURATION_BUCKETS),
+        "hygdra_llm_prompt_tokens": ("Prompt tokens evaluated by a generation", TOKEN_BUCKETS),
+        "hygdra_llm_eval_tokens": ("Tokens generated by a generation", TOKEN_BUCKETS),
+        "hygdra_llm_queue_wait_seconds": ("Time a generation waited for an LLM scheduler slot", WAIT_BUCKETS),
+    }
+    CALLS = "hygdra_llm_calls_total"
+    # metric -> label, description
+    COUNTERS = {
+        "hygdra_llm_coalesced_total": ("kind", "LLM calls that joined an identical call in flight"),
+        "hygdra_llm_rejected_total": ("priority", "Generations refused by the LLM scheduler, queue full"),
+    }
+    GAUGES = {
+        "hygdra_llm_queue_depth": ("priority", "Generations waiting for an LLM scheduler slot"),
+        "hygdra_llm_in_flight": ("priority", "Generations holding an LLM scheduler slot"),
+    }
+
+    STALE_INTERVALS = 3
+
+    def __init__(self, shared: Optional[SharedState] = None, sync_interval: Optional[float] = None):
+        self.shared = shared
+        self.sync_interval = sync_interval or float(os.getenv("METRICS_SYNC_INTERVAL", "5"))
+        # metric -> labels -> bucket counts then sum and count
+        self.histograms: Dict[str, Dict[tuple, List[float]]] = {name: {} for name in self.HISTOGRAMS}
+        self.calls: Dict[tuple, float] = {} # labels and cached -> calls
+        self.counters: Dict[str, Dict[str, float]] = {name: {} for name in self.COUNTERS} # metric -> label -> count
+        self.gauges: Dict[str, Dict[str, float]] = {name: {} for name in self.GAUGES} # metric -> label -> current value
+        self._lock = threading.Lock()
+        self._syncer: Optional[asyncio.Task] = None
+
+    def observe(self, metric: str, labels: tuple, value: Optional[float]):
+        if value is None:
+            return
+        buckets = self.HISTOGRAMS[metric][1]
+        with self._lock:
+            series = self.histograms[metric].setdefault(labels, [0] * (len(buckets) + 2))
+            # count of the smallest bucket holding the value, made cumulative when rendered
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def record(self, agent: str, model: str, step: str, task: str = "", cached: bool = False, time_to_first_token: Optional[float] = None,
+               total: Optional[int] = None, load: Optional[int] = None, prompt_eval: Optional[int] = None,
+               eval: Optional[int] = None, prompt_tokens: Optional[int] = None, eval_tokens: Optional[int] = None):
+        "one generation, durations in nanoseconds as ollama reports them"
+        labels = (agent, model, step, task)
+        with self._lock:
+            key = labels + ("true" if cached else "false",)
+            self.calls[key] = self.calls.get(key, 0) + 1
+        self.observe("hygdra_llm_time_to_first_token_seconds", labels, time_to_first_token)
+        if cached:
+            return
+        for metric, nanoseconds in (("hygdra_llm_total_seconds", total), ("hygdra_llm_load_seconds", load),
+                                    ("hygdra_llm_prompt_eval_seconds", prompt_eval), ("hygdra_llm_eval_seconds", eval)):
+            self.observe(metric, labels, None if nanoseconds is None else nanoseconds / 1e9)
+        self.observe("hygdra_llm_prompt_tokens", labels, prompt_tokens)
+        self.observe("hygdra_llm_eval_tokens", labels, eval_tokens)
+
+    def count(self, metric: str, label: str):
+        with self._lock:
+            self.counters[metric][label] = self.counters[metric].get(label, 0) + 1
+
+    def coalesce(self, kind: str):
+        "one generation or embedding served by an identical call in flight"
+        self.count("hygdra_llm_coalesced_total", kind)
+
+    def gauge(self, metric: str, label: str, value: float):
+        with self._lock:
+            self.gauges[metric][label] = value
+
+    # aggregates of every worker
+    def dump(self) -> str:
+        with self._lock:
+            return json.dumps({
+                "labels": list(LABELS),
+                "histograms": {metric: [[*labels, *values] for labels, values in series.items()] for metric, series in self.histograms.items()},
+                "calls": [[*key, count] for key, count in self.calls.items()],
+                "counters": {metric: [[label, count] for label, count in series.items()] for metric, series in self.counters.items()},
+                "gauges": {metric: [[label, value] for label, value in series.items()] for metric, series in self.gauges.items()},
+            })
+
+    @staticmethod
+    def merge(dumps: List[str]) -> Tuple[Dict[str, Dict[tuple, List[float]]], Dict[tuple, float], Dict[str, Dict[str, float]]]:
+        "histograms, calls, and counters and gauges together, summed over the workers"
+        histograms: Dict[str, Dict[tuple, List[float]]] = {}
+        calls: Dict[tuple, float] = {}
+        totals: Dict[str, Dict[str, float]] = {}
+        for dump in dumps:
+            data = json.loads(dump)
+            # published by a worker labelling series differently, skipped until it publishes again
+            if data.get("labels") != list(LABELS):
+                continue
+            for metric, rows in data["histograms"].items():
+                merged = histograms.setdefault(metric, {})
+                width = len(label_names(metric))
+                for row in rows:
+                    labels, values = tuple(row[:width]), row[width:]
+                    current = merged.setdefault(labels, [0] * len(values))
+                    merged[labels] = [a + b for a, b in zip(current, values)]
+            for row in data["calls"]:
+                key = tuple(row[:-1])
+                calls[key] = calls.get(key, 0) + row[-1]
+            for metric, rows in [*data.get("counters", {}).items(), *data.get("gauges", {}).items()]:
+                merged = totals.setdefault(metric, {})
+                for label, value in rows:
+                    merged[label] = merged.get(label, 0) + value
+        return histograms, calls, totals
+
+    async def _flush(self):
+        await asyncio.to_thread(self.shared.put, "metrics", self.shared.owner_prefix, self.dump())
+
+    async def _sync(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self._flush()
+            except Exception as e:
+                logger.error(f"publishing metrics failed: {e}")
+
+    async def start(self):
+        if self.shared is not None and self._syncer is None:
+            self._syncer = asyncio.create_task(self._sync())
+
+    async def stop(self):
+        if self._syncer is not None:
+            self._syncer.cancel()
+            await asyncio.gather(self._syncer, return_exceptions=True)
+            self._syncer = None
+            await asyncio.to_thread(self.shared.delete, "metrics", [self.shared.owner_prefix])
+
+    async def render(self) -> str:
+        "every metric in the Prometheus text exposition format"
+        if self.shared is not None:
+            # this worker is always current, the others as of their last publication
+            await self._flush()
+            since = time.time() - self.STALE_INTERVALS * self.sync_interval
+            histograms, calls, totals = self.merge(await asyncio.to_thread(self.shared.list, "metrics", since=since))
+        else:
+            histograms, calls, totals = self.merge([self.dump()])
+
+        lines = [f"# HELP {self.CALLS} LLM generations, cached answers included", f"# TYPE {self.CALLS} counter"]
+        for key, count in sorted(calls.items()):
+            lines.append(f"{self.CALLS}{format_labels(LABELS + ('cached',), key)} {count:g}")
+        for kind, metrics in (("counter", self.COUNTERS), ("gauge", self.GAUGES)):
+            for metric, (label, description) in metrics.items():
+                lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {kind}"]
+                for value_label, value in sorted(totals.get(metric, {}).items()):
+                    lines.append(f"{metric}{format_labels((label,), (value_label,))} {value:g}")
+        for metric, (description, buckets) in self.HISTOGRAMS.items():
+            names = label_names(metric)
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} histogram"]
+            for labels, values in sorted(histograms.get(metric, {}).items()):
+                cumulative = 0
+                for bound, count in zip(buckets, values):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{format_labels(names + ('le',), labels + (f'{bound:g}',))} {cumulative:g}")
+                lines.append(f"{metric}_bucket{format_labels(names + ('le',), labels + ('+Inf',))} {values[-1]:g}")
+                lines.append(f"{metric}_sum{format_labels(names, labels)} {values[-2]:g}")
+                lines.append(f"{metric}_count{format_labels(names, labels)} {values[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+telemetry = Telemetry(shared=shared_state)
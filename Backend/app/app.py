@@ -1,7 +1,8 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from enum import Enum
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request, Query
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from datetime import datetime
 import requests
 import json
@@ -15,10 +16,26 @@ from HygdraAgency.DataModel.Project import Project
 from HygdraAgency.DataModel.Service import Service 
 import uvicorn
 import os
+import time
 import logfire
 from typing import Annotated
+from contextlib import asynccontextmanager
 from elasticsearch import Elasticsearch, helpers
 import HygdraAgency.utils.rag as rag
+from HygdraAgency.Agent.Ollama import session_pool, model_router
+from HygdraAgency.utils.stream import stream_workflow, format_sse
+from HygdraAgency.utils.cache import response_cache
+from HygdraAgency.utils.ingest import ingestor
+from HygdraAgency.utils.scheduler import TaskScheduler, TaskGraph
+from HygdraAgency.utils.jobs import job_queue, JobQueueFull, JobStatus
+from HygdraAgency.utils.store import project_store
+from HygdraAgency.utils.shared import shared_state
+from HygdraAgency.utils.search import project_index
+from HygdraAgency.utils.artifacts import artifact_store
+from HygdraAgency.utils.telemetry import telemetry
+from HygdraAgency.utils.coalesce import llm_flights
+from HygdraAgency.utils.admission import llm_scheduler, SchedulerSaturated
+from HygdraAgency.utils.embeding import embedder
 
 #TODO
 # connect retreive project instancce
@@ -27,7 +44,6 @@ import HygdraAgency.utils.rag as rag
 # add a get all project name
 # add a get project properties
 # add a file viewer vscode web for generated code
-# persistent db project
 
 # Sonarqube create project cmd
 # link to jenkins
@@ -39,9 +55,23 @@ import HygdraAgency.utils.rag as rag
 # simple tchat function with agent
 # continue or work on function to target specfic code
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # one pooled ollama session for the whole app lifetime
+    await session_pool.start()
+    await job_queue.start()
+    await telemetry.start()
+    yield
+    await job_queue.stop()
+    await telemetry.stop()
+    await session_pool.stop()
+    response_cache.close()
+    project_store.close()
+    shared_state.close()
+
 # Initialize agents
 # --- API Routes ---
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 logfire.configure()
 #logfire.instrument_fastapi(app)
@@ -54,26 +84,43 @@ devops_agent = DevOpsAgent()
 tester_agent = TesterAgent()
 
 available_agents = [dev_agent, tester_agent] # devops_agent
-active_projects: Dict[str, Project] = {}
+
+async def get_project(project_id: str) -> Project:
+    "the stored project, or a 404"
+    project = await project_store.get(project_id)
+    if project is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project
+
+def project_lock(project_id: str):
+    "held while tasks of the project are assigned and worked on, across API workers"
+    return shared_state.lock(f"project:{project_id}")
 
 @app.post("/projects/")
-async def create_project(name: str, description: str):
+async def create_project(name: str, description: str, priority: int = 5, wait: bool = False):
     """
     Creates a new project and initializes necessary resources for it.
 
+    The project initialization runs as a background job: the endpoint returns
+    the job right away, poll `GET /jobs/{job_id}` or subscribe to
+    `GET /jobs/{job_id}/events`, the project is the job result. Pass
+    `wait=true` to block until the project is created like before.
+
     This endpoint accepts a project name and description, initializes the 
     project using the `pm_agent`, and then creates a directory to store 
-    the project's generated code. The new project is added to the list of 
-    active projects, and the RAG (Retrieval-Augmented Generation) system 
+    the project's generated code. The new project is saved to the project 
+    store, and the RAG (Retrieval-Augmented Generation) system 
     is set up with a search index and the initial project document.
 
-    The project details are stored in an internal dictionary of active projects,
-    and the RAG system is initialized to facilitate document retrieval and 
+    The project, its tasks and services are written to the database
+    (`DATABASE_URL`), and the RAG system is initialized to facilitate document retrieval and 
     storage.
 
     Args:
         name (str): The name of the project to be created.
         description (str): A brief description of the project.
+        priority (int): Job priority, lower runs first.
+        wait (bool): Wait for the job and return the project instead of the job.
 
     Returns:
         Project: The initialized `Project` object representing the new project.
@@ -97,42 +144,51 @@ async def create_project(name: str, description: str):
 
     Side Effects:
         - A directory is created for the project to store generated code.
-        - The project is added to the active projects registry.
+        - The project is saved to the project store.
         - RAG search index is built for the new project.
         - A document representing the project is stored in the RAG system.
 
     Raises:
+        - HTTPException: 429 when the job queue is full.
         - Any exception raised by `pm_agent.initialize_project` or `rag` methods 
-          will be propagated as an HTTP error response.
+          fails the job, or is propagated as an HTTP error response with `wait=true`.
     """
+    return await enqueue("create_project", lambda: initialize_project(name, description), None, priority, wait)
+
+async def initialize_project(name: str, description: str) -> Project:
     project = await pm_agent.initialize_project(name, description)
-    os.mkdir(f"generated_code/{project.id}")
-    active_projects[project.id] = project
+    await artifact_store.create_project(project.id)
+    await project_store.save(project)
+    await project_index.update(project)
     
     rr = await rag.build_search_index(str(project.id))
-    rr = await rag.store_document(context=rag.Deps(project, 5), document=rag.Document(project.name, "generated_code/{project.id}", project.description))
+    rr = await rag.store_document(context=rag.Deps(project, 5), document=rag.Document(project.name, artifact_store.project_dir(project.id), project.description))
     return project
 
 @app.post("/projects/{project_id}/ressources/")
 async def create_file(project_id: str, file: UploadFile):
     """
-    Uploads a file for a specific project and stores it in the RAG system.
+    Uploads a file for a specific project and ingests it in the RAG system.
 
     This endpoint allows users to upload a file to a specific project by its `project_id`. 
-    The file is stored and indexed in the RAG (Retrieval-Augmented Generation) system for later use. 
+    The upload is spooled to disk and handed to a background ingestion job that
+    splits it into overlapping chunks (code-aware for source files), embeds the
+    chunks in batches and stores them in the project collection with their offsets.
+    The request returns as soon as the file is spooled.
     If the project is not currently active, an error message is returned.
 
     Args:
         project_id (str): The unique identifier of the project to which the file will be uploaded.
-        file (UploadFile): The file to be uploaded. This file will be read and its contents stored.
+        file (UploadFile): The file to be uploaded. It is streamed to disk, never fully read in memory.
 
     Returns:
-        dict: A message indicating success or an error message if the project is not active.
+        dict: A message and the ingestion job id, or an error message if the project is not active.
 
     Response:
         200 OK
         {
-            "message": "File for project {project_id} successfully uploaded!"
+            "message": "File for project {project_id} successfully uploaded!",
+            "job": {"id": "...", "status": "queued", "progress": 0.0, ...}
         }
 
         400 Bad Request (if project is not active)
@@ -142,61 +198,106 @@ async def create_file(project_id: str, file: UploadFile):
         }
 
     Side Effects:
-        - If the project is active, the uploaded file is stored and indexed in the RAG system using `rag.store_external_document`.
+        - If the project is active, an ingestion job is started; follow it with
+          `GET /projects/{project_id}/ressources/jobs/{job_id}`.
         - If the project is not active, no file is stored, and an error message is returned.
-
-    Raises:
-        - Any exceptions related to the file upload or `rag.store_external_document` may propagate as HTTP error responses.
     """
-    contents = await file.read()
-    if project_id in active_projects:
-        project = active_projects[project_id]
-        rag.store_document(rag.Deps(project, 5), rag.Document(project_id, file.filename, contents))
-        return {"message": f"File for project {project_id} successfully uploaded!"}
+    project = await project_store.get(project_id)
+    if project is not None:
+        job = await ingestor.submit(project, file)
+        return {"message": f"File for project {project_id} successfully uploaded!", "job": job}
     else:
         # Return an error if the project is not active
         return {"error": "Project not active", "project_id": project_id}
 
+@app.get("/projects/{project_id}/ressources/jobs/{job_id}")
+async def get_ingestion_job(project_id: str, job_id: str):
+    "status and progress of a resource ingestion job"
+    job = await ingestor.find(job_id)
+    if job is None or job.project_id != project_id:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job
+
 @app.post("/projects/get-all")
 async def get_all():   
-    return active_projects
+    "every project with its task count per status, tasks themselves are not loaded"
+    return await project_store.list()
 
 @app.post("/projects/get-by-id")
 async def get(project_id: str):  
-    if project_id in active_projects :
-        return active_projects[project_id]
+    project = await project_store.get(project_id)
+    if project is not None :
+        return project
     else :
         return {"error" : "no project with id"}
 
 @app.post("/projects/get-by-name")
 async def get(project_title: str):  
-    active_projects_title = [project.title for pid, project in active_projects]
-    if project_title in active_projects_title :
-        return active_projects[active_projects_title.index(project_title)]
+    project = await project_store.get_by_name(project_title)
+    if project is not None :
+        return project
     else :
         return {"error" : "no project with title"}
 
 @app.post("/projects/get-by-request")
-async def get(request: str):  
-    # all project rag and retreiver
-    if 1 in [1,2] :
-        return {"message" : "todo"}
-    else :
-        return {"error" : "no project with id"}
+async def get(request: str, n: int = 5):  
+    """
+    Finds the projects matching a natural-language request.
+
+    Searches one embedding index over every project description, task title
+    and generated service doc, and ranks projects by their closest entry.
+    Only the request is embedded, no generation call is made.
+
+    Returns:
+        list: up to `n` projects with their `score` and best `matches`
+              (`kind` project, task or service, `ref`, `text`, `score`).
+    """
+    return await project_index.search(request, n)
+
+@app.post("/projects/search-index/rebuild")
+async def rebuild_search_index():
+    "index the stored projects that are missing from the search index, e.g. created before it existed"
+    indexed = 0
+    for summary in await project_store.list():
+        project = await project_store.get(summary.id)
+        if project is not None:
+            indexed += await project_index.index(project)
+    return {"indexed": indexed}
 
 # get project per context  
 @app.post("/projects/{project_id}/tchat/")
 async def tchat_with_context(project_id: str, request:str):
-    if project_id in active_projects :
-        response = ProjectManagerAgent.tchat(active_projects[project_id], request)
+    project = await get_project(project_id)
+    response = await pm_agent.tchat(project, request)
 
     return {"request" : request, "response": response}
 
+@app.post("/projects/{project_id}/tchat/stream")
+async def tchat_with_context_stream(project_id: str, request:str):
+    """
+    Server-Sent-Events variant of `/projects/{project_id}/tchat/`.
+
+    Pushes `step` events at each agent step boundary, `token` events as the
+    model generates, a `metrics` event with the time to first token of each
+    LLM call and a final `result` (or `error`) event.
+    """
+    project = await get_project(project_id)
+
+    async def workflow():
+        response = await pm_agent.tchat(project, request)
+        return {"request" : request, "response": response}
+
+    return StreamingResponse(stream_workflow(workflow), media_type="text/event-stream")
+
 @app.post("/projects/{project_id}/next-task")
-async def process_next_task(project_id: str):
+async def process_next_task(project_id: str, priority: int = 5, wait: bool = False):
     """
     Processes the next available task for a given project and assigns it to an agent.
 
+    The work runs as a background job and the endpoint returns the job right
+    away (see `GET /jobs/{job_id}`); pass `wait=true` to get the result
+    below in the response instead.
+
     This endpoint handles the processing of the next task in the queue for a specific project.
     It assigns the task to an available agent, updates the task's status, and processes the task
     based on the agent's type (e.g., Developer, DevOps, or Tester). Once the task is completed,
@@ -236,20 +337,55 @@ async def process_next_task(project_id: str):
         - The project task list is updated with the new task status.
 
     Raises:
-        - HTTPException: If the project is not found in the `active_projects` registry, a `404 Not Found` error is raised.
+        - HTTPException: If the project is not found in the project store, a `404 Not Found` error is raised.
+        - HTTPException: 429 when the job queue is full.
     """
-    if project_id not in active_projects:
-        raise HTTPException(status_code=404, detail="Project not found")
+    await get_project(project_id)
     
-    project = active_projects[project_id]
+    return await enqueue("next_task", lambda: run_next_task_locked(project_id), project_id, priority, wait)
+
+@app.post("/projects/{project_id}/next-task/stream")
+async def process_next_task_stream(project_id: str):
+    """
+    Server-Sent-Events variant of `/projects/{project_id}/next-task`.
+
+    Streams the assignment and development steps, generated tokens and
+    per-call time to first token, then the same payload as the blocking
+    endpoint in a final `result` event.
+    """
+    await get_project(project_id)
+
+    return StreamingResponse(stream_workflow(lambda: run_next_task_locked(project_id)), media_type="text/event-stream")
+
+async def run_next_task_locked(project_id: str) -> dict:
+    "run_next_task under the project lock, on the latest stored state of the project"
+    async with project_lock(project_id):
+        return await run_next_task(await get_project(project_id))
+
+async def run_next_task(project: Project) -> dict:
+    "assign the next task of the project and let the selected agent work on it"
+    start = time.perf_counter()
     task, assigned_agent = await task_assigner.assign_next_task(project, available_agents)
+    assignment_latency = time.perf_counter() - start
     
     if not task or not assigned_agent:
         return {"status": "no_tasks_available"}
+
+    result = await work_on_task(project, task, assigned_agent)
     
+    return {
+        "task": task,
+        "agent": assigned_agent.name,
+        "result": result,
+        "assignment_latency": assignment_latency
+    }
+
+async def work_on_task(project: Project, task: Task, assigned_agent):
+    "let an agent process a task and mark it done"
     # Update task status
     task.status = TaskStatus.IN_PROGRESS
     task.assigned_to = assigned_agent.name
+    await project_store.save_task(project, task)
     result = ""
 
     # Process task based on agent type
@@ -267,13 +403,174 @@ async def process_next_task(project_id: str):
     
     # Update task status based on result
     task.status = TaskStatus.DONE
+    task_assigner.analysis_store.invalidate(project.id, task.id)
+    # the agent may have added services and code files
+    await project_store.save(project)
+    await project_index.update(project)
     # project = await pm_agent.update_task_status(project, task.id, TaskStatus.DONE)
-    
-    return {
-        "task": task,
-        "agent": assigned_agent.name,
-        "result": result
-    }
+    return result
+
+@app.post("/projects/{project_id}/run")
+async def run_project(project_id: str, max_parallel: Optional[int] = Query(None, ge=1), priority: int = 10, wait: bool = False):
+    """
+    Runs every remaining task of a project to completion.
+
+    Runs as a background job reporting its progress (`GET /jobs/{job_id}`),
+    pass `wait=true` to block until the whole project is done.
+
+    Builds a DAG from the task dependencies and dispatches every task whose
+    dependencies are done to a pool of at most `max_parallel` workers
+    (default `SCHEDULER_MAX_PARALLEL`). Each worker picks the best agent for
+    its task and runs it; newly unblocked tasks join the ready queue.
+
+    Returns:
+        dict: the completed, failed and blocked task ids and the elapsed time.
+
+    Raises:
+        - HTTPException: 404 if the project is not found, 400 if the task dependencies form a cycle,
+          429 when the job queue is full.
+    """
+    project = await get_project(project_id)
+    try:
+        TaskGraph(project.tasks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def run():
+        async with project_lock(project_id):
+            project = await get_project(project_id)
+
+            async def run_task(task: Task):
+                agent = await task_assigner.select_agent(project, task, available_agents)
+                await work_on_task(project, task, agent)
+                return agent.name
+
+            async def on_update(task: Task):
+                await project_store.save_task(project, task)
+
+            return await TaskScheduler(run_task, max_parallel, on_update).run(project.tasks)
+
+    return await enqueue("run_project", run, project_id, priority, wait)
+
+async def enqueue(kind: str, workflow, project_id: Optional[str], priority: int, wait: bool):
+    "submit a workflow to the job queue, optionally waiting for its result"
+    job = job_queue.submit(kind, workflow, project_id, priority)
+    if not wait:
+        return {"job": job}
+
+    job = await job_queue.wait(job.id)
+    if job.status == JobStatus.FAILED and job.retry_after is not None:
+        raise HTTPException(status_code=429, detail=job.error, headers={"Retry-After": str(job.retry_after)})
+    if job.status == JobStatus.FAILED:
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status == JobStatus.CANCELLED:
+        raise HTTPException(status_code=409, detail="Job cancelled")
+    return job.result
+
+@app.exception_handler(JobQueueFull)
+async def job_queue_full(request: Request, exc: JobQueueFull):
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": os.getenv("JOB_RETRY_AFTER", "30")})
+
+@app.exception_handler(SchedulerSaturated)
+async def llm_scheduler_saturated(request: Request, exc: SchedulerSaturated):
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": str(exc.retry_after)})
+
+@app.get("/jobs")
+async def list_jobs(project_id: Optional[str] = None):
+    return await job_queue.find_all(project_id)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    "status, priority, last agent step and progress of a job"
+    job = await job_queue.find(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await job_queue.find(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != JobStatus.DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status.value}", headers={"Retry-After": "5"} if job.status in (JobStatus.QUEUED, JobStatus.RUNNING) else None)
+    return job.result
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    "Server-Sent-Events of a job: status changes, agent steps, tokens, progress and result"
+    if await job_queue.find(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for event in job_queue.follow(job_id):
+            yield format_sse(event)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await job_queue.request_cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/projects/{project_id}/artifacts")
+async def project_artifacts(project_id: str):
+    "manifests of the generated files of every task of the project"
+    await get_project(project_id)
+    return await artifact_store.project_manifest(project_id)
+
+@app.post("/projects/{project_id}/tasks/{task_id}/snapshots")
+async def snapshot_task(project_id: str, task_id: str):
+    "record the current generated files of a task"
+    await get_project(project_id)
+    return {"snapshot": await artifact_store.snapshot(project_id, task_id)}
+
+@app.post("/projects/{project_id}/tasks/{task_id}/snapshots/{snapshot_id}/restore")
+async def restore_task(project_id: str, task_id: str, snapshot_id: str):
+    "bring the generated files of a task back to a snapshot, waits for the task not to be worked on"
+    await get_project(project_id)
+    async with project_lock(project_id):
+        try:
+            return await artifact_store.restore(project_id, task_id, snapshot_id)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Snapshot not found")
+
+@app.get("/artifacts/stats")
+async def artifact_stats():
+    "written, deduplicated and unchanged file counters of the artifact store"
+    return artifact_store.stats
+
+@app.get("/metrics")
+async def metrics():
+    "LLM call latency and token histograms of every worker, Prometheus text format"
+    return PlainTextResponse(await telemetry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/llm-routes")
+async def llm_routes():
+    "model, budget and fallbacks of every step class, with its calls, fallbacks and mean latency"
+    return model_router.report()
+
+@app.get("/llm-coalesce/stats")
+async def llm_coalesce_stats():
+    "generations sent and joined while in flight, embedding texts asked and shared"
+    return {"generate": llm_flights.stats, "embed": embedder.stats}
+
+@app.get("/llm-scheduler/stats")
+async def llm_scheduler_stats():
+    "admitted, refused, waiting and running generations per priority class, with their queue wait"
+    return llm_scheduler.stats
+
+@app.get("/llm-cache/stats")
+async def llm_cache_stats():
+    "hit, miss and eviction counters of the ollama response cache"
+    return response_cache.stats
+
+@app.get("/task-analysis/stats")
+async def task_analysis_stats():
+    "how many task requirement analyses were served from the per-project store"
+    return task_assigner.analysis_store.stats
 
 def start():
     """Start the application"""
@@ -296,13 +593,15 @@ def start():
     tester_agent.sonar_config.token = os.getenv("SONAR_TOKEN", "")
     tester_agent.sonar_config.host_url = os.getenv("SONAR_URL", "http://localhost:9000")
     
-    # Start the server
+    # Start the server, WORKERS > 1 is the production mode: projects, jobs and
+    # caches live in the shared database files and reload is not available
+    workers = int(os.getenv("WORKERS", "1"))
     uvicorn.run(
-        "main:app",
+        "app:app",
         host=host,
         port=port,
-        reload=True,
-        workers=1
+        reload=workers == 1 and os.getenv("RELOAD", "true").lower() == "true",
+        workers=workers
     )
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+__all__ = ["fake_ollama", "bench_ollama_pool", "bench_streaming", "bench_embeddings", "bench_scoring", "bench_workers", "bench_vector_store", "bench_context", "bench_codegen", "bench_pipeline", "loop_monitor", "loadtest", "bench_routing", "bench_coalesce", "bench_admission"]
@@ -0,0 +1,73 @@
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt
+from HygdraAgency.utils.admission import LLMScheduler, Priority, SchedulerConfig, SchedulerSaturated, llm_priority
+from HygdraAgency.utils.coalesce import SingleFlight
+from benchmarks.fake_ollama import FakeOllama
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+
+# --- Chat latency while background generations saturate the server, FIFO vs priority scheduler ---
+async def run(server: FakeOllama, max_in_flight: int, args) -> dict:
+    server.reset()
+    scheduler = LLMScheduler(SchedulerConfig(max_in_flight=max_in_flight, service_time=args.call_latency))
+    # distinct prompts, nothing is coalesced
+    flights = SingleFlight(enabled=False)
+    config = OllamaModelConfig(base_url=server.url)
+    latencies = {priority: [] for priority in Priority}
+    rejected = 0
+
+    async def generate(priority: Priority, project: str, prompt: str):
+        nonlocal rejected
+        with llm_priority(priority, project):
+            start = time.perf_counter()
+            try:
+                async with OllamaClient(config, flights=flights, scheduler=scheduler) as ollama:
+                    await ollama.generate(OllamaPrompt(prompt=prompt))
+            except SchedulerSaturated:
+                rejected += 1
+                return
+            latencies[priority].append(time.perf_counter() - start)
+
+    async def background(project: int):
+        # a developer loop, one generation after the other
+        for i in range(args.iterations):
+            await generate(Priority.BACKGROUND, f"project {project}", f"project {project} file {i}")
+
+    async def chat():
+        for i in range(args.chats):
+            await asyncio.sleep(args.chat_interval)
+            await generate(Priority.INTERACTIVE, "project 0", f"question {i}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(background(project) for project in range(args.projects)), chat())
+    return {"elapsed": time.perf_counter() - start, "latencies": latencies, "rejected": rejected}
+
+def describe(latencies: list) -> str:
+    if not latencies:
+        return "none"
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return f"p50 {statistics.median(latencies) * 1000:7.1f}ms p95 {p95 * 1000:7.1f}ms ({len(latencies)} calls)"
+
+async def main(args):
+    logging.disable(logging.WARNING)
+    async with FakeOllama(call_latency=args.call_latency, parallel=args.parallel) as server:
+        for label, max_in_flight in (("fifo", 0), ("scheduled", args.parallel)):
+            result = await run(server, max_in_flight, args)
+            print(f"{label:>9}: {result['elapsed']:.2f}s, chat {describe(result['latencies'][Priority.INTERACTIVE])}, "
+                  f"background {describe(result['latencies'][Priority.BACKGROUND])}, {result['rejected']} refused")
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare chat latency under background generation load with and without the priority scheduler")
+    parser.add_argument("--projects", type=int, default=8, help="background developer loops running at once")
+    parser.add_argument("--iterations", type=int, default=10, help="generations per developer loop")
+    parser.add_argument("--chats", type=int, default=10)
+    parser.add_argument("--chat-interval", type=float, default=0.1, help="seconds between chat questions")
+    parser.add_argument("--call-latency", type=float, default=0.05, help="seconds per generation on the stand-in")
+    parser.add_argument("--parallel", type=int, default=2, help="generations the stand-in serves at once, the scheduler slots")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,51 @@
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt
+from HygdraAgency.utils.coalesce import SingleFlight
+from HygdraAgency.utils.embeding import EmbedingBatcher, EmbedingConfig
+from benchmarks.fake_ollama import FakeOllama
+import argparse
+import asyncio
+import time
+
+
+# --- Concurrent identical calls: one request each vs single-flight ---
+async def run(server: FakeOllama, coalesce: bool, args) -> dict:
+    server.reset()
+    flights = SingleFlight(enabled=coalesce)
+    config = OllamaModelConfig(base_url=server.url)
+    # every caller asks one of `distinct` prompts, the way agents fan out over the same task
+    prompts = [OllamaPrompt(prompt=f"analyse task {i % args.distinct}") for i in range(args.callers)]
+
+    async def generate(prompt: OllamaPrompt) -> str:
+        async with OllamaClient(config, flights=flights) as ollama:
+            return await ollama.generate(prompt)
+
+    start = time.perf_counter()
+    answers = await asyncio.gather(*(generate(prompt) for prompt in prompts))
+    elapsed = time.perf_counter() - start
+    assert all(answer == answers[0] for answer in answers)
+    generations = server.requests
+
+    batcher = EmbedingBatcher(EmbedingConfig(max_batch_size=args.callers, coalesce=coalesce), config)
+    await asyncio.gather(*(batcher.embed(prompt.prompt) for prompt in prompts))
+    return {"elapsed": elapsed, "generations": generations, "joined": flights.stats.coalesced,
+            "embedded": server.embedded_texts, "embed_joined": batcher.stats.coalesced}
+
+async def main(args):
+    async with FakeOllama(response=" ".join(f"token{i}" for i in range(args.tokens)), call_latency=args.call_latency,
+                          token_latency=args.token_latency, parallel=args.parallel) as server:
+        for label, coalesce in (("one each", False), ("coalesced", True)):
+            result = await run(server, coalesce, args)
+            print(f"{label:>9}: {args.callers} callers, {result['generations']} generations sent ({result['joined']} joined) "
+                  f"in {result['elapsed'] * 1000:.1f}ms, {result['embedded']} texts embedded ({result['embed_joined']} shared)")
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark single-flight coalescing of concurrent identical generations and embeddings")
+    parser.add_argument("--callers", type=int, default=32)
+    parser.add_argument("--distinct", type=int, default=4, help="different prompts among the callers")
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--call-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--parallel", type=int, default=4, help="generations the stand-in serves at once, 0 for unlimited")
+    args = parser.parse_args()
+    asyncio.run(main(args))
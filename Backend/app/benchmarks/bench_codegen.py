@@ -0,0 +1,84 @@
+from HygdraAgency.Agent.DeveloperAgent import DeveloperAgent
+from HygdraAgency.Agent.Ollama import OllamaModelConfig
+from HygdraAgency.DataModel.Project import Project
+from HygdraAgency.DataModel.Task import Task, TaskStatus
+from HygdraAgency.utils.embeding import embedder
+from HygdraAgency.utils.rag import LocalVectorStore
+from benchmarks.fake_ollama import FakeOllama
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+# --- Wall clock of a multi-file task, file by file vs manifest and concurrent generation ---
+def responder(files: int):
+    "scripted developer answers, JSON for the structured steps, the sequential plan is done after `files` files"
+    updates = 0
+
+    def respond(payload: dict) -> str:
+        nonlocal updates
+        prompt = payload["prompt"]
+        properties = (payload.get("format") or {}).get("properties", {})
+        if "files" in properties:
+            return json.dumps({"files": [{"filename": f"module_{i}.py", "langage": "python", "description": f"module {i}",
+                                          "headers": [f"def handler_{i}(request: dict) -> dict"]} for i in range(files)]})
+        if "issues" in properties:
+            return json.dumps({"issues": []})
+        if "code" in properties:
+            return json.dumps({"filename": f"module_{updates}.py", "langage": "python", "code": "def handler(request: dict) -> dict:\n    return request\n"})
+        if "next_file" in properties:
+            updates += 1
+            return json.dumps({"plan": f"{files - updates} files left", "done": updates >= files,
+                               "next_file": f"module_{updates}.py with def handler_{updates}(request: dict) -> dict"})
+        if "file to code" in prompt:
+            return "```python\ndef handler(request: dict) -> dict:\n    return request\n```"
+        if "select the next file to code" in prompt:
+            return "module_0.py with def handler_0(request: dict) -> dict"
+        return "no external ressources needed"
+
+    return respond
+
+async def run(server: FakeOllama, mode: str, files: int, concurrency: int, directory: str) -> dict:
+    server.responder = responder(files)
+    agent = DeveloperAgent()
+    agent.ollama_config = OllamaModelConfig(base_url=server.url, temperature=0.2)
+    agent.store = LocalVectorStore(os.path.join(directory, "vectors"))
+    agent.generation_mode = mode
+    agent.max_concurrency = concurrency
+    project = Project(id=f"bench-{mode}", name="bench", description="multi-file code generation benchmark")
+    task = Task(id="task-0", title="service", description="write the request handlers", status=TaskStatus.TODO)
+
+    server.reset()
+    start = time.perf_counter()
+    await agent.work_on_task(task, project)
+    return {"elapsed": time.perf_counter() - start, "files": len(project.app[0].code), "calls": server.requests}
+
+async def main(files: int, concurrency: int, call_latency: float, token_latency: float, parallel: int):
+    directory = tempfile.mkdtemp(prefix="hygdra-codegen-")
+    cwd = os.getcwd()
+    # generated files land under GENERATED_CODE_PATH, relative to the working directory by default
+    os.chdir(directory)
+    try:
+        async with FakeOllama(call_latency=call_latency, token_latency=token_latency, parallel=parallel) as server:
+            embedder.ollama_config.base_url = server.url
+            for mode in ("sequential", "parallel"):
+                result = await run(server, mode, files, concurrency, directory)
+                print(f"{mode:>10}: {result['files']} files in {result['elapsed']:.2f}s, {result['calls']} LLM calls")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sequential and parallel multi-file generation of the developer agent")
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4, help="DEV_GENERATION_CONCURRENCY")
+    parser.add_argument("--call-latency", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--parallel", type=int, default=4, help="generations the server serves at once, like OLLAMA_NUM_PARALLEL")
+    args = parser.parse_args()
+    asyncio.run(main(args.files, args.concurrency, args.call_latency, args.token_latency, args.parallel))
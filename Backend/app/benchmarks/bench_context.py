@@ -0,0 +1,48 @@
+from HygdraAgency.Agent.Ollama import OllamaModelConfig
+from HygdraAgency.Agent.ProjectManagerAgent import ProjectManagerAgent
+from HygdraAgency.DataModel.Project import Project
+from benchmarks.fake_ollama import FakeOllama
+import argparse
+import json
+import asyncio
+import time
+
+
+# --- Prompt evaluation of the task breakdown loop, stateless calls vs KV context reuse ---
+def responder(answer: str):
+    "`answer` for free-form calls, the next of a never ending task list for the structured ones"
+    def respond(payload: dict) -> str:
+        if payload.get("format"):
+            return json.dumps({"done": False, "title": "next task", "description": answer, "dependencies": [], "remaining": answer})
+        return answer
+
+    return respond
+
+async def run(server: FakeOllama, reuse_context: bool, description: str, max_context: int) -> dict:
+    agent = ProjectManagerAgent()
+    agent.ollama_config = OllamaModelConfig(base_url=server.url, reuse_context=reuse_context, max_context=max_context)
+    project = Project(id="bench", name="bench", description=description)
+
+    server.reset()
+    start = time.perf_counter()
+    tasks = await agent.generate_task(project, first_though="1. scaffold the service\n2. write the api\n3. add tests")
+    return {"elapsed": time.perf_counter() - start, "tasks": len(tasks), "calls": server.requests, "prompt_tokens": server.prompt_tokens}
+
+async def main(description_words: int, answer_words: int, prefill_latency: float, max_context: int):
+    description = " ".join(f"requirement{i}" for i in range(description_words))
+    answer = " ".join(f"word{i}" for i in range(answer_words))
+    async with FakeOllama(responder=responder(answer), prefill_latency=prefill_latency) as server:
+        for label, reuse_context in (("stateless", False), ("context", True)):
+            result = await run(server, reuse_context, description, max_context)
+            print(f"{label:>9}: {result['tasks']} tasks in {result['elapsed']:.2f}s, {result['calls']} calls, "
+                  f"{result['prompt_tokens']} prompt tokens evaluated, {result['prompt_tokens'] * prefill_latency:.2f}s of prompt evaluation")
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare prompt evaluation of ProjectManagerAgent.generate_task with and without KV context reuse")
+    parser.add_argument("--description-words", type=int, default=400)
+    parser.add_argument("--answer-words", type=int, default=60)
+    parser.add_argument("--prefill-latency", type=float, default=0.0002, help="seconds per evaluated prompt token")
+    parser.add_argument("--max-context", type=int, default=3072)
+    args = parser.parse_args()
+    asyncio.run(main(args.description_words, args.answer_words, args.prefill_latency, args.max_context))
@@ -0,0 +1,45 @@
+from HygdraAgency.Agent.Ollama import OllamaModelConfig
+from HygdraAgency.utils.embeding import EmbedingBatcher, EmbedingConfig
+from benchmarks.fake_ollama import FakeOllama
+import argparse
+import asyncio
+import time
+
+
+# --- Concurrent embeddings: one call per text vs micro-batches ---
+async def run(server: FakeOllama, batch_size: int, texts: int) -> dict:
+    server.reset()
+    batcher = EmbedingBatcher(EmbedingConfig(max_batch_size=batch_size), OllamaModelConfig(base_url=server.url))
+
+    # event loop responsiveness while embedding: a ticker that should fire every ms
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    tick_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(batcher.embed(f"document {i}") for i in range(texts)))
+    elapsed = time.perf_counter() - start
+    tick_task.cancel()
+    return {"elapsed": elapsed, "calls": server.embed_requests, "largest": batcher.stats.largest_batch, "ticks": ticks}
+
+async def main(texts: int, batch_size: int, embed_latency: float):
+    async with FakeOllama(embed_latency=embed_latency) as server:
+        single = await run(server, 1, texts)
+        batched = await run(server, batch_size, texts)
+
+    for label, result in (("unbatched", single), ("batched", batched)):
+        print(f"{label:>9}: {texts} texts in {result['calls']} calls (largest batch {result['largest']}), "
+              f"{result['elapsed'] * 1000:.1f}ms, loop ticks {result['ticks']}")
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark micro-batched embeddings against a local stand-in server")
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    args = parser.parse_args()
+    asyncio.run(main(args.texts, args.batch_size, args.embed_latency))
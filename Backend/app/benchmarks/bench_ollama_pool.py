@@ -0,0 +1,57 @@
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt, OllamaSessionPool, OllamaPoolConfig
+from HygdraAgency.utils.coalesce import SingleFlight
+from benchmarks.fake_ollama import FakeOllama
+import argparse
+import asyncio
+import time
+
+
+# --- Connection setup overhead: per-call session vs shared pool ---
+async def run(server: FakeOllama, config: OllamaModelConfig, pool: OllamaSessionPool, calls: int, concurrency: int) -> dict:
+    server.reset()
+    semaphore = asyncio.Semaphore(concurrency)
+    # identical concurrent prompts would join one generation, every call must reach the server
+    flights = SingleFlight(enabled=False)
+
+    async def call():
+        async with semaphore:
+            # same pattern as the agents: one `async with` per logical operation
+            async with OllamaClient(config, pool=pool, flights=flights) as ollama:
+                return await ollama.generate(OllamaPrompt(prompt="hey"))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(calls)))
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": calls,
+        "requests": server.requests,
+        "connections": server.connections,
+        "total_s": elapsed,
+        "per_call_ms": elapsed / calls * 1000,
+    }
+
+async def main(calls: int, concurrency: int):
+    async with FakeOllama(response="hello from the stand-in server") as server:
+        config = OllamaModelConfig(base_url=server.url)
+
+        # an unstarted pool makes every client open and close its own session
+        before = await run(server, config, OllamaSessionPool(), calls, concurrency)
+
+        pool = OllamaSessionPool(OllamaPoolConfig(limit_per_host=concurrency))
+        await pool.start()
+        try:
+            after = await run(server, config, pool, calls, concurrency)
+        finally:
+            await pool.stop()
+
+    for label, result in (("per-call session", before), ("shared pool", after)):
+        print(f"{label:>17}: {result['calls']} calls, {result['requests']} requests, {result['connections']} tcp connections, "
+              f"{result['total_s']:.3f}s total, {result['per_call_ms']:.2f}ms/call")
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ollama connection pooling against a local stand-in server")
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.concurrency))
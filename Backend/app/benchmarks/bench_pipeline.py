@@ -0,0 +1,175 @@
+from HygdraAgency.Agent.BaseAgent import BaseAgent
+from HygdraAgency.Agent.DeveloperAgent import DeveloperAgent
+from HygdraAgency.Agent.ProjectManagerAgent import ProjectManagerAgent
+from HygdraAgency.Agent.TaskAssignmentAgent import TaskAssignmentAgent
+from HygdraAgency.DataModel.Task import TaskStatus
+from HygdraAgency.utils.artifacts import ArtifactStore
+from HygdraAgency.utils.embeding import embedder
+from HygdraAgency.utils.rag import LocalVectorStore
+from benchmarks.fake_ollama import FakeOllama, scripted
+from benchmarks.loop_monitor import LoopMonitor
+from contextlib import asynccontextmanager
+from typing import Dict, List
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+WORKFLOWS = ("initialize", "assign", "develop")
+# compared against a baseline, wall time and blocking get an absolute slack on top of the tolerance
+CHECKED = {"calls": 0, "request_bytes": 0, "elapsed": 0.05, "blocking": 0.05}
+
+
+# --- End-to-end agent pipeline against the stand-in server ---
+def responder(tasks: int, files: int):
+    "scripted answers of every pipeline step, the breakdown yields `tasks` tasks and each task `files` files"
+    state = {"tasks": 0, "updates": 0}
+
+    def next_task(payload: dict) -> str:
+        state["tasks"] += 1
+        n = state["tasks"]
+        return json.dumps({"done": n > tasks, "title": f"implement module {n}", "dependencies": [],
+                           "description": f"write the request handlers of module {n}", "remaining": f"{tasks - n} modules left"})
+
+    def plan_update(payload: dict) -> str:
+        state["updates"] += 1
+        n = state["updates"] % files
+        return json.dumps({"plan": f"{(files - n) % files} files left", "done": n == 0, "next_file": f"handler_{n}.py with def handler_{n}(request: dict) -> dict"})
+
+    def suitability(payload: dict) -> str:
+        return "0.9" if "Agent Role: Developer" in payload["prompt"] else "0.2"
+
+    def matrix(payload: dict) -> str:
+        rows = payload["prompt"].split("Tasks (rows):")[1].count('"requirements"')
+        return json.dumps({"scores": [[0.9, 0.2, 0.2] for _ in range(rows)]})
+
+    return scripted(structured=[
+        ("remaining", next_task),
+        ("primary_skill", json.dumps({"primary_skill": "python", "secondary_skills": ["apis"], "complexity": "Medium",
+                                      "estimated_duration": 4, "best_role": "Developer", "readiness": "READY"})),
+        ("scores", matrix),
+        ("next_file", plan_update),
+        ("code", lambda payload: json.dumps({"filename": f"handler_{state['updates'] % files}.py", "langage": "python",
+                                             "code": "def handler(request: dict) -> dict:\n    return request\n"})),
+        ("files", json.dumps({"files": [{"filename": f"handler_{i}.py", "langage": "python", "description": f"handler {i}",
+                                         "headers": [f"def handler_{i}(request: dict) -> dict"]} for i in range(files)]})),
+        ("issues", json.dumps({"issues": []})),
+    ], free=[
+        ("Agent Role", suitability),
+    ], default="1. scaffold the service\n2. write the handlers\n```python\ndef handler(request: dict) -> dict:\n    return request\n```")
+
+class Pipeline:
+    "the agents of the API wired to one stand-in server, a throwaway vector store and artifact store"
+    def __init__(self, server: FakeOllama, directory: str, mode: str = "sequential", scoring: str = "pairwise"):
+        self.server = server
+        self.manager = ProjectManagerAgent()
+        self.assigner = TaskAssignmentAgent()
+        self.assigner.scoring_mode = scoring
+        self.developer = DeveloperAgent()
+        self.developer.generation_mode = mode
+        self.developer.store = LocalVectorStore(os.path.join(directory, "vectors"))
+        self.developer.artifacts = ArtifactStore(os.path.join(directory, "generated_code"))
+        for agent in (self.manager, self.assigner, self.developer):
+            agent.ollama_config.base_url = server.url
+        embedder.ollama_config.base_url = server.url
+        self.agents = [BaseAgent("Dev", "Developer"), BaseAgent("Tester", "Tester"), BaseAgent("DevOps", "DevOps")]
+        self.results: Dict[str, dict] = {workflow: {"runs": 0, "elapsed": 0.0, "calls": 0, "embed_calls": 0, "request_bytes": 0,
+                                                    "response_bytes": 0, "blocking": 0.0, "longest_block": 0.0} for workflow in WORKFLOWS}
+
+    @asynccontextmanager
+    async def measure(self, workflow: str):
+        "add the wall time, server traffic and loop blocking of the block to `workflow`"
+        before = (self.server.requests, self.server.embed_requests, self.server.request_bytes, self.server.response_bytes)
+        start = time.perf_counter()
+        async with LoopMonitor() as monitor:
+            yield
+        result = self.results[workflow]
+        result["runs"] += 1
+        result["elapsed"] += time.perf_counter() - start
+        for key, previous, current in zip(("calls", "embed_calls", "request_bytes", "response_bytes"), before,
+                                          (self.server.requests, self.server.embed_requests, self.server.request_bytes, self.server.response_bytes)):
+            result[key] += current - previous
+        result["blocking"] += monitor.blocking
+        result["longest_block"] = max(result["longest_block"], monitor.longest)
+
+    async def run(self, description: str) -> dict:
+        "initialize a project, then assign and develop each of its tasks"
+        async with self.measure("initialize"):
+            project = await self.manager.initialize_project("bench", description)
+        while True:
+            # the pairwise scorer prints every score
+            async with self.measure("assign"):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    task, agent = await self.assigner.assign_next_task(project, self.agents)
+            if task is None:
+                break
+            async with self.measure("develop"):
+                project = await self.developer.work_on_task(task, project)
+            task.status = TaskStatus.DONE
+        return {"tasks": len(project.tasks), "files": sum(len(app.code) for app in project.app), "workflows": self.results}
+
+async def run_pipeline(tasks: int = 3, files: int = 3, mode: str = "sequential", scoring: str = "pairwise", description_words: int = 100,
+                       call_latency: float = 0, token_latency: float = 0, parallel: int = 0) -> dict:
+    "one pipeline run against a fresh stand-in server, the report of `Pipeline.run`"
+    directory = tempfile.mkdtemp(prefix="hygdra-pipeline-")
+    description = " ".join(f"requirement{i}" for i in range(description_words))
+    try:
+        async with FakeOllama(responder=responder(tasks, files), call_latency=call_latency, token_latency=token_latency, parallel=parallel) as server:
+            return await Pipeline(server, directory, mode, scoring).run(description)
+    finally:
+        shutil.rmtree(directory)
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    "metrics of `report` worse than `baseline` by more than `tolerance`, plus the absolute slack of `CHECKED`"
+    found = []
+    for workflow, metrics in baseline["workflows"].items():
+        for metric, slack in CHECKED.items():
+            limit = metrics[metric] * (1 + tolerance) + slack
+            value = report["workflows"][workflow][metric]
+            if value > limit:
+                found.append(f"{workflow} {metric}: {value:g} > {limit:g} (baseline {metrics[metric]:g})")
+    return found
+
+async def main(args) -> int:
+    logging.disable(logging.WARNING)
+    report = await run_pipeline(args.tasks, args.files, args.mode, args.scoring, args.description_words,
+                                args.call_latency, args.token_latency, args.parallel)
+    print(f"{report['tasks']} tasks, {report['files']} files")
+    for workflow, result in report["workflows"].items():
+        print(f"{workflow:>10}: {result['runs']:3} runs in {result['elapsed']:6.2f}s, {result['calls']:4} LLM calls, {result['embed_calls']:3} embed calls, "
+              f"{result['request_bytes'] / 1024:8.1f} KiB sent, {result['response_bytes'] / 1024:7.1f} KiB received, "
+              f"loop blocked {result['blocking'] * 1000:7.1f}ms (longest {result['longest_block'] * 1000:.1f}ms)")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            found = regressions(report, json.load(file), args.tolerance)
+        for regression in found:
+            print(f"regression: {regression}")
+        return 1 if found else 0
+    return 0
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run initialize_project, assign_next_task and work_on_task end to end against a scripted stand-in server")
+    parser.add_argument("--tasks", type=int, default=4)
+    parser.add_argument("--files", type=int, default=4, help="files per task")
+    parser.add_argument("--mode", default="sequential", choices=["sequential", "parallel"], help="DEV_GENERATION_MODE")
+    parser.add_argument("--scoring", default="pairwise", choices=["pairwise", "matrix", "embedding"], help="TASK_SCORING_MODE")
+    parser.add_argument("--description-words", type=int, default=200)
+    parser.add_argument("--call-latency", type=float, default=0.01)
+    parser.add_argument("--token-latency", type=float, default=0)
+    parser.add_argument("--parallel", type=int, default=0, help="generations the stand-in serves at once, 0 for unlimited")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report to compare with, exits 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slack allowed over the baseline")
+    sys.exit(asyncio.run(main(parser.parse_args())))
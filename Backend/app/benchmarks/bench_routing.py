@@ -0,0 +1,52 @@
+from HygdraAgency.Agent.Ollama import TaskClass, model_router
+from benchmarks.bench_pipeline import Pipeline, responder
+from benchmarks.fake_ollama import FakeOllama
+import argparse
+import asyncio
+import logging
+import shutil
+import tempfile
+import time
+
+
+# --- Latency per step class, every call on the code model vs routed by class ---
+async def run(routing: bool, args) -> dict:
+    model_router.enabled = routing
+    model_router.reset()
+    fast = model_router.routes[TaskClass.CLASSIFY].model
+    # the fast model answers sooner, or is not pulled at all
+    models = None if not args.missing_fast_model else ["codellama"]
+    directory = tempfile.mkdtemp(prefix="hygdra-routing-")
+    try:
+        async with FakeOllama(responder=responder(args.tasks, args.files), call_latency=args.call_latency,
+                              model_latency={fast: args.fast_latency}, models=models) as server:
+            start = time.perf_counter()
+            await Pipeline(server, directory, scoring=args.scoring).run(" ".join(f"requirement{i}" for i in range(args.description_words)))
+            elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(directory)
+    return {"elapsed": elapsed, "classes": model_router.report()}
+
+async def main(args):
+    logging.disable(logging.WARNING)
+    for label, routing in (("code model", False), ("routed", True)):
+        result = await run(routing, args)
+        print(f"{label}: pipeline in {result['elapsed']:.2f}s")
+        for task, report in result["classes"].items():
+            if report["calls"]:
+                models = ", ".join(f"{model} x{calls}" for model, calls in report["models"].items())
+                print(f"  {task:>8}: {report['calls']:3} calls, mean {report['mean_latency'] * 1000:7.1f}ms, "
+                      f"{report['fallbacks']} fallbacks, {report['over_budget']} over budget, {report['errors']} errors ({models})")
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-class LLM latency of the agent pipeline with and without model routing")
+    parser.add_argument("--tasks", type=int, default=4)
+    parser.add_argument("--files", type=int, default=3)
+    parser.add_argument("--scoring", default="pairwise", choices=["pairwise", "matrix", "embedding"], help="TASK_SCORING_MODE")
+    parser.add_argument("--description-words", type=int, default=100)
+    parser.add_argument("--call-latency", type=float, default=0.1, help="seconds to the first token of the code model")
+    parser.add_argument("--fast-latency", type=float, default=0.01, help="seconds to the first token of OLLAMA_FAST_MODEL")
+    parser.add_argument("--missing-fast-model", action="store_true", help="the stand-in does not have the fast model, every routed call falls back")
+    args = parser.parse_args()
+    asyncio.run(main(args))
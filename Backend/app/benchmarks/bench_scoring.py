@@ -0,0 +1,109 @@
+from HygdraAgency.Agent.BaseAgent import BaseAgent
+from HygdraAgency.Agent.TaskAssignmentAgent import TaskAssignmentAgent
+from HygdraAgency.DataModel.Project import Project
+from HygdraAgency.DataModel.Task import Task, TaskStatus
+from HygdraAgency.utils.embeding import embedder
+from benchmarks.fake_ollama import FakeOllama
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import hashlib
+import json
+import random
+import re
+import time
+
+TASKS = {
+    "Developer": [
+        "Implement the REST API endpoints for user accounts",
+        "Write the backend data models and programming logic for orders",
+        "Build the frontend feature for the product catalogue",
+        "Refactor the payment algorithms and fix debugging issues",
+    ],
+    "Tester": [
+        "Write pytest unit tests for the user API",
+        "Create integration tests and a test plan for checkout",
+        "Run static analysis and quality assurance with SonarQube",
+    ],
+    "DevOps": [
+        "Deploy the application with Docker and Kubernetes",
+        "Create the Jenkins CI/CD pipeline for releases",
+        "Write Ansible playbooks for the infrastructure",
+    ],
+}
+SKILLS = {
+    "Developer": ["programming", "APIs", "backend", "application code"],
+    "Tester": ["testing", "unit tests", "pytest", "quality assurance"],
+    "DevOps": ["deployment", "CI/CD", "Docker", "infrastructure"],
+}
+ROLE_OF = {title: role for role, titles in TASKS.items() for title in titles}
+
+def match_score(title: str, role: str) -> float:
+    "scripted ground truth, the right role scores 0.65-0.95, the others 0.1-0.4"
+    jitter = int(hashlib.sha256(f"{title}:{role}".encode()).hexdigest(), 16) % 30 / 100
+    return round((0.65 if ROLE_OF.get(title) == role else 0.1) + jitter, 2)
+
+def respond(payload: dict) -> str:
+    "scripted answers for the three prompts used by the task assigner"
+    prompt = payload["prompt"]
+    if "Analyze this task" in prompt:
+        title = re.search(r"Task Title: (.*)", prompt).group(1).strip()
+        role = ROLE_OF.get(title, "Developer")
+        return json.dumps({"title": title, "primary_skill": SKILLS[role][0], "secondary_skills": SKILLS[role][1:],
+                           "complexity": "Medium", "estimated_duration": 4, "best_role": role})
+    if "Tasks (rows)" in prompt:
+        agents = json.loads(re.search(r"Agents \(columns\):(.*?)Tasks \(rows\):", prompt, re.DOTALL).group(1))
+        tasks = json.loads(re.search(r"Tasks \(rows\):(.*?)--- important", prompt, re.DOTALL).group(1))
+        return json.dumps({"scores": [[match_score(task["requirements"]["title"], agent["role"]) for agent in agents] for task in tasks]})
+    role = re.search(r"Agent Role: (.*)", prompt).group(1).strip()
+    title = json.loads(re.search(r"Task Requirements:(.*?)--- important", prompt, re.DOTALL).group(1))["title"]
+    return str(match_score(title, role))
+
+async def main(scenarios: int, tasks: int, call_latency: float, token_latency: float, parallel: int, seed: int):
+    logging.disable(logging.WARNING)
+    random.seed(seed)
+    titles = list(ROLE_OF)
+    projects = [random.sample(titles, tasks) for _ in range(scenarios)]
+    agents = [BaseAgent("Dev", "Developer"), BaseAgent("Tester", "Tester"), BaseAgent("DevOps", "DevOps Engineer")]
+    # the assigner matches on the exact role name
+    agents[2].role = "DevOps"
+
+    async with FakeOllama(call_latency=call_latency, token_latency=token_latency, parallel=parallel, responder=respond) as server:
+        embedder.ollama_config.base_url = server.url
+        choices = {}
+        for mode in ("pairwise", "matrix", "embedding"):
+            assigner = TaskAssignmentAgent()
+            assigner.ollama_config.base_url = server.url
+            assigner.scoring_mode = mode
+            server.reset()
+
+            picks = []
+            start = time.perf_counter()
+            for n, picked in enumerate(projects):
+                project = Project(id=f"{mode}-{n}", name="bench", description="bench",
+                                  tasks=[Task(id=f"task-{i}", title=title, description=title, status=TaskStatus.TODO) for i, title in enumerate(picked)])
+                # the pairwise scorer prints every score
+                with contextlib.redirect_stdout(io.StringIO()):
+                    task, agent = await assigner.assign_next_task(project, agents)
+                picks.append((task.title, agent.role))
+            elapsed = time.perf_counter() - start
+
+            choices[mode] = picks
+            agreement = sum(a == b for a, b in zip(picks, choices["pairwise"])) / len(picks)
+            correct = sum(ROLE_OF[title] == role for title, role in picks) / len(picks)
+            print(f"{mode:>9}: {elapsed / scenarios * 1000:7.1f}ms/assignment, {server.requests / scenarios:5.1f} generate calls, "
+                  f"{server.embed_requests / scenarios:4.1f} embed calls, agreement with pairwise {agreement:.0%}, right role {correct:.0%}")
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare pairwise, matrix and embedding task scoring against a scripted stand-in server")
+    parser.add_argument("--scenarios", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=6)
+    parser.add_argument("--call-latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--parallel", type=int, default=1, help="generations the stand-in serves at once, 0 for unlimited")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(main(args.scenarios, args.tasks, args.call_latency, args.token_latency, args.parallel, args.seed))
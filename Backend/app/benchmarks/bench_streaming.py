@@ -0,0 +1,35 @@
+from HygdraAgency.Agent.Ollama import OllamaClient, OllamaModelConfig, OllamaPrompt
+from benchmarks.fake_ollama import FakeOllama
+import argparse
+import asyncio
+import time
+
+
+# --- Time to first byte: buffered generate vs generate_stream ---
+async def main(tokens: int, token_latency: float):
+    response = " ".join(f"tok{i}" for i in range(tokens))
+    async with FakeOllama(response=response, token_latency=token_latency) as server:
+        config = OllamaModelConfig(base_url=server.url)
+        async with OllamaClient(config) as ollama:
+            start = time.perf_counter()
+            await ollama.generate(OllamaPrompt(prompt="hey"))
+            buffered = time.perf_counter() - start
+
+            start = time.perf_counter()
+            first = None
+            async for _ in ollama.generate_stream(OllamaPrompt(prompt="hey")):
+                if first is None:
+                    first = time.perf_counter() - start
+            total = time.perf_counter() - start
+
+    print(f"   generate: first byte after {buffered * 1000:.1f}ms (whole response)")
+    print(f"     stream: first token after {first * 1000:.1f}ms, "
+          f"reported ttft {ollama.last_time_to_first_token * 1000:.1f}ms, done after {total * 1000:.1f}ms")
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark time to first token of streamed ollama generations")
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    args = parser.parse_args()
+    asyncio.run(main(args.tokens, args.token_latency))
@@ -0,0 +1,61 @@
+from HygdraAgency.utils.rag import ChromaVectorStore, LocalVectorStore, VectorStore
+import argparse
+import numpy as np
+import shutil
+import tempfile
+import time
+import uuid
+
+
+# --- Retrieval latency: chroma server vs in-process memory mapped store ---
+def run(store: VectorStore, name: str, vectors: np.ndarray, queries: np.ndarray, n: int, batch: int) -> dict:
+    store.create(name)
+    start = time.perf_counter()
+    for i in range(0, len(vectors), 500):
+        rows = range(i, min(i + 500, len(vectors)))
+        store.add(name, [f"doc-{row}" for row in rows], vectors[i:i + 500].tolist(),
+                  [f"document {row}" for row in rows], [{"title": f"doc {row}", "path": "bench"} for row in rows])
+    added = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query in queries:
+        store.query(name, [query.tolist()], n)
+    single = (time.perf_counter() - start) / len(queries)
+
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        store.query(name, queries[i:i + batch].tolist(), n)
+    batched = (time.perf_counter() - start) / len(queries)
+    return {"add": added, "single": single, "batched": batched}
+
+def main(documents: int, queries: int, dim: int, n: int, batch: int, chroma: bool):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(documents, dim)).astype(np.float32)
+    probes = rng.normal(size=(queries, dim)).astype(np.float32)
+
+    directory = tempfile.mkdtemp(prefix="hygdra-vectors-")
+    stores = [("local", LocalVectorStore(directory))]
+    if chroma:
+        stores.append(("chroma", ChromaVectorStore()))
+    try:
+        for label, store in stores:
+            name = f"bench-{uuid.uuid4().hex[:8]}"
+            result = run(store, name, vectors, probes, n, batch)
+            if isinstance(store, ChromaVectorStore):
+                store.client.delete_collection(name)
+            print(f"{label:>6}: {documents} documents added in {result['add'] * 1000:.0f}ms, "
+                  f"top-{n} {result['single'] * 1000:.2f}ms/query, {result['batched'] * 1000:.2f}ms/query in batches of {batch}")
+    finally:
+        shutil.rmtree(directory)
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare retrieval latency of the local vector store and a chroma server")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--n", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--no-chroma", action="store_true", help="skip the chroma server (CHROME_DB_IP/CHROME_DB_PORT)")
+    args = parser.parse_args()
+    main(args.documents, args.queries, args.dim, args.n, args.batch, not args.no_chroma)
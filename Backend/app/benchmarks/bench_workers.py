@@ -0,0 +1,138 @@
+from HygdraAgency.DataModel.Project import Project
+from HygdraAgency.DataModel.Task import Task, TaskStatus
+from HygdraAgency.utils.store import ProjectStore
+from benchmarks.bench_scoring import TASKS, respond
+from benchmarks.fake_ollama import FakeOllama
+from collections import Counter
+import aiohttp
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# --- API throughput at 1, 2 and 4 uvicorn workers ---
+def respond_app(payload: dict) -> str:
+    "the scripted scorer, with the role names of the app agents"
+    return respond({**payload, "prompt": payload["prompt"].replace("Agent Role: Quality Assurance", "Agent Role: Tester")})
+
+async def seed(database_url: str, projects: int, tasks: int) -> list:
+    "projects of tester tasks, the tester agent only records them so the API itself is measured"
+    store = ProjectStore(database_url)
+    titles = TASKS["Tester"]
+    ids = []
+    for n in range(projects):
+        project = Project(id=f"bench-{n}", name=f"bench {n}", description="throughput benchmark",
+                          tasks=[Task(id=f"task-{i}", title=titles[i % len(titles)], description=titles[i % len(titles)], status=TaskStatus.TODO)
+                                 for i in range(tasks)])
+        await store.save(project)
+        ids.append(project.id)
+    store.close()
+    return ids
+
+async def wait_ready(session: aiohttp.ClientSession, url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {process.returncode}")
+        try:
+            async with session.get(f"{url}/jobs") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("uvicorn did not start")
+
+async def run(server: FakeOllama, workers: int, port: int, projects: int, tasks: int, concurrency: int) -> dict:
+    directory = tempfile.mkdtemp(prefix="hygdra-bench-")
+    database_url = f"sqlite:///{directory}/projects.sqlite"
+    ids = await seed(database_url, projects, tasks)
+    env = {
+        **os.environ,
+        "OLLAMA_URL": server.url,
+        "DATABASE_URL": database_url,
+        "SHARED_STATE_PATH": os.path.join(directory, "shared_state.sqlite"),
+        "OLLAMA_CACHE": "false",
+        "OLLAMA_CACHE_PATH": "",
+        "TASK_SCORING_MODE": "pairwise",
+        "JOB_WORKERS": str(concurrency),
+        "LOGFIRE_SEND_TO_LOGFIRE": "false",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    latencies = []
+    picked = Counter()
+    errors = 0
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300)) as session:
+            await wait_ready(session, url, process)
+            server.reset()
+            slots = asyncio.Semaphore(concurrency)
+
+            async def next_task(project_id: str):
+                nonlocal errors
+                async with slots:
+                    start = time.perf_counter()
+                    async with session.post(f"{url}/projects/{project_id}/next-task", params={"wait": "true"}) as response:
+                        body = await response.json()
+                    latencies.append(time.perf_counter() - start)
+                    if response.status != 200 or "task" not in body:
+                        errors += 1
+                    else:
+                        picked[(project_id, body["task"]["id"])] += 1
+
+            # every task of every project once, interleaved so projects contend across workers
+            start = time.perf_counter()
+            await asyncio.gather(*(next_task(project_id) for _ in range(tasks) for project_id in ids))
+            elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies.sort()
+    return {
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95)],
+        "errors": errors,
+        "duplicates": sum(count - 1 for count in picked.values() if count > 1),
+        "calls": server.requests,
+        "calls_per_request": server.requests / len(latencies),
+    }
+
+async def main(workers: list, projects: int, tasks: int, concurrency: int, call_latency: float, port: int):
+    async with FakeOllama(call_latency=call_latency, responder=respond_app) as server:
+        fewest = None
+        for n in workers:
+            result = await run(server, n, port, projects, tasks, concurrency)
+            fewest = fewest or result
+            print(f"{n} worker(s): {result['throughput']:6.1f} next-task/s, p50 {result['p50'] * 1000:7.1f}ms, "
+                  f"p95 {result['p95'] * 1000:7.1f}ms, {result['calls']} LLM calls ({result['calls_per_request']:.2f}/request, "
+                  f"{result['calls'] - fewest['calls']:+d} vs {workers[0]} worker(s)), {result['errors']} errors, "
+                  f"{result['duplicates']} tasks run twice")
+    if len(workers) > 1:
+        # the throughput of more workers includes that extra work, it is not a slowdown of the workers themselves
+        print("LLM work is not shared between workers: call coalescing and the requirement analysis memo are per process, "
+              "so each worker repeats calls another one already made. Compare throughputs together with the LLM calls per request.")
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure next-task throughput of the API at several uvicorn worker counts")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--projects", type=int, default=64)
+    parser.add_argument("--tasks", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=64, help="requests in flight")
+    parser.add_argument("--call-latency", type=float, default=0.02)
+    parser.add_argument("--port", type=int, default=7461)
+    args = parser.parse_args()
+    asyncio.run(main(args.workers, args.projects, args.tasks, args.concurrency, args.call_latency, args.port))
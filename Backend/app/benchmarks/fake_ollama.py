@@ -0,0 +1,212 @@
+from aiohttp import web
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import hashlib
+import json
+import re
+import time
+import weakref
+
+
+# --- Local stand-in for the ollama HTTP API ---
+Answer = Union[str, Callable[[dict], str]]
+
+def scripted(structured: List[Tuple[str, Answer]] = (), free: List[Tuple[str, Answer]] = (), default: Answer = "ok") -> Callable[[dict], str]:
+    """
+    Responder answering with the first rule whose key matches the request.
+
+    `structured` rules apply to requests sending a JSON schema as `format`
+    and match a property of the schema, `free` rules apply to the others
+    and match a substring of the prompt. An answer is a string or a
+    function of the request payload.
+    """
+    def respond(payload: dict) -> str:
+        schema = payload.get("format")
+        if isinstance(schema, dict):
+            rules = [(key in schema.get("properties", {}), answer) for key, answer in structured]
+        else:
+            rules = [(key in payload["prompt"], answer) for key, answer in free]
+        answer = next((answer for matched, answer in rules if matched), default)
+        return answer(payload) if callable(answer) else answer
+
+    return respond
+
+class FakeOllama:
+    """
+    Minimal ollama server used by the benchmarks.
+
+    Streams `/api/generate` answers as NDJSON, answers `/api/embed` with
+    deterministic vectors and keeps track of the TCP connections opened by
+    clients so connection reuse can be measured, as well as the bytes
+    received from and sent to clients. Generations return a
+    `context` of one token per word, and only the words not already in the
+    `context` sent back are evaluated, at `prefill_latency` seconds each,
+    like ollama reusing its KV cache. The payload handed to `responder`
+    carries the `turn` of the call in its conversation, 1 for a call
+    without context, so scripts can follow multi-call loops.
+    """
+    def __init__(self, response: str = "ok", host: str = "127.0.0.1", port: int = 0, token_latency: float = 0,
+                 embed_latency: float = 0, embed_dim: int = 64, responder: Optional[Callable[[dict], str]] = None,
+                 call_latency: float = 0, parallel: int = 0, prefill_latency: float = 0, models: Optional[List[str]] = None,
+                 model_latency: Optional[Dict[str, float]] = None):
+        self.response = response
+        self.models = models # generations of other models get a 404 like a model not pulled, None serves any model
+        self.model_latency = model_latency or {} # `call_latency` of specific models
+        # generations served at once like OLLAMA_NUM_PARALLEL, 0 for unlimited
+        self.slots = asyncio.Semaphore(parallel) if parallel else None
+        self.call_latency = call_latency # seconds before the first token of each generation, prompt evaluation
+        self.prefill_latency = prefill_latency # seconds per prompt token evaluated
+        self.prompt_tokens = 0 # prompt tokens evaluated over all generations
+        self.responder = responder # builds the answer from the request payload, overrides `response`
+        self.token_latency = token_latency # seconds slept before each streamed token
+        self.embed_latency = embed_latency # seconds slept per embed request, whatever the batch size
+        self.embed_dim = embed_dim
+        self.embed_requests = 0
+        self.embedded_texts = 0
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.request_bytes = 0 # request bodies received, generations and embeddings
+        self.response_bytes = 0 # answers sent
+        self.connections = 0 # TCP connections accepted
+        # open connections already counted, a loopback port reused by a new connection is not mistaken for the old one
+        self.transports = weakref.WeakSet()
+        self.turns = {} # length of a returned context -> turn of the call that returned it
+        self.runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def reset(self):
+        self.requests = 0
+        self.embed_requests = 0
+        self.embedded_texts = 0
+        self.prompt_tokens = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.connections = 0
+        self.transports = weakref.WeakSet()
+        self.turns = {}
+
+    def vector(self, text: str) -> list:
+        "deterministic hashed bag-of-words vector, texts sharing words end up close"
+        vector = [0.0] * self.embed_dim
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.sha256(word.encode()).digest()
+            vector[int.from_bytes(digest[:4], "big") % self.embed_dim] += 1.0 if digest[4] % 2 else -1.0
+        return vector
+
+    async def read(self, request: web.Request) -> dict:
+        if request.transport not in self.transports:
+            self.transports.add(request.transport)
+            self.connections += 1
+        body = await request.read()
+        self.request_bytes += len(body)
+        return json.loads(body)
+
+    def respond(self, data: dict, status: int = 200) -> web.Response:
+        body = json.dumps(data).encode()
+        self.response_bytes += len(body)
+        return web.Response(body=body, status=status, content_type="application/json")
+
+    async def embed(self, request: web.Request) -> web.Response:
+        self.embed_requests += 1
+        payload = await self.read(request)
+        texts = payload["input"] if isinstance(payload["input"], list) else [payload["input"]]
+        self.embedded_texts += len(texts)
+        if self.embed_latency:
+            await asyncio.sleep(self.embed_latency)
+        return self.respond({"model": payload["model"], "embeddings": [self.vector(text) for text in texts]})
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        "legacy single text endpoint"
+        self.embed_requests += 1
+        self.embedded_texts += 1
+        payload = await self.read(request)
+        if self.embed_latency:
+            await asyncio.sleep(self.embed_latency)
+        return self.respond({"embedding": self.vector(payload["prompt"])})
+
+    async def generate(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        payload = await self.read(request)
+        if self.models is not None and payload["model"] not in self.models:
+            return self.respond({"error": f"model '{payload['model']}' not found"}, status=404)
+
+        if self.slots is None:
+            return await self.stream(request, payload)
+        async with self.slots:
+            return await self.stream(request, payload)
+
+    async def stream(self, request: web.Request, payload: dict) -> web.StreamResponse:
+        start = time.perf_counter_ns()
+        context = payload.get("context") or []
+        payload["turn"] = self.turns.get(len(context), 0) + 1 if context else 1
+        answer = self.responder(payload) if self.responder else self.response
+        # the system prompt is part of the context once evaluated
+        evaluated = len(payload["prompt"].split()) + (0 if context else len((payload.get("system") or "").split()))
+        self.prompt_tokens += evaluated
+        prefill = evaluated * self.prefill_latency
+        call_latency = self.model_latency.get(payload["model"], self.call_latency)
+        if call_latency or prefill:
+            await asyncio.sleep(call_latency + prefill)
+
+        stream = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        try:
+            await stream.prepare(request)
+            for token in answer.split(" "):
+                if self.token_latency:
+                    await asyncio.sleep(self.token_latency)
+                line = {"model": payload["model"], "created_at": datetime.now().isoformat(), "response": token + " ", "done": False}
+                await self.write(stream, line)
+            generated = len(answer.split(" "))
+            done = {"model": payload["model"], "created_at": datetime.now().isoformat(), "response": "", "done": True,
+                    "context": context + [1] * (evaluated + generated), "prompt_eval_count": evaluated,
+                    "prompt_eval_duration": int(prefill * 1e9), "eval_count": generated,
+                    "eval_duration": int(generated * self.token_latency * 1e9), "load_duration": 0,
+                    "total_duration": time.perf_counter_ns() - start}
+            self.turns[len(done["context"])] = payload["turn"]
+            await self.write(stream, done)
+            await stream.write_eof()
+        except ConnectionResetError:
+            # the client gave up on this generation (cancelled call)
+            pass
+        return stream
+
+    async def write(self, stream: web.StreamResponse, line: dict):
+        data = (json.dumps(line) + "\n").encode()
+        self.response_bytes += len(data)
+        await stream.write(data)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/api/generate", self.generate)
+        app.router.add_post("/api/embed", self.embed)
+        app.router.add_post("/api/embeddings", self.embeddings)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+# Entry point
+if __name__ == "__main__":
+    async def serve():
+        async with FakeOllama(port=11434) as server:
+            print(f"fake ollama listening on {server.url}")
+            await asyncio.Event().wait()
+
+    asyncio.run(serve())
@@ -0,0 +1,348 @@
+from benchmarks.fake_ollama import FakeOllama, scripted
+from benchmarks.loop_monitor import LoopMonitor
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import aiohttp
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 90, 99)
+
+
+# --- HTTP load generator for the API, LLM and vector store replaced by local stand-ins ---
+def responder(tasks: int):
+    "scripted answers of the API workflows, each project breaks down into `tasks` tasks of one file"
+    def next_task(payload: dict) -> str:
+        # a new breakdown conversation starts at turn 1
+        n = payload["turn"]
+        return json.dumps({"done": n > tasks, "title": f"implement module {n}", "dependencies": [],
+                           "description": f"write the request handlers of module {n}", "remaining": f"{tasks - n} modules left"})
+
+    def matrix(payload: dict) -> str:
+        prompt = payload["prompt"]
+        agents = json.loads(re.search(r"Agents \(columns\):(.*?)Tasks \(rows\):", prompt, re.DOTALL).group(1))
+        rows = prompt.split("Tasks (rows):")[1].count('"requirements"')
+        return json.dumps({"scores": [[0.9 if agent["role"] == "Developer" else 0.2 for agent in agents] for _ in range(rows)]})
+
+    return scripted(structured=[
+        ("remaining", next_task),
+        ("primary_skill", json.dumps({"primary_skill": "python", "secondary_skills": ["apis"], "complexity": "Medium",
+                                      "estimated_duration": 4, "best_role": "Developer", "readiness": "READY"})),
+        ("scores", matrix),
+        ("next_file", json.dumps({"plan": "done", "done": True, "next_file": ""})),
+        ("code", json.dumps({"filename": "handler.py", "langage": "python", "code": "def handler(request: dict) -> dict:\n    return request\n"})),
+        ("files", json.dumps({"files": [{"filename": "handler.py", "langage": "python", "description": "handler",
+                                         "headers": ["def handler(request: dict) -> dict"]}]})),
+        ("issues", json.dumps({"issues": []})),
+    ], free=[
+        ("Agent Role: Developer", "0.9"),
+        ("Agent Role", "0.2"),
+    ], default="1. scaffold the service\n2. write the handlers\n```python\ndef handler(request: dict) -> dict:\n    return request\n```")
+
+class EndpointStats:
+    "latencies and status codes of one endpoint"
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter() # status code, 0 for a request that failed without one
+        self.errors = 0
+
+    def percentile(self, p: float) -> float:
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * p / 100), len(latencies) - 1)] if latencies else 0.0
+
+    def report(self, elapsed: float) -> dict:
+        return {
+            "requests": len(self.latencies),
+            "throughput": len(self.latencies) / elapsed if elapsed else 0.0,
+            "error_rate": self.errors / len(self.latencies) if self.latencies else 0.0,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            **{f"p{p}": self.percentile(p) for p in PERCENTILES},
+            "max": max(self.latencies, default=0.0),
+        }
+
+class LoadClient:
+    """
+    HTTP client of the virtual users, records every request by endpoint.
+
+    Requests are labelled with the route template rather than the path, so
+    every project counts under the same endpoint. Responses with a status
+    of 400 or more and requests that fail without a response are errors.
+    """
+    def __init__(self, session: aiohttp.ClientSession, url: str):
+        self.session = session
+        self.url = url
+        self.stats: Dict[str, EndpointStats] = {}
+        self.recording = True
+
+    async def request(self, endpoint: str, method: str, path: str, **kwargs) -> Tuple[int, Optional[dict]]:
+        "`(status, json body)` of the request, `(0, None)` when it failed without a response"
+        start = time.perf_counter()
+        try:
+            async with self.session.request(method, f"{self.url}{path}", **kwargs) as response:
+                status = response.status
+                body = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError) as e:
+            logging.getLogger("LoadTest").debug(f"{endpoint} failed: {e}")
+            status, body = 0, None
+        if self.recording:
+            stats = self.stats.setdefault(endpoint, EndpointStats())
+            stats.latencies.append(time.perf_counter() - start)
+            stats.statuses[status] += 1
+            stats.errors += status == 0 or status >= 400
+        return status, body
+
+# --- Scenarios, one iteration of a virtual user ---
+Scenario = Callable[[LoadClient, dict, random.Random], Awaitable[None]]
+
+async def create_project(client: LoadClient, state: dict, rng: random.Random):
+    status, body = await client.request("POST /projects/", "POST", "/projects/", params={
+        "name": f"load {rng.randrange(1 << 30)}", "description": state["description"], "wait": "true"})
+    if status == 200:
+        state["projects"].append(body["id"])
+
+async def upload(client: LoadClient, state: dict, rng: random.Random):
+    form = aiohttp.FormData()
+    form.add_field("file", state["document"], filename="notes.md", content_type="text/markdown")
+    await client.request("POST /projects/{id}/ressources/", "POST", f"/projects/{rng.choice(state['projects'])}/ressources/", data=form)
+
+async def get_all(client: LoadClient, state: dict, rng: random.Random):
+    await client.request("POST /projects/get-all", "POST", "/projects/get-all")
+
+async def next_task(client: LoadClient, state: dict, rng: random.Random):
+    await client.request("POST /projects/{id}/next-task", "POST", f"/projects/{rng.choice(state['projects'])}/next-task", params={"wait": "true"})
+
+SCENARIOS: Dict[str, Scenario] = {"create": create_project, "upload": upload, "list": get_all, "next_task": next_task}
+
+def mix(weights: Dict[str, float]) -> Scenario:
+    "a scenario running one of `SCENARIOS` at random, in proportion to `weights`"
+    names = list(weights)
+
+    async def scenario(client: LoadClient, state: dict, rng: random.Random):
+        await SCENARIOS[rng.choices(names, [weights[name] for name in names])[0]](client, state, rng)
+
+    return scenario
+
+def parse_mix(text: str) -> Dict[str, float]:
+    "`name:weight,...` as a weight per scenario, `list` alone is `list:1`"
+    weights = {}
+    for part in text.split(","):
+        name, _, weight = part.partition(":")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario {name}, expected one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+def parse_stages(text: str) -> List[Tuple[int, float]]:
+    "`users:seconds,...`, each stage ramps linearly from the users of the previous one"
+    try:
+        return [(int(users), float(seconds)) for users, seconds in (stage.split(":") for stage in text.split(","))]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"stages are users:seconds separated by commas, got {text}")
+
+def target_users(stages: List[Tuple[int, float]], elapsed: float) -> Optional[int]:
+    "virtual users the profile asks for `elapsed` seconds in, None once it is over"
+    previous = 0
+    for users, seconds in stages:
+        if elapsed < seconds:
+            return round(previous + (users - previous) * elapsed / seconds)
+        elapsed -= seconds
+        previous = users
+    return None
+
+async def run_load(client: LoadClient, scenario: Scenario, stages: List[Tuple[int, float]], state: dict,
+                   think: float = 0, probe_interval: float = 0.05, seed: int = 0) -> float:
+    """
+    Run virtual users following the ramp-up profile, returns the elapsed time.
+
+    Each user loops over `scenario`, pausing `think` seconds between
+    iterations. Users above the target of the profile stop after their
+    current iteration. A probe requests a trivial endpoint every
+    `probe_interval` seconds: its tail latency is the time the API event
+    loop was stalled.
+    """
+    users: List[Tuple[asyncio.Task, asyncio.Event]] = []
+
+    async def user(n: int, stop: asyncio.Event):
+        rng = random.Random(seed * 1_000_003 + n)
+        while not stop.is_set():
+            await scenario(client, state, rng)
+            if think:
+                await asyncio.sleep(think)
+
+    async def probe():
+        while True:
+            await client.request("GET /llm-cache/stats (probe)", "GET", "/llm-cache/stats")
+            await asyncio.sleep(probe_interval)
+
+    prober = asyncio.create_task(probe()) if probe_interval else None
+    start = time.perf_counter()
+    try:
+        while (target := target_users(stages, time.perf_counter() - start)) is not None:
+            running = [(task, stop) for task, stop in users if not stop.is_set()]
+            for task, stop in running[target:]:
+                stop.set()
+            for n in range(len(running), target):
+                stop = asyncio.Event()
+                users.append((asyncio.create_task(user(len(users), stop)), stop))
+            await asyncio.sleep(0.05)
+    finally:
+        for _, stop in users:
+            stop.set()
+        if prober is not None:
+            prober.cancel()
+        # iterations still running finish and are counted
+        await asyncio.gather(*(task for task, _ in users), *([prober] if prober else []), return_exceptions=True)
+    return time.perf_counter() - start
+
+# --- API under test ---
+def app_environment(directory: str, ollama_url: str, scoring: str) -> Dict[str, str]:
+    "settings pointing every store of the app at `directory` and ollama at the stand-in"
+    return {
+        "OLLAMA_URL": ollama_url,
+        "OLLAMA_CACHE": "false",
+        "OLLAMA_CACHE_PATH": "",
+        "DATABASE_URL": f"sqlite:///{directory}/projects.sqlite",
+        "SHARED_STATE_PATH": os.path.join(directory, "shared_state.sqlite"),
+        "VECTOR_STORE": "local",
+        "VECTOR_STORE_PATH": os.path.join(directory, "vectors"),
+        "GENERATED_CODE_PATH": os.path.join(directory, "generated_code"),
+        "UPLOAD_SPOOL_DIR": os.path.join(directory, "uploads"),
+        "TASK_SCORING_MODE": scoring,
+        "LOGFIRE_SEND_TO_LOGFIRE": "false",
+    }
+
+@asynccontextmanager
+async def serve_in_process(env: Dict[str, str], port: int):
+    "the app on this event loop, so its stalls also delay the load generator like a busy worker would"
+    import uvicorn
+    os.environ.update(env)
+    # settings are read when the app modules are imported
+    from app import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await serving
+
+@asynccontextmanager
+async def serve_uvicorn(env: Dict[str, str], port: int, workers: int):
+    "the app in a uvicorn process with `workers` workers"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=APP_DIR, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with aiohttp.ClientSession() as session:
+            deadline = time.monotonic() + 60
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with {process.returncode}")
+                try:
+                    async with session.get(f"{url}/jobs") as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError("uvicorn did not start")
+                await asyncio.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+async def load(args, directory: str, state: dict) -> Optional[dict]:
+    "seed projects, run the load profile and report by endpoint, None when no project could be created"
+    async with FakeOllama(responder=responder(args.tasks), call_latency=args.call_latency, token_latency=args.token_latency,
+                          embed_latency=args.embed_latency, parallel=args.parallel) as ollama:
+        env = app_environment(directory, ollama.url, args.scoring)
+        serve = serve_uvicorn(env, args.port, args.workers) if args.workers else serve_in_process(env, args.port)
+        async with serve as url, aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=args.timeout)) as session:
+            client = LoadClient(session, url)
+            # projects the other scenarios work on, not measured
+            client.recording = False
+            await asyncio.gather(*(create_project(client, state, random.Random(n)) for n in range(args.projects)))
+            client.recording = True
+            if not state["projects"] and set(args.mix) - {"create", "list"}:
+                return None
+
+            ollama.reset()
+            async with LoopMonitor() as monitor:
+                elapsed = await run_load(client, mix(args.mix), args.stages, state, args.think, args.probe_interval, args.seed)
+
+    report = {"elapsed": elapsed, "llm_calls": ollama.requests, "embed_calls": ollama.embed_requests,
+              "endpoints": {endpoint: stats.report(elapsed) for endpoint, stats in sorted(client.stats.items())}}
+    # a separate uvicorn process blocks its own loop, not this one
+    if not args.workers:
+        report["loop_blocking"] = monitor.blocking
+        report["longest_block"] = monitor.longest
+    return report
+
+async def main(args) -> int:
+    logging.disable(logging.WARNING)
+    directory = tempfile.mkdtemp(prefix="hygdra-load-")
+    state = {"projects": [], "description": " ".join(f"requirement{i}" for i in range(args.description_words)),
+             "document": "\n\n".join(f"## section {i}\n" + "notes about the service " * 40 for i in range(args.document_kb))}
+    try:
+        # the pairwise scorer of an in-process app prints every score
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = await load(args, directory, state)
+    finally:
+        shutil.rmtree(directory)
+    if report is None:
+        print("no project could be created")
+        return 1
+
+    print(f"{report['elapsed']:.1f}s, {report['llm_calls']} LLM calls, {report['embed_calls']} embed calls"
+          + (f", loop blocked {report['loop_blocking'] * 1000:.0f}ms (longest {report['longest_block'] * 1000:.1f}ms)" if "loop_blocking" in report else ""))
+    for endpoint, result in report["endpoints"].items():
+        print(f"{endpoint:>40}: {result['requests']:5} requests {result['throughput']:7.1f}/s, {result['error_rate']:6.1%} errors, "
+              + ", ".join(f"p{p} {result[f'p{p}'] * 1000:7.1f}ms" for p in PERCENTILES) + f", max {result['max'] * 1000:7.1f}ms")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+# Entry point
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the API endpoints with concurrent virtual users against local stand-ins")
+    parser.add_argument("--stages", type=parse_stages, default=parse_stages("10:5,50:10,50:15"), help="ramp-up profile, users:seconds,...")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("list:4,next_task:2,upload:1,create:1"), help="scenario weights, name:weight,...")
+    parser.add_argument("--think", type=float, default=0.1, help="seconds a user waits between iterations")
+    parser.add_argument("--projects", type=int, default=8, help="projects created before the load")
+    parser.add_argument("--tasks", type=int, default=3, help="tasks per project")
+    parser.add_argument("--description-words", type=int, default=100)
+    parser.add_argument("--document-kb", type=int, default=8, help="size of uploaded documents")
+    parser.add_argument("--workers", type=int, default=0, help="uvicorn workers in a separate process, 0 to serve on the load generator loop")
+    parser.add_argument("--port", type=int, default=7462)
+    parser.add_argument("--scoring", default="pairwise", choices=["pairwise", "matrix", "embedding"], help="TASK_SCORING_MODE")
+    parser.add_argument("--call-latency", type=float, default=0.02)
+    parser.add_argument("--token-latency", type=float, default=0)
+    parser.add_argument("--embed-latency", type=float, default=0.005)
+    parser.add_argument("--parallel", type=int, default=4, help="generations the stand-in serves at once, 0 for unlimited")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="seconds between probe requests, 0 to disable")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds before a request counts as failed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    sys.exit(asyncio.run(main(parser.parse_args())))
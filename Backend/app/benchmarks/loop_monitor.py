@@ -0,0 +1,39 @@
+from typing import Optional
+import asyncio
+import time
+
+
+# --- Event loop blocking probe ---
+class LoopMonitor:
+    """
+    Measures how long the event loop is blocked.
+
+    A probe sleeps `interval` seconds in a loop; whatever it oversleeps is
+    time the loop spent running code that did not yield. Lags under
+    `threshold` are scheduling noise and are not counted.
+    """
+    def __init__(self, interval: float = 0.001, threshold: float = 0.002):
+        self.interval = interval
+        self.threshold = threshold
+        self.blocking = 0.0 # seconds
+        self.longest = 0.0
+        self._probe: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - start - self.interval
+            if lag > self.threshold:
+                self.blocking += lag
+                self.longest = max(self.longest, lag)
+
+    async def __aenter__(self):
+        self._probe = asyncio.create_task(self._run())
+        # let the probe take its first timestamp
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._probe.cancel()
+        await asyncio.gather(self._probe, return_exceptions=True)
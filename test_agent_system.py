@@ -1,48 +1,743 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
 import pytest
-from agent import Agent, Environment, Action
-
-def test_agent_learning():
-    agent = Agent()
-    initial_state = agent.get_state()
-    agent.learn({"state": "A", "action": "move", "reward": 1})
-    assert agent.get_state() != initial_state, "Agent should update its state after learning"
-
-def test_agent_decision_making():
-    agent = Agent()
-    environment = Environment()
-    action = agent.make_decision(environment)
-    assert isinstance(action, Action), "Agent should return an Action object"
-
-def test_agent_memory():
-    agent = Agent()
-    agent.remember("important_info")
-    assert "important_info" in agent.get_memory(), "Agent should store information in memory"
-
-def test_environment_complexity():
-    environment = Environment()
-    initial_state = environment.get_state()
-    environment.update()
-    assert environment.get_state() != initial_state, "Environment should change over time"
-
-def test_action_consequences():
-    environment = Environment()
-    action = Action("move", {"direction": "north"})
-    initial_state = environment.get_state()
-    environment.apply_action(action)
-    assert environment.get_state() != initial_state, "Action should have consequences on the environment"
-
-def test_agent_environment_interaction():
-    agent = Agent()
-    environment = Environment()
-    initial_env_state = environment.get_state()
-    initial_agent_state = agent.get_state()
-    
-    action = agent.make_decision(environment)
-    environment.apply_action(action)
-    agent.learn(environment.get_feedback())
-    
-    assert environment.get_state() != initial_env_state, "Environment should change after agent's action"
-    assert agent.get_state() != initial_agent_state, "Agent should update its state after interaction"
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Backend", "app"))
+os.environ.setdefault("LOGFIRE_SEND_TO_LOGFIRE", "false")
+
+from HygdraAgency.Agent.Ollama import (ModelRoute, ModelRouter, OllamaClient, OllamaModelConfig, OllamaPoolConfig, OllamaPrompt,
+                                       OllamaSessionPool, TaskClass)
+from benchmarks.bench_pipeline import LoopMonitor, WORKFLOWS, regressions, run_pipeline
+from benchmarks.fake_ollama import FakeOllama, scripted
+from benchmarks.loadtest import EndpointStats, parse_stages, target_users
+from HygdraAgency.utils.coalesce import SingleFlight
+from HygdraAgency.DataModel.Project import Project
+from HygdraAgency.DataModel.Service import CodeFile, Service
+from HygdraAgency.DataModel.Task import Task, TaskStatus
+from HygdraAgency.utils.store import ProjectStore
+from HygdraAgency.utils.scheduler import TaskGraph, TaskScheduler
+from HygdraAgency.utils.ingest import CODE_BOUNDARY, iter_chunks
+from HygdraAgency.utils.cache import ResponseCache, cache_key
+from HygdraAgency.utils.jobs import JobQueue, JobQueueFull, JobStatus
+from HygdraAgency.utils.stream import emit_step
+from HygdraAgency.utils.rag import ChromaVectorStore, LocalCollection, LocalVectorStore, VectorStore
+from HygdraAgency.utils.budget import ContextBudget, ContextBudgetConfig, count_tokens
+from HygdraAgency.utils.search import ProjectIndex
+from HygdraAgency.utils.embeding import embedder
+from HygdraAgency.utils.artifacts import ArtifactStore, safe_name
+from HygdraAgency.utils.shared import LockLost, SharedState
+from HygdraAgency.utils.telemetry import Telemetry
+from HygdraAgency.utils.admission import LLMScheduler, Priority, SchedulerConfig, SchedulerSaturated, llm_priority
+
+
+def test_fake_ollama_scripted_answers():
+    respond = scripted(structured=[("done", json.dumps({"done": True}))], free=[("hello", "world")], default="default")
+
+    async def run():
+        async with FakeOllama(responder=respond) as server:
+            async with OllamaClient(OllamaModelConfig(base_url=server.url)) as ollama:
+                free = await ollama.generate(OllamaPrompt(prompt="say hello"))
+                other = await ollama.generate(OllamaPrompt(prompt="anything"))
+                structured = await ollama.generate(OllamaPrompt(prompt="say hello", format={"properties": {"done": {}}}))
+            return free, other, structured, server
+
+    free, other, structured, server = asyncio.run(run())
+    assert free.strip() == "world"
+    assert other.strip() == "default"
+    assert json.loads(structured) == {"done": True}
+    assert server.requests == 3
+    assert server.request_bytes > 0 and server.response_bytes > 0
+
+def test_fake_ollama_counts_accepted_connections():
+    async def calls(pool: OllamaSessionPool) -> int:
+        async with FakeOllama() as server:
+            for i in range(5):
+                async with OllamaClient(OllamaModelConfig(base_url=server.url), pool=pool, flights=SingleFlight(enabled=False)) as ollama:
+                    await ollama.generate(OllamaPrompt(prompt="hey"))
+            return server.connections
+
+    async def run():
+        pool = OllamaSessionPool()
+        alone = await calls(pool)
+        await pool.start()
+        try:
+            return alone, await calls(pool)
+        finally:
+            await pool.stop()
+
+    # a session per call opens a connection per call, the pool keeps one alive
+    assert asyncio.run(run()) == (5, 1)
+
+def test_fake_ollama_token_latency():
+    async def run():
+        async with FakeOllama(response="one two three four", token_latency=0.02) as server:
+            async with OllamaClient(OllamaModelConfig(base_url=server.url)) as ollama:
+                start = time.perf_counter()
+                answer = await ollama.generate(OllamaPrompt(prompt="count"))
+                return answer, time.perf_counter() - start
+
+    answer, elapsed = asyncio.run(run())
+    assert answer.split() == ["one", "two", "three", "four"]
+    assert elapsed >= 0.08
+
+def test_loop_monitor_detects_blocking():
+    async def run():
+        async with LoopMonitor() as monitor:
+            await asyncio.sleep(0.01)
+            time.sleep(0.05)
+            await asyncio.sleep(0.01)
+        return monitor
+
+    monitor = asyncio.run(run())
+    assert monitor.longest >= 0.04
+    assert monitor.blocking >= monitor.longest
+
+@pytest.mark.parametrize("mode", ["sequential", "parallel"])
+def test_pipeline_end_to_end(mode):
+    report = asyncio.run(run_pipeline(tasks=2, files=2, mode=mode, scoring="matrix", description_words=20))
+    assert report["tasks"] == 2
+    assert report["files"] == 4
+    workflows = report["workflows"]
+    assert set(workflows) == set(WORKFLOWS)
+    # the last assignment finds no task left
+    assert workflows["initialize"]["runs"] == 1 and workflows["assign"]["runs"] == 3 and workflows["develop"]["runs"] == 2
+    for result in workflows.values():
+        assert result["calls"] > 0 and result["request_bytes"] > 0
+
+def test_pipeline_is_deterministic():
+    first = asyncio.run(run_pipeline(tasks=2, files=2, description_words=20))
+    second = asyncio.run(run_pipeline(tasks=2, files=2, description_words=20))
+    for workflow in WORKFLOWS:
+        assert first["workflows"][workflow]["calls"] == second["workflows"][workflow]["calls"]
+    assert regressions(second, first, tolerance=0.2) == []
+
+def test_regressions_flag_extra_calls():
+    baseline = {"workflows": {"develop": {"calls": 10, "request_bytes": 1000, "elapsed": 1.0, "blocking": 0.1}}}
+    report = {"workflows": {"develop": {"calls": 13, "request_bytes": 1000, "elapsed": 1.0, "blocking": 0.1}}}
+    assert regressions(report, baseline, tolerance=0.2) == ["develop calls: 13 > 12 (baseline 10)"]
+
+def test_load_profile_ramps_between_stages():
+    stages = parse_stages("10:5,50:10,50:15")
+    assert target_users(stages, 0) == 0
+    assert target_users(stages, 2.5) == 5
+    assert target_users(stages, 10) == 30
+    assert target_users(stages, 20) == 50
+    assert target_users(stages, 30) is None
+
+def test_endpoint_stats_percentiles():
+    stats = EndpointStats()
+    stats.latencies = [i / 100 for i in range(1, 101)]
+    stats.statuses[200] = 99
+    stats.statuses[500] = 1
+    stats.errors = 1
+    report = stats.report(elapsed=10)
+    assert report["throughput"] == 10
+    assert report["error_rate"] == 0.01
+    assert report["p50"] == 0.51 and report["p99"] == 1.0
+
+def test_identical_generations_share_one_call():
+    async def run():
+        flights = SingleFlight(enabled=True)
+        async with FakeOllama(response="one two three", token_latency=0.01) as server:
+            config = OllamaModelConfig(base_url=server.url)
+
+            async def generate(prompt: str, delay: float = 0) -> str:
+                await asyncio.sleep(delay)
+                async with OllamaClient(config, flights=flights) as ollama:
+                    return await ollama.generate(OllamaPrompt(prompt=prompt))
+
+            # the late caller joins mid-stream and replays the tokens it missed
+            answers = await asyncio.gather(generate("same"), generate("same"), generate("same", delay=0.015), generate("other"))
+            return answers, server.requests, flights
+
+    answers, requests, flights = asyncio.run(run())
+    assert len(set(answers)) == 1 and answers[0].split() == ["one", "two", "three"]
+    assert requests == 2
+    assert flights.stats.leaders == 2 and flights.stats.coalesced == 2
+    assert flights.flights == {}
+
+def test_single_flight_shares_errors_and_drops_abandoned_calls():
+    async def failing():
+        yield 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def endless():
+        while True:
+            yield 1
+            await asyncio.sleep(0.01)
+
+    async def follow(flights: SingleFlight, factory):
+        items = []
+        async with flights.stream("key", factory) as (leader, stream):
+            async for item in stream:
+                items.append(item)
+        return items
+
+    async def run():
+        flights = SingleFlight(enabled=True)
+        errors = await asyncio.gather(follow(flights, failing), follow(flights, failing), return_exceptions=True)
+        task = asyncio.create_task(follow(flights, endless))
+        await asyncio.sleep(0.03)
+        producer = flights.flights["key"].producer
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+        return errors, producer, flights
+
+    errors, producer, flights = asyncio.run(run())
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert producer.cancelled()
+    assert flights.stats.abandoned == 1 and flights.flights == {}
+
+def test_scheduler_admits_by_priority_then_project_in_turn():
+    async def run():
+        scheduler = LLMScheduler(SchedulerConfig(max_in_flight=1))
+        admitted = []
+        release = asyncio.Event()
+
+        async def call(priority: Priority, project: str, name: str):
+            with llm_priority(priority, project):
+                async with scheduler.slot():
+                    admitted.append(name)
+                    await release.wait()
+
+        holder = asyncio.create_task(call(Priority.BACKGROUND, "a", "holder"))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(call(priority, project, name)) for priority, project, name in (
+            (Priority.BACKGROUND, "a", "a1"), (Priority.BACKGROUND, "a", "a2"), (Priority.BACKGROUND, "b", "b1"),
+            (Priority.ASSIGNMENT, "b", "assign"), (Priority.INTERACTIVE, "c", "chat"))]
+        await asyncio.sleep(0)
+        queued = dict(scheduler.stats.queued)
+        release.set()
+        await asyncio.gather(holder, *waiting)
+        return admitted, queued, scheduler
+
+    admitted, queued, scheduler = asyncio.run(run())
+    assert admitted == ["holder", "chat", "assign", "a1", "b1", "a2"]
+    assert queued == {Priority.INTERACTIVE: 1, Priority.ASSIGNMENT: 1, Priority.BACKGROUND: 3}
+    assert scheduler._in_flight == 0 and sum(scheduler.stats.queued.values()) == 0
+
+def test_scheduler_refuses_calls_past_the_queue_limit():
+    async def run():
+        config = SchedulerConfig(max_in_flight=1, service_time=4)
+        config.max_queued[Priority.BACKGROUND] = 1
+        scheduler = LLMScheduler(config)
+        release = asyncio.Event()
+
+        async def call():
+            async with scheduler.slot():
+                await release.wait()
+
+        running = [asyncio.create_task(call()) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(SchedulerSaturated) as refused:
+            await call()
+        # a waiting caller that goes away frees its place in the queue
+        running[1].cancel()
+        await asyncio.sleep(0)
+        queued = scheduler.stats.queued[Priority.BACKGROUND]
+        release.set()
+        await asyncio.gather(*running, return_exceptions=True)
+        return refused.value, queued, scheduler
+
+    refused, queued, scheduler = asyncio.run(run())
+    # one call running and one waiting, 4s each on one slot
+    assert refused.retry_after == 8
+    assert queued == 0
+    assert scheduler.stats.rejected[Priority.BACKGROUND] == 1 and scheduler._in_flight == 0
+
+def code_file(filename: str, description: str = "") -> CodeFile:
+    return CodeFile(id=filename, name=filename, description=description, filename=filename, langage="python")
+
+def reload(store: ProjectStore, project_id: str) -> Project:
+    "the project as written in the database"
+    fresh = ProjectStore(url=store.url)
+    try:
+        return asyncio.run(fresh.get(project_id))
+    finally:
+        fresh.close()
+        store.close()
+
+def test_concurrent_project_saves(tmp_path):
+    async def run():
+        store = ProjectStore(url=f"sqlite:///{tmp_path / 'hygdra.sqlite'}")
+        project = Project(id="p", name="p", description="d", tasks=[Task(id=str(i), title=f"task {i}", description="", status=TaskStatus.TODO) for i in range(4)])
+        await store.save(project)
+
+        # DAG workers finishing tasks at once, each saving the shared project with its new service
+        async def finish(i: int):
+            project.app.append(Service(id=f"{i}", name=f"task {i}", doc="", description="", code=[code_file(f"module_{i}.py")]))
+            await store.save(project)
+
+        for round in range(5):
+            project.app = []
+            await asyncio.gather(*(finish(i) for i in range(4)))
+        return store
+
+    saved = reload(asyncio.run(run()), "p")
+    assert sorted(service.id for service in saved.app) == ["0", "1", "2", "3"]
+
+def test_project_store_keeps_last_of_duplicate_ids(tmp_path):
+    async def run():
+        store = ProjectStore(url=f"sqlite:///{tmp_path / 'hygdra.sqlite'}")
+        project = Project(id="p", name="p", description="d", app=[
+            Service(id="t1", name="same title", doc="", description="", code=[code_file("a.py", "first"), code_file("a.py", "second")]),
+            Service(id="t2", name="same title", doc="", description="", code=[code_file("b.py")]),
+        ])
+        await store.save(project)
+        return store
+
+    saved = reload(asyncio.run(run()), "p")
+    # services of tasks sharing a title stay apart, a file generated twice keeps its last version
+    assert [service.id for service in saved.app] == ["t1", "t2"]
+    assert [(file.id, file.description) for file in saved.app[0].code] == [("a.py", "second")]
+
+def test_metrics_skip_stopped_and_stale_workers(tmp_path):
+    def worker(name: str) -> Telemetry:
+        shared = SharedState(str(tmp_path / "shared.sqlite"))
+        shared.owner_prefix = name
+        return Telemetry(shared=shared, sync_interval=0.05)
+
+    def calls(text: str) -> float:
+        return sum(float(line.split()[-1]) for line in text.splitlines() if line.startswith("hygdra_llm_calls_total{"))
+
+    async def run():
+        live, stopped, dead = worker("live"), worker("stopped"), worker("dead")
+        for telemetry in (live, stopped, dead):
+            telemetry.record("Dev", "codellama", "code")
+            await telemetry.start()
+        await dead._flush()
+        await stopped.stop()
+        both = calls(await live.render())
+        # the dead worker stops publishing without removing its aggregates
+        dead._syncer.cancel()
+        await asyncio.sleep(0.2)
+        alone = calls(await live.render())
+        await live.stop()
+        return both, alone
+
+    both, alone = asyncio.run(run())
+    assert both == 2
+    assert alone == 1
+
+async def route(server_options: dict, route: ModelRoute, scheduler: LLMScheduler = None, calls: int = 1):
+    "answering models and router stats of `calls` classify calls through `route`"
+    router = ModelRouter(routes={task: ModelRoute() for task in TaskClass} | {TaskClass.CLASSIFY: route}, enabled=True)
+    async with FakeOllama(response="0.9", **server_options) as server:
+        models = []
+        for i in range(calls):
+            async with OllamaClient(OllamaModelConfig(base_url=server.url), router=router, flights=SingleFlight(enabled=False),
+                                    scheduler=scheduler or LLMScheduler(SchedulerConfig(max_in_flight=0))) as ollama:
+                assert (await ollama.generate(OllamaPrompt(prompt=f"score {i}", task=TaskClass.CLASSIFY))).strip() == "0.9"
+                models.append(ollama.last_model)
+        return models, router.stats[TaskClass.CLASSIFY]
+
+def test_router_falls_back_when_the_model_is_not_pulled():
+    models, stats = asyncio.run(route({"models": ["codellama"]}, ModelRoute(model="tiny", budget=5), calls=2))
+    assert models == ["codellama", "codellama"]
+    # the missing model is only asked once
+    assert stats.errors == 1 and stats.fallbacks == 1 and stats.calls == 2
+
+def test_router_falls_back_when_the_budget_is_missed():
+    models, stats = asyncio.run(route({"model_latency": {"slow": 0.5}}, ModelRoute(model="slow", budget=0.05, fallbacks=["fast"])))
+    assert models == ["fast"]
+    assert stats.over_budget == 1 and stats.fallbacks == 1 and stats.models == {"fast": 1}
+
+def test_timeout_of_the_last_candidate_is_raised():
+    async def run():
+        router = ModelRouter(routes={task: ModelRoute() for task in TaskClass} | {TaskClass.CLASSIFY: ModelRoute(model="slow", budget=5)}, enabled=True)
+        pool = OllamaSessionPool(OllamaPoolConfig(timeout=0.1))
+        await pool.start()
+        try:
+            async with FakeOllama(response="0.9", call_latency=0.5) as server:
+                async with OllamaClient(OllamaModelConfig(base_url=server.url), pool=pool, router=router, flights=SingleFlight(enabled=False),
+                                        scheduler=LLMScheduler(SchedulerConfig(max_in_flight=0))) as ollama:
+                    # the routed model then the default one time out, nothing is answered
+                    with pytest.raises(asyncio.TimeoutError):
+                        await ollama.generate(OllamaPrompt(prompt="score", task=TaskClass.CLASSIFY))
+                    # a pinned model outside any route
+                    with pytest.raises(asyncio.TimeoutError):
+                        await ollama.generate(OllamaPrompt(prompt="answer", model="slow"))
+        finally:
+            await pool.stop()
+        return router.stats[TaskClass.CLASSIFY]
+
+    stats = asyncio.run(run())
+    assert stats.over_budget == 1 and stats.calls == 0
+
+def test_router_budget_starts_once_admitted():
+    async def hold(scheduler: LLMScheduler):
+        async with scheduler.slot():
+            await asyncio.sleep(0.2)
+
+    async def run():
+        scheduler = LLMScheduler(SchedulerConfig(max_in_flight=1))
+        holder = asyncio.create_task(hold(scheduler))
+        await asyncio.sleep(0)
+        # queued longer than the budget, then answers well within it
+        result = await route({"model_latency": {"fast": 0.01}}, ModelRoute(model="fast", budget=0.1), scheduler)
+        await holder
+        return result
+
+    models, stats = asyncio.run(run())
+    assert models == ["fast"] and stats.over_budget == 0
+
+def task(task_id: str, *dependencies: str, status: TaskStatus = TaskStatus.TODO) -> Task:
+    return Task(id=task_id, title=task_id, description="", status=status, dependencies=list(dependencies))
+
+def test_task_graph_rejects_cycles_and_skips_finished_dependencies():
+    with pytest.raises(ValueError, match="cycle"):
+        TaskGraph([task("a", "c"), task("b", "a"), task("c", "b")])
+    # a finished task neither waits nor holds anyone back, unknown ids are ignored
+    graph = TaskGraph([task("a", status=TaskStatus.DONE), task("b", "a", "ghost"), task("c", "b")])
+    assert [ready.id for ready in graph.ready()] == ["b"]
+    assert [unblocked.id for unblocked in graph.complete("b")] == ["c"]
+
+def test_task_scheduler_runs_in_parallel_and_blocks_dependents_of_failures():
+    tasks = [task("a"), task("b"), task("c"), task("d", "a", "b"), task("e", "c"), task("f", "e")]
+    running, peak, updates = set(), 0, []
+
+    async def run_task(current: Task):
+        nonlocal peak
+        running.add(current.id)
+        peak = max(peak, len(running))
+        await asyncio.sleep(0.01)
+        running.discard(current.id)
+        if current.id == "c":
+            raise RuntimeError("boom")
+        return current.id.upper()
+
+    async def on_update(current: Task):
+        updates.append((current.id, current.status))
+
+    report = asyncio.run(TaskScheduler(run_task, max_parallel=2, on_update=on_update).run(tasks))
+    assert sorted(report.completed) == ["a", "b", "d"]
+    assert report.failed == {"c": "boom"}
+    assert sorted(report.blocked) == ["e", "f"]
+    assert report.results["d"] == "D"
+    assert peak == 2
+    # the failed task goes back to TODO, the others through IN_PROGRESS to DONE
+    assert ("c", TaskStatus.TODO) in updates and ("d", TaskStatus.DONE) in updates
+    assert [current.status for current in tasks] == [TaskStatus.DONE] * 2 + [TaskStatus.TODO] + [TaskStatus.DONE] + [TaskStatus.TODO] * 2
+
+def test_task_scheduler_needs_a_worker():
+    async def run_task(task: Task):
+        return task.id
+
+    for max_parallel in (0, -1):
+        with pytest.raises(ValueError, match="max_parallel"):
+            TaskScheduler(run_task, max_parallel)
+    assert TaskScheduler(run_task, 1).max_parallel == 1
+
+    import app
+    from fastapi.testclient import TestClient
+    # refused before the project is even looked up
+    response = TestClient(app.app).post("/projects/missing/run", params={"max_parallel": 0})
+    assert response.status_code == 422
+
+def test_chunk_offsets_cover_the_document():
+    lines = []
+    for i in range(40):
+        lines += [f"def handler_{i}(request: dict) -> dict:\n", f"    value = request.get('key_{i}')\n", "    return {'value': value}\n", "\n"]
+    document = "".join(lines)
+    chunks = list(iter_chunks(lines, "app.py", "app.py", size=300, overlap=60, boundary=lambda line: CODE_BOUNDARY.match(line) is not None))
+
+    assert chunks[0].start == 0 and chunks[-1].end == len(document)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.content == document[chunk.start:chunk.end]
+        # each chunk overlaps or touches the previous one, by at most `overlap` characters
+        assert previous.start < chunk.start <= previous.end
+        assert previous.end - chunk.start <= 60
+    # chunks close before a definition rather than in the middle of one
+    assert all(document[chunk.end:].startswith("def ") for chunk in chunks[:-1])
+
+def test_response_cache_evicts_least_recent_and_keeps_disk_tier(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+
+    async def run():
+        cache = ResponseCache(max_bytes=10, path=path)
+        await cache.put("a", "aaaa")
+        await cache.put("b", "bbbb")
+        assert await cache.get("a") == "aaaa" # b is now the least recent
+        await cache.put("c", "cccc")
+        in_memory = list(cache._entries)
+        stats = cache.stats.model_copy()
+        # evicted from memory, still on disk and promoted back
+        assert await cache.get("b") == "bbbb"
+        disk_hits = cache.stats.disk_hits
+        cache.close()
+
+        restarted = ResponseCache(max_bytes=10, path=path)
+        survived = await restarted.get("c")
+        missing = await restarted.get("d")
+        restarted.close()
+        return in_memory, stats, disk_hits, survived, missing, restarted.stats
+
+    in_memory, stats, disk_hits, survived, missing, restarted = asyncio.run(run())
+    assert in_memory == ["a", "c"]
+    assert stats.evictions == 1 and stats.bytes == 8 and stats.memory_hits == 1
+    assert disk_hits == 1
+    assert survived == "cccc" and missing is None
+    assert restarted.disk_hits == 1 and restarted.misses == 1
+
+def test_cache_key_covers_everything_that_shapes_a_generation():
+    base = cache_key("codellama", "system", "prompt", None, {"temperature": 0})
+    assert base == cache_key("codellama", "system", "prompt", None, {"temperature": 0})
+    assert len({base, cache_key("llama3", "system", "prompt", None, {"temperature": 0}),
+                cache_key("codellama", "system", "prompt", None, {"temperature": 0.7}),
+                cache_key("codellama", "system", "prompt", None, {"temperature": 0}, context=[1, 2]),
+                cache_key("codellama", "system", "prompt", None, {"temperature": 0}, format="json")}) == 5
+
+def test_job_queue_status_transitions_and_failures():
+    async def run():
+        queue = JobQueue(workers=1, max_depth=3, shared=None)
+        await queue.start()
+        order, gate = [], asyncio.Event()
+
+        async def workflow(name: str):
+            emit_step("Dev", name)
+            order.append(name)
+            await gate.wait()
+            if name == "fails":
+                raise ValueError("bad answer")
+            return name.upper()
+
+        first = queue.submit("next_task", lambda: workflow("first"))
+        await asyncio.sleep(0.01) # the worker picks it up
+        fails = queue.submit("next_task", lambda: workflow("fails"), priority=5)
+        urgent = queue.submit("next_task", lambda: workflow("urgent"), priority=1)
+        dropped = queue.submit("next_task", lambda: workflow("dropped"))
+        with pytest.raises(JobQueueFull):
+            queue.submit("next_task", lambda: workflow("too many"))
+        queue.cancel(dropped.id)
+        running = first.status
+        gate.set()
+        await asyncio.gather(*(queue.wait(job.id) for job in (first, fails, urgent, dropped)))
+        await queue.stop()
+        return order, running, first, fails, urgent, dropped
+
+    order, running, first, fails, urgent, dropped = asyncio.run(run())
+    assert running == JobStatus.RUNNING
+    # lower priority values first, a job cancelled while queued never runs
+    assert order == ["first", "urgent", "fails"]
+    assert (first.status, first.result, first.progress, first.steps) == (JobStatus.DONE, "FIRST", 1.0, 1)
+    assert first.last_step == {"agent": "Dev", "step": "first"}
+    assert (fails.status, fails.error) == (JobStatus.FAILED, "bad answer")
+    assert urgent.status == JobStatus.DONE and dropped.status == JobStatus.CANCELLED
+    assert all(job.finished_at is not None for job in (first, fails, urgent, dropped))
+
+def test_job_queue_cancels_running_jobs():
+    async def run():
+        queue = JobQueue(workers=1, shared=None)
+        await queue.start()
+        job = queue.submit("run", lambda: asyncio.sleep(10))
+        await asyncio.sleep(0.01)
+        queue.cancel(job.id)
+        await queue.wait(job.id)
+        await queue.stop()
+        return job
+
+    assert asyncio.run(run()).status == JobStatus.CANCELLED
+
+def test_saturated_llm_fails_the_job_with_a_retry_after(monkeypatch):
+    import app
+    from fastapi import HTTPException
+
+    async def workflow():
+        raise SchedulerSaturated("16 interactive LLM calls already queued", 12)
+
+    async def run():
+        queue = JobQueue(workers=1, shared=None)
+        monkeypatch.setattr(app, "job_queue", queue)
+        await queue.start()
+        polled = (await app.enqueue("next_task", workflow, "p1", 5, wait=False))["job"]
+        await queue.wait(polled.id)
+        with pytest.raises(HTTPException) as waited:
+            await app.enqueue("next_task", workflow, "p1", 5, wait=True)
+        await queue.stop()
+        return polled, waited.value
+
+    polled, waited = asyncio.run(run())
+    assert (polled.status, polled.retry_after) == (JobStatus.FAILED, 12)
+    assert json.loads(polled.model_dump_json())["retry_after"] == 12
+    assert (waited.status_code, waited.headers) == (429, {"Retry-After": "12"})
+
+def test_lost_lock_lease_fails_the_job(tmp_path):
+    state = SharedState(str(tmp_path / "shared.sqlite"), lock_ttl=0.15)
+    reached = []
+
+    async def workflow():
+        async with state.lock("project:p1") as owner:
+            # held past its ttl while the heartbeat renews it
+            await asyncio.sleep(0.3)
+            reached.append("renewed")
+            # the lease expires while the worker stalls and another worker takes the lock
+            state.release("project:p1", owner)
+            assert state.try_acquire("project:p1", "other", 10)
+            await asyncio.sleep(1)
+            reached.append("unguarded")
+
+    async def run():
+        queue = JobQueue(workers=1, shared=None)
+        await queue.start()
+        job = queue.submit("run", workflow)
+        await queue.wait(job.id)
+        await queue.stop()
+        with pytest.raises(LockLost):
+            async with state.lock("project:p2") as owner:
+                state.release("project:p2", owner)
+                await asyncio.sleep(1)
+        return job
+
+    job = asyncio.run(run())
+    assert (job.status, job.error) == (JobStatus.FAILED, "lease on lock 'project:p1' was lost")
+    assert reached == ["renewed"]
+    # the new holder keeps the lock
+    assert not state.try_acquire("project:p1", "third", 10)
+    state.close()
+
+def test_plan_compaction_never_cuts_the_plan():
+    plan = "\n".join(f"- file_{i}.py: def step_{i}(data) -> result" for i in range(40)) + "\n- last_file.py: def finish()"
+    budget = ContextBudget(ContextBudgetConfig(plan_tokens=100, compact_attempts=2))
+
+    async def compact(answers: list) -> tuple:
+        prompts = []
+
+        def respond(payload: dict) -> str:
+            prompts.append(payload["prompt"])
+            return answers[len(prompts) - 1]
+
+        async with FakeOllama(responder=respond) as server:
+            async with OllamaClient(OllamaModelConfig(base_url=server.url, use_cache=False), flights=SingleFlight(enabled=False),
+                                    scheduler=LLMScheduler(SchedulerConfig(max_in_flight=0))) as ollama:
+                return await budget.compact_plan(ollama, plan, "build"), prompts
+
+    # too long, then short enough
+    summary, prompts = asyncio.run(compact([plan, "done: file_0.py\nlast_file.py finish()"]))
+    assert summary.strip() == "done: file_0.py\nlast_file.py finish()"
+    assert "under 50 words" in prompts[0] and "under 25 words" in prompts[1]
+
+    # no summary fits, the plan is kept with its tail
+    kept, prompts = asyncio.run(compact([plan, plan]))
+    assert kept == plan and len(prompts) == 2 and count_tokens(kept) > 100
+
+def test_local_collection_ranks_dedupes_and_persists(tmp_path):
+    collection = LocalCollection(str(tmp_path))
+    assert collection.query([[1, 0, 0]], 3) == [[]]
+    collection.add(["x", "y", "z", "x"], [[1, 0, 0], [0.8, 0.6, 0], [0, 0, 2], [0, 1, 0]],
+                   ["first", "second", "third", "duplicate"], [{"i": 0}, {"i": 1}, {"i": 2}, {"i": 3}])
+    # ids already stored are skipped, later ones too
+    collection.add(["y", "w"], [[0, 1, 0], [0, 1, 0]], ["again", "fourth"], [{}, {"i": 4}])
+    with pytest.raises(ValueError, match="dimension"):
+        collection.add(["v"], [[1, 0]], ["short"], [{}])
+
+    hits = collection.query([[2, 0, 0], [0, 0, 1]], 2)
+    assert [(hit.id, hit.content) for hit in hits[0]] == [("x", "first"), ("y", "second")]
+    assert hits[0][0].score == pytest.approx(1.0) and hits[0][1].score == pytest.approx(0.8)
+    assert [hit.id for hit in hits[1]][0] == "z"
+    assert collection.query([[1, 0, 0]], 0) == [[]]
+    assert collection.existing(["x", "w", "missing"]) == {"x", "w"}
+
+    # another worker opening the directory sees every row
+    reopened = LocalCollection(str(tmp_path))
+    found = [hit.id for hit in reopened.query([[0, 1, 0]], 10)[0]]
+    assert len(found) == 4 and found[:2] == ["w", "y"]
+
+def test_vector_store_backends_implement_every_method(tmp_path):
+    class Partial(VectorStore):
+        def create(self, name: str):
+            pass
+
+    with pytest.raises(TypeError, match="abstract"):
+        Partial()
+    # the chroma client is only opened on first use
+    assert isinstance(LocalVectorStore(str(tmp_path)), VectorStore) and isinstance(ChromaVectorStore(), VectorStore)
+
+def test_local_collection_deletes_rows(tmp_path):
+    collection = LocalCollection(str(tmp_path))
+    collection.add(["x", "y"], [[1, 0], [0, 1]], ["first", "second"], [{"project_id": "a"}, {"project_id": "b"}])
+    collection.delete(["x", "missing"])
+    assert [hit.id for hit in collection.query([[1, 0]], 5)[0]] == ["y"]
+    assert collection.existing(["x", "y"]) == {"y"} and collection.find({"project_id": "a"}) == set()
+    # a deleted id can be stored again, every worker sees the deletion
+    collection.add(["x"], [[1, 0.1]], ["again"], [{"project_id": "a"}])
+    reopened = LocalCollection(str(tmp_path))
+    assert [(hit.id, hit.content) for hit in reopened.query([[1, 0]], 5)[0]] == [("x", "again"), ("y", "second")]
+    assert reopened.find({"project_id": "a"}) == {"x"}
+    reopened.delete(["x", "y"])
+    assert reopened.query([[1, 0]], 5) == [[]]
+
+def test_reindexing_a_project_drops_its_stale_entries(tmp_path, monkeypatch):
+    index = ProjectIndex(LocalVectorStore(str(tmp_path)), collection="projects")
+    project = Project(id="p1", name="shop", description="an online shop",
+                      tasks=[Task(id="t1", title="cart page", description="", status=TaskStatus.TODO),
+                             Task(id="t2", title="payment api", description="", status=TaskStatus.TODO)])
+    other = Project(id="p2", name="blog", description="a blog")
+
+    async def run():
+        async with FakeOllama() as server:
+            monkeypatch.setattr(embedder.ollama_config, "base_url", server.url)
+            assert await index.index(project) == 3 and await index.index(other) == 1
+            assert await index.index(project) == 0
+            project.tasks = [Task(id="t2", title="checkout api", description="", status=TaskStatus.TODO)]
+            added = await index.index(project)
+            return added, [(match.project_id, sorted(hit.text for hit in match.matches)) for match in await index.search("api", 5, per_project=5)]
+
+    added, found = asyncio.run(run())
+    assert added == 1
+    assert sorted(found) == [("p1", ["checkout api", "shop: an online shop"]), ("p2", ["blog: a blog"])]
+    assert index.store.find("projects", {"project_id": "p1"}) == set(index.entries(project))
+
+def test_artifact_store_dedupes_snapshots_and_restores(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+
+    async def run():
+        await store.put_many("p1", "t1", [("main.py", "print(1)\n", {"langage": "python"}), ("copy.py", "print(1)\n", {})])
+        await store.put("p1", "t2", "other.py", "print(1)\n")
+        assert (store.stats.written, store.stats.deduplicated) == (1, 2)
+        await store.put("p1", "t1", "main.py", "print(1)\n", langage="python")
+        assert store.stats.unchanged == 1
+        assert len(os.listdir(os.path.join(str(tmp_path), ".objects"))) == 1
+
+        first = await store.snapshot("p1", "t1")
+        assert await store.snapshot("p1", "t1") == first and store.stats.snapshots == 1
+        await store.put_many("p1", "t1", [("main.py", "print(2)\n", {}), ("extra.py", "pass\n", {})])
+        second = await store.snapshot("p1", "t1")
+        assert second != first
+
+        restored = await store.restore("p1", "t1", first)
+        assert set(restored) == {"main.py", "copy.py"}
+        assert await store.read("p1", "t1", "main.py") == "print(1)\n"
+        assert not os.path.exists(os.path.join(store.task_dir("p1", "t1"), "extra.py"))
+        with open(os.path.join(store.task_dir("p1", "t1"), "main.py")) as file:
+            assert file.read() == "print(1)\n"
+        await store.restore("p1", "t1", second)
+        assert await store.read("p1", "t1", "extra.py") == "pass\n"
+        with pytest.raises(KeyError):
+            await store.restore("p1", "t1", "missing")
+        return await store.project_manifest("p1")
+
+    assert {task: sorted(files) for task, files in asyncio.run(run()).items()} == {
+        "t1": ["copy.py", "extra.py", "main.py"], "t2": ["other.py"]}
+
+def test_artifact_names_stay_inside_the_task_directory(tmp_path):
+    assert [safe_name(name) for name in ("../../etc/passwd", "a\\..\\b.py", ".env", "..", " ", "src/app.py")] == [
+        "passwd", "b.py", "env", "unnamed", "unnamed", "app.py"]
+    store = ArtifactStore(str(tmp_path / "root"))
+
+    async def run():
+        artifact = await store.put("../outside", "../../task", "../../escape.py", "x = 1\n")
+        assert artifact.filename == "escape.py"
+        return await store.read("../outside", "../../task", "escape.py")
+
+    assert asyncio.run(run()) == "x = 1\n"
+    assert os.path.exists(tmp_path / "root" / "outside" / "task" / "escape.py")
+    assert sorted(os.listdir(tmp_path)) == ["root"]
 
 if __name__ == "__main__":
-    pytest.main()
\ No newline at end of file
+    pytest.main()